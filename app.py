@@ -1,92 +1,61 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import (
+    Flask, render_template, request, redirect, url_for, flash,
+    Response, stream_with_context, abort, jsonify
+)
 from werkzeug.utils import secure_filename
-from construct_parser import eepromLayout
+from werkzeug.exceptions import HTTPException
+from fast_codec import CHANNEL_COUNT, get_layout
+from codeplug_store import CodeplugStore
+from validation import validate_eeprom
+from validation_rules import validate_image
+from bandplan_index import BandPlanIndex
+from lookup_tables import power_table_watts
+from fragment_cache import FragmentCache, precompile
+from export import iter_ndjson, iter_json
+from channel_query import QueryError, parse_query, query_channels
+from channel_import import FORMATS as IMPORT_FORMATS, ChannelImportError, import_channels
+from ingest import IngestPipeline, QueueFull, UploadRejected, UploadTooLarge, save_upload
+from patch_writer import (
+    diff_channel_flags, channel_flag_patches, apply_patches, apply_patches_to_buffer
+)
+import instrumentation
+from instrumentation import timed
+import csv
+import io
 import os
-import json
-import pprint
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# "fast" uses the precompiled codec, "construct" the reference parser
+app.config['PARSER'] = os.environ.get('TIDRADIO_PARSER', 'fast')
+# Memory budget for images and their decoded forms kept between requests
+app.config['CACHE_MAX_BYTES'] = int(os.environ.get('TIDRADIO_CACHE_BYTES', 64 * 1024 * 1024))
 
-# Ensure upload directory exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Largest accepted upload (images are 0x2000 bytes) and ingestion pool size
+app.config['MAX_UPLOAD_BYTES'] = int(os.environ.get('TIDRADIO_MAX_UPLOAD_BYTES', 64 * 1024))
+app.config['MAX_CONTENT_LENGTH'] = app.config['MAX_UPLOAD_BYTES'] + 16 * 1024
+app.config['INGEST_WORKERS'] = int(os.environ.get('TIDRADIO_INGEST_WORKERS', 4))
+app.config['INGEST_MAX_PENDING'] = int(os.environ.get('TIDRADIO_INGEST_MAX_PENDING', 64))
+# Where ?profile=1 requests write their cProfile stats; profiling is off when unset
+app.config['PROFILE_DIR'] = os.environ.get('TIDRADIO_PROFILE_DIR')
+# Memory budget for rendered display page sections, and whether to compile
+# every template at startup rather than on first use
+app.config['FRAGMENT_CACHE_BYTES'] = int(os.environ.get('TIDRADIO_FRAGMENT_CACHE_BYTES', 4 * 1024 * 1024))
+app.config['PRECOMPILE_TEMPLATES'] = os.environ.get('TIDRADIO_PRECOMPILE_TEMPLATES', '1') == '1'
 
-SETTINGS_MAGIC = 0xD82F  # Magic value for valid settings block
+codeplug_store = CodeplugStore(max_bytes=app.config['CACHE_MAX_BYTES'])
+ingest_pipeline = IngestPipeline(max_workers=app.config['INGEST_WORKERS'],
+                                 max_pending=app.config['INGEST_MAX_PENDING'])
+fragment_cache = FragmentCache(max_bytes=app.config['FRAGMENT_CACHE_BYTES'])
+metrics = instrumentation.init_app(app, codeplug_store, fragment_cache)
 
-def calculate_settings_checksum(settings_data):
-    """Calculate the checksum for the settings block."""
-    # Skip the magic value itself in calculation
-    data_bytes = settings_data[2:]  # Skip first 2 bytes (magic value)
-    
-    # Simple additive checksum using BIG-Endian byte order
-    checksum = 0
-    for i in range(0, len(data_bytes), 2):
-        if i + 1 < len(data_bytes):
-            # BIG-Endian: most significant byte first
-            value = (data_bytes[i] << 8) | data_bytes[i + 1]
-        else:
-            value = data_bytes[i] << 8
-        checksum = (checksum + value) & 0xFFFF
-    
-    return checksum
+if app.config['PRECOMPILE_TEMPLATES']:
+    precompile(app.jinja_env)
 
-def validate_eeprom(parsed_data):
-    """Validate the EEPROM data using magic values and other checks."""
-    validation = {
-        'valid': True,
-        'messages': []
-    }
-    
-    # Get raw settings data for checksum calculation
-    settings_data = parsed_data.settings._io.getvalue()
-    calculated_checksum = calculate_settings_checksum(settings_data)
-    
-    # Check settings block magic against calculated checksum
-    if parsed_data.settings.magic != SETTINGS_MAGIC:
-        validation['valid'] = False
-        validation['messages'].append(
-            f"Invalid settings magic value: 0x{parsed_data.settings.magic:04X} "
-            f"(expected 0x{SETTINGS_MAGIC:04X}, calculated 0x{calculated_checksum:04X})"
-        )
-    else:
-        validation['messages'].append(
-            f"Valid settings magic value: 0x{parsed_data.settings.magic:04X} "
-            f"(calculated: 0x{calculated_checksum:04X})"
-        )
-    
-    # Validate power table magic values
-    if parsed_data.powerTableVHF.magic != 0x57:
-        validation['valid'] = False
-        validation['messages'].append(
-            f"Invalid VHF power table magic: 0x{parsed_data.powerTableVHF.magic:02X} (expected 0x57)"
-        )
-    else:
-        validation['messages'].append("Valid VHF power table magic: 0x57")
-        
-    if parsed_data.powerTableUHF.magic != 0xD1:
-        validation['valid'] = False
-        validation['messages'].append(
-            f"Invalid UHF power table magic: 0x{parsed_data.powerTableUHF.magic:02X} (expected 0xD1)"
-        )
-    else:
-        validation['messages'].append("Valid UHF power table magic: 0xD1")
-    
-    return validation
-
-def format_group_letters(group_value):
-    """Convert a group value into letters A-O.
-    Each nibble (4 bits) represents one group number (1-15).
-    Returns up to 4 letters representing the groups."""
-    letters = []
-    for i in range(4):  # 4 nibbles
-        # Extract each nibble
-        group_num = (group_value >> (i * 4)) & 0xF
-        # Convert to letter if valid (1-15 maps to A-O)
-        if 1 <= group_num <= 15:
-            letters.append(chr(ord('A') + group_num - 1))
-    return ','.join(letters)
+# Ensure upload directory exists
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 def serialize_channel(channel):
     """Convert channel data to JSON-serializable format"""
@@ -112,230 +81,249 @@ def index():
             flash('No selected file')
             return redirect(request.url)
         if file:
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            try:
+                filename, _ = store_upload(file)
+            except UploadRejected as e:
+                flash(str(e))
+                return redirect(request.url)
             return redirect(url_for('display_data', filename=filename))
     return render_template('index.html')
 
+def store_upload(file):
+    """Save an uploaded file and queue its parse, validation and cache warming.
+    Returns (filename, job id); the job id is None if the pipeline is full."""
+    filename = secure_filename(file.filename)
+    if not filename:
+        raise UploadRejected("Invalid file name")
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    save_upload(file.stream, filepath, app.config['MAX_UPLOAD_BYTES'])
+    codeplug_store.invalidate(filepath)
+    try:
+        job_id = ingest_pipeline.submit(ingest_upload, filepath)
+    except QueueFull:
+        # The display page will parse inline instead
+        job_id = None
+    return filename, job_id
+
+def ingest_upload(filepath):
+    """Parse, validate and cache an uploaded image (runs on the ingest pool).
+    Validation stops at the first error; the display page reports them all."""
+    digest, data, _ = load_image(filepath)
+    with timed('validate'):
+        report = validate_image(data, fail_fast=True)
+    if report.valid:
+        validation = load_validation(digest, data)
+        valid, messages = validation['valid'], validation['messages']
+    else:
+        valid, messages = False, report.messages()
+    return {
+        'digest': digest,
+        'filename': os.path.basename(filepath),
+        'valid': valid,
+        'messages': messages,
+    }
+
+@app.route('/api/upload', methods=['POST'])
+def api_upload():
+    """Accept an upload and return immediately with the ingestion job to poll."""
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify(error='No file part'), 400
+    try:
+        filename, job_id = store_upload(file)
+    except UploadTooLarge as e:
+        return jsonify(error=str(e)), 413
+    except UploadRejected as e:
+        return jsonify(error=str(e)), 400
+    if job_id is None:
+        return jsonify(error='Ingestion queue is full, retry later', filename=filename), 503
+    return jsonify(
+        job=job_id,
+        filename=filename,
+        status_url=url_for('job_status', job_id=job_id),
+        display_url=url_for('display_data', filename=filename),
+    ), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Status and result of an ingestion job."""
+    job = ingest_pipeline.status(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
 @app.route('/display/<filename>', methods=['GET', 'POST'])
 def display_data(filename):
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     try:
-        with open(filepath, "rb") as f:
-            data = f.read()
-        parsed = eepromLayout.parse(data)
+        digest, data, parsed = load_image(filepath)
         
         # Handle form submission
         if request.method == 'POST':
             if 'channel_info' in request.form:
-                # Update all channels
-                for i, channel in enumerate(parsed.memoryChannels):
-                    channel.bits.busyLock = int(request.form.get(f'busyLock_{i}', '0') == '1')
-                    channel.bits.reversed = int(request.form.get(f'reversed_{i}', '0') == '1')
-                    channel.bits.position = int(request.form.get(f'position_{i}', '0') == '1')
-                    channel.bits.bandwidth = int(request.form.get(f'bandwidth_{i}', '0') == '1')
-                
-                # Save changes back to file
-                modified_data = eepromLayout.build(parsed)
-                with open(filepath, "wb") as f:
-                    f.write(modified_data)
+                # Rows are loaded incrementally: only diff the submitted
+                # channels and rewrite the flag bytes that changed. A form
+                # posted before any rows loaded lists none, which must not
+                # fall back to diffing (and clearing) every channel
+                indices = request.form.getlist('channel_index', type=int)
+                bad = [i for i in indices if not 0 <= i < CHANNEL_COUNT]
+                if bad:
+                    flash(f"No channels were updated, channel index {bad[0]} is out of "
+                          f"range 0-{CHANNEL_COUNT - 1}", 'danger')
+                    return redirect(url_for('display_data', filename=filename))
+                changes = diff_channel_flags(data, request.form, indices)
+                patches = channel_flag_patches(changes)
+                if patches:
+                    with timed('write'):
+                        apply_patches(filepath, patches)
+                    # Parsed images are shared by content, so re-key rather than mutate
+                    modified_data = bytearray(data)
+                    apply_patches_to_buffer(modified_data, patches)
+                    codeplug_store.put(filepath, modified_data)
+                    digest, data, parsed = load_image(filepath)
                 flash('All channels updated successfully!', 'success')
         
         # Validate the parsed data
-        validation = validate_eeprom(parsed)
+        validation = load_validation(digest, data)
         if not validation['valid']:
             for message in validation['messages']:
                 flash(message, 'warning')
         
-        # Extract power tables for rendering
-        vhf_power_table = parsed.powerTableVHF.table
-        uhf_power_table = parsed.powerTableUHF.table
-        
-        # Generate debug data
-        debug_data = generate_debug_data(parsed)
-        
-        return render_template('display.html', 
-                             parsed=parsed, 
-                             validation=validation,
-                             format_group_letters=format_group_letters,
-                             vhf_power_table=vhf_power_table,
-                             uhf_power_table=uhf_power_table,
-                             debug_data=debug_data)
+        # Channels, power tables and the decoded image are fetched by the page;
+        # sections whose bytes did not change come from the fragment cache
+        with timed('render'):
+            fragments = fragment_cache.render_all(
+                data, lambda template: render_template(template, parsed=parsed))
+            return render_template('display.html', 
+                                 filename=filename,
+                                 parsed=parsed, 
+                                 validation=validation,
+                                 fragments=fragments)
     except Exception as e:
         flash(f"Failed to parse file: {e}")
         return redirect(url_for('index'))
 
-def generate_debug_data(parsed):
-    """Generate a formatted string representation of the parsed data for debugging."""
+@app.route('/display/<filename>/import', methods=['POST'])
+def import_data(filename):
+    """Replace memory channels from an uploaded native or CHIRP CSV file."""
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.isfile(filepath):
+        abort(404)
+    file = request.files.get('channels')
+    if file is None or file.filename == '':
+        flash('No channel file selected', 'warning')
+        return redirect(url_for('display_data', filename=filename))
+    fmt = request.form.get('format') or None
+    if fmt is not None and fmt not in IMPORT_FORMATS:
+        flash(f'Unknown channel file format {fmt!r}', 'danger')
+        return redirect(url_for('display_data', filename=filename))
+    replace = request.form.get('replace') == '1'
     try:
-        # Create a custom dictionary with the parsed data
-        debug_dict = {
-            'vfoA': format_channel_for_debug(parsed.vfoA),
-            'vfoB': format_channel_for_debug(parsed.vfoB),
-            'settings': format_settings_for_debug(parsed.settings),
-            'powerTableVHF': {
-                'magic': parsed.powerTableVHF.magic,
-                'table': format_power_table_for_debug(parsed.powerTableVHF.table)
-            },
-            'powerTableUHF': {
-                'magic': parsed.powerTableUHF.magic,
-                'table': format_power_table_for_debug(parsed.powerTableUHF.table)
-            },
-            'bandplanMagic': parsed.bandplanMagic,
-            'memoryChannels': format_memory_channels_for_debug(parsed.memoryChannels)
-        }
-        
-        # Format the dictionary as a pretty-printed string
-        return pprint.pformat(debug_dict, indent=2, width=100)
-    except Exception as e:
-        # If anything goes wrong, return the error message
-        return f"Error generating debug data: {str(e)}\n\nParsed data type: {type(parsed)}"
+        digest, data, _ = load_image(filepath)
+        text = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+        with timed('import'):
+            patches, count = import_channels(data, text, fmt, replace,
+                                             bandplans=load_bandplans(digest, data))
+    except ChannelImportError as e:
+        # The message lists the first few bad rows; flashes live in the session cookie
+        flash(f"No channels were imported, {e}", 'danger')
+        return redirect(url_for('display_data', filename=filename))
+    except UnicodeDecodeError:
+        flash('Channel file is not UTF-8 text', 'danger')
+        return redirect(url_for('display_data', filename=filename))
+    except csv.Error as e:
+        flash(f'Channel file is not valid CSV: {e}', 'danger')
+        return redirect(url_for('display_data', filename=filename))
+    if patches:
+        with timed('write'):
+            apply_patches(filepath, patches)
+        modified_data = bytearray(data)
+        apply_patches_to_buffer(modified_data, patches)
+        codeplug_store.put(filepath, modified_data)
+    flash(f'Imported {count} channels', 'success')
+    return redirect(url_for('display_data', filename=filename))
 
-def format_power_table_for_debug(power_table):
-    """Format a power table for debug display."""
-    try:
-        # For brevity, just show the first 10 values and a summary
-        if len(power_table) > 10:
-            sample = [power_table[i] for i in range(10)]
-            return f"[{len(power_table)} values] First 10: {sample}"
-        else:
-            return list(power_table)
-    except Exception as e:
-        return f"Error formatting power table: {str(e)}"
+def load_image(filepath):
+    """Return (digest, data, parsed) for an image file. Content and parse
+    results come from the store and are shared by identical uploads."""
+    with timed('io'):
+        digest, data = codeplug_store.load(filepath)
+    parser = app.config['PARSER']
+    parsed = codeplug_store.derived(digest, ('parsed', parser), parse_image, data)
+    return digest, data, parsed
+
+def parse_image(data):
+    """Parse an image with the configured parser, counting and timing it."""
+    parser = app.config['PARSER']
+    metrics.inc('tidradio_parses_total', parser=parser)
+    with timed('parse'):
+        return get_layout(parser).parse(data)
+
+def load_validation(digest, data):
+    """Validation result for stored content, computed once per digest."""
+    parser = app.config['PARSER']
+    def validate(data):
+        parsed = codeplug_store.derived(digest, ('parsed', parser), parse_image, data)
+        with timed('validate'):
+            return validate_eeprom(parsed, data, load_bandplans(digest, data))
+    return codeplug_store.derived(digest, ('validation', parser), validate, data)
 
-def format_memory_channels_for_debug(channels):
-    """Format memory channels for debug display."""
+def load_bandplans(digest, data):
+    """Band plan index for stored content, built once per digest."""
+    return codeplug_store.derived(digest, ('bandplans',), BandPlanIndex.from_image, data)
+
+def load_codeplug(filename):
+    """Return the stored (data, parsed) image for an upload, or abort with 404."""
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.isfile(filepath):
+        abort(404)
+    _, data, parsed = load_image(filepath)
+    return data, parsed
+
+@app.route('/display/<filename>/export')
+def export_data(filename):
+    """Stream the decoded image as NDJSON (default) or incremental JSON."""
     try:
-        # For brevity, just show the first 3 channels and a summary
-        if len(channels) > 3:
-            sample = [format_channel_for_debug(channels[i]) for i in range(3)]
-            return f"[{len(channels)} channels] First 3: {sample}"
-        else:
-            return [format_channel_for_debug(channel) for channel in channels]
+        _, parsed = load_codeplug(filename)
+    except HTTPException:
+        raise
     except Exception as e:
-        return f"Error formatting memory channels: {str(e)}"
+        return Response(f"Failed to parse file: {e}\n", status=422, mimetype='text/plain')
+
+    if request.args.get('format') == 'json':
+        return Response(stream_with_context(iter_json(parsed)), mimetype='application/json')
+    return Response(stream_with_context(iter_ndjson(parsed)), mimetype='application/x-ndjson')
 
-def format_channel_for_debug(channel):
-    """Format a channel for debug display."""
+@app.route('/api/display/<filename>/channels')
+def api_channels(filename):
+    """One page of memory channels, filtered and reduced to the requested columns."""
     try:
-        # Try to decode the name as ASCII, but handle errors gracefully
-        try:
-            name = channel.name.decode('ascii', errors='replace')
-        except (AttributeError, UnicodeDecodeError):
-            name = str(channel.name)
-        
-        # Create a dictionary with channel attributes
-        channel_dict = {
-            'rxFreq': channel.rxFreq,
-            'txFreq': channel.txFreq,
-            'rxSubTone': channel.rxSubTone,
-            'txSubTone': channel.txSubTone,
-            'txPower': channel.txPower,
-            'name': name
-        }
-        
-        # Add groups if available
-        try:
-            channel_dict['groups'] = channel.groups.value
-        except AttributeError:
-            try:
-                channel_dict['groups'] = channel.groups
-            except AttributeError:
-                channel_dict['groups'] = "Unknown"
-        
-        # Add bits if available
-        try:
-            channel_dict['bits'] = {
-                'busyLock': channel.bits.busyLock,
-                'reversed': channel.bits.reversed,
-                'position': channel.bits.position,
-                'pttID': channel.bits.pttID,
-                'modulation': channel.bits.modulation,
-                'bandwidth': channel.bits.bandwidth
-            }
-        except AttributeError:
-            channel_dict['bits'] = "Unknown"
-        
-        return channel_dict
+        query = parse_query(request.args)
+        _, parsed = load_codeplug(filename)
+    except HTTPException:
+        raise
+    except QueryError as e:
+        return jsonify(error=str(e)), 400
     except Exception as e:
-        # If anything goes wrong, return a simplified representation
-        return f"Error formatting channel: {str(e)}"
+        return jsonify(error=f"Failed to parse file: {e}"), 422
+    return jsonify(query_channels(parsed.memoryChannels, **query))
 
-def format_settings_for_debug(settings):
-    """Format settings for debug display."""
-    # Create a dictionary with all the settings attributes
-    # Don't rely on __dict__ as construct objects may not have it
-    settings_dict = {
-        'magic': settings.magic,
-        'squelch': settings.squelch,
-        'dualWatch': settings.dualWatch,
-        'autoFloor': settings.autoFloor,
-        'activeVfo': settings.activeVfo,
-        'step': settings.step,
-        'rxSplit': settings.rxSplit,
-        'txSplit': settings.txSplit,
-        'pttMode': settings.pttMode,
-        'txModMeter': settings.txModMeter,
-        'micGain': settings.micGain,
-        'txDeviation': settings.txDeviation,
-        'xtal671': settings.xtal671,
-        'battStyle': settings.battStyle,
-        'scanRange': settings.scanRange,
-        'scanPersist': settings.scanPersist,
-        'scanResume': settings.scanResume,
-        'ultraScan': settings.ultraScan,
-        'toneMonitor': settings.toneMonitor,
-        'lcdBrightness': settings.lcdBrightness,
-        'lcdTimeout': settings.lcdTimeout,
-        'breathe': settings.breathe,
-        'dtmfDev': settings.dtmfDev,
-        'gamma': settings.gamma,
-        'repeaterTone': settings.repeaterTone,
-        'keyLock': settings.keyLock,
-        'bluetooth': settings.bluetooth,
-        'powerSave': settings.powerSave,
-        'keyTones': settings.keyTones,
-        'ste': settings.ste,
-        'rfGain': settings.rfGain,
-        'sBarStyle': settings.sBarStyle,
-        'sqNoiseLev': settings.sqNoiseLev,
-        'lastFmtFreq': settings.lastFmtFreq,
-        'vox': settings.vox,
-        'voxTail': settings.voxTail,
-        'txTimeout': settings.txTimeout,
-        'dimmer': settings.dimmer,
-        'dtmfSpeed': settings.dtmfSpeed,
-        'noiseGate': settings.noiseGate,
-        'scanUpdate': settings.scanUpdate,
-        'asl': settings.asl,
-        'disableFmt': settings.disableFmt,
-        'pin': settings.pin,
-        'pinAction': settings.pinAction,
-        'lcdInverted': settings.lcdInverted,
-        'afFilters': settings.afFilters,
-        'ifFreq': settings.ifFreq,
-        'sBarAlwaysOn': settings.sBarAlwaysOn,
-        'lockedVfo': settings.lockedVfo,
-        'vfoLockActive': settings.vfoLockActive
-    }
-    
-    # Add vfoState if it exists
+@app.route('/api/display/<filename>/power-tables')
+def api_power_tables(filename):
+    """Both power tables, for rendering on the client."""
     try:
-        vfo_states = []
-        for vfo_state in settings.vfoState:
-            vfo_states.append({
-                'group': vfo_state.group,
-                'lastGroup': vfo_state.lastGroup,
-                'mode': vfo_state.mode,
-                'groupModeChannels': list(vfo_state.groupModeChannels)
-            })
-        settings_dict['vfoState'] = vfo_states
-    except (AttributeError, IndexError):
-        # If vfoState doesn't exist or has a different structure, skip it
-        pass
-    
-    return settings_dict
+        _, parsed = load_codeplug(filename)
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify(error=f"Failed to parse file: {e}"), 422
+    watts = power_table_watts(parsed)
+    return jsonify({
+        'vhf': {'magic': parsed.powerTableVHF.magic, 'table': list(parsed.powerTableVHF.table),
+                'watts': watts['vhf']},
+        'uhf': {'magic': parsed.powerTableUHF.magic, 'table': list(parsed.powerTableUHF.table),
+                'watts': watts['uhf']},
+    })
 
 if __name__ == '__main__':
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Interval index over an image's band plans.
+
+The 20 bandPlans entries may overlap; like the radio, the first plan (in
+table order) that covers a frequency governs it. The index splits the
+covered frequencies into disjoint segments, each tagged with its
+governing plan, so a lookup is one bisect instead of a scan of every
+plan. lookup_array() does the same for a whole NumPy array of frequencies
+with searchsorted.
+"""
+
+import bisect
+from collections import namedtuple
+
+from fast_codec import (
+    BANDPLANS_OFFSET, BANDPLAN_COUNT, BANDPLAN_SIZE, EMPTY_FREQS,
+    decode_bandplan,
+)
+
+
+BandPlan = namedtuple(
+    'BandPlan',
+    'index startFreq endFreq maxPower bandwidth modulation wrap txAllowed',
+)
+
+
+def _plan(index, plan):
+    bits = plan['bits']
+    return BandPlan(index, plan['startFreq'], plan['endFreq'], plan['maxPower'],
+                    bits['bandwidth'], bits['modulation'], bits['wrap'], bits['txAllowed'])
+
+
+def is_active(plan):
+    """True for plans that cover a frequency range (not erased or zeroed)."""
+    return (plan.startFreq not in EMPTY_FREQS and plan.endFreq not in EMPTY_FREQS
+            and plan.startFreq <= plan.endFreq)
+
+
+class BandPlanIndex:
+    """Sorted, non-overlapping segments of the active band plans."""
+
+    __slots__ = ('plans', '_starts', '_ends', '_owners')
+
+    def __init__(self, plans):
+        """plans are bandPlans records (parsed Containers or Records) in table order."""
+        self.plans = tuple(p for p in (_plan(i, plan) for i, plan in enumerate(plans))
+                           if is_active(p))
+        # Segment boundaries are every plan start and every (end + 1)
+        bounds = sorted({p.startFreq for p in self.plans}
+                        | {p.endFreq + 1 for p in self.plans})
+        starts, ends, owners = [], [], []
+        for lo, hi in zip(bounds, bounds[1:]):
+            owner = next((p for p in self.plans if p.startFreq <= lo and hi - 1 <= p.endFreq), None)
+            if owner is None:
+                continue
+            if owners and owners[-1] is owner and ends[-1] + 1 == lo:
+                ends[-1] = hi - 1
+            else:
+                starts.append(lo)
+                ends.append(hi - 1)
+                owners.append(owner)
+        self._starts = starts
+        self._ends = ends
+        self._owners = owners
+
+    @classmethod
+    def from_image(cls, data):
+        """Build the index straight from image bytes."""
+        return cls([decode_bandplan(data, BANDPLANS_OFFSET + i * BANDPLAN_SIZE)
+                    for i in range(BANDPLAN_COUNT)])
+
+    @classmethod
+    def from_parsed(cls, parsed):
+        return cls(parsed.bandPlans)
+
+    def __len__(self):
+        return len(self.plans)
+
+    def __bool__(self):
+        return bool(self.plans)
+
+    @property
+    def segments(self):
+        """(start, end, plan) for each disjoint covered range, inclusive."""
+        return list(zip(self._starts, self._ends, self._owners))
+
+    def lookup(self, freq):
+        """The plan governing freq (10 Hz units), or None if no plan covers it."""
+        i = bisect.bisect_right(self._starts, freq) - 1
+        if i >= 0 and freq <= self._ends[i]:
+            return self._owners[i]
+        return None
+
+    def lookup_many(self, freqs):
+        """lookup() for each frequency in an iterable."""
+        return [self.lookup(freq) for freq in freqs]
+
+    def can_transmit(self, freq):
+        plan = self.lookup(freq)
+        return plan is not None and bool(plan.txAllowed)
+
+    def lookup_array(self, freqs):
+        """
+        Vectorized lookup over a NumPy array of frequencies. Returns an int
+        array of governing plan table indexes, -1 where no plan applies.
+        """
+        import numpy as np
+
+        freqs = np.asarray(freqs, dtype=np.int64)
+        result = np.full(freqs.shape, -1, dtype=np.int64)
+        if not self._starts:
+            return result
+        starts = np.asarray(self._starts, dtype=np.int64)
+        ends = np.asarray(self._ends, dtype=np.int64)
+        owners = np.asarray([p.index for p in self._owners], dtype=np.int64)
+        pos = np.searchsorted(starts, freqs, side='right') - 1
+        clipped = np.clip(pos, 0, None)
+        hit = (pos >= 0) & (freqs <= ends[clipped])
+        result[hit] = owners[clipped[hit]]
+        return result
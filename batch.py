@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+"""
+Batch processing of many EEPROM images.
+
+Parses, validates and exports every .nfw image in a directory or glob in
+parallel across a process pool, streaming one line per image as it
+completes and finishing with a summary report. --rules-only skips
+parsing and exports and runs only the byte-level validation rules, with
+the rule sections of each chunk of images checked concurrently.
+
+    python batch.py uploads/ --out exports --format json --format csv
+    python batch.py uploads/ --rules-only
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from fast_codec import EEPROM_SIZE, get_layout
+from validation import validate_eeprom
+from validation_rules import validate_batch
+from export import write_json, write_channels_csv
+
+
+def find_images(sources, pattern="*.nfw"):
+    """Expand directories (non-recursively, by pattern) and globs into paths."""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(sorted(glob.glob(os.path.join(source, pattern))))
+        else:
+            paths.extend(sorted(glob.glob(source)))
+    return paths
+
+
+def process_image(path, out_dir=None, formats=(), parser=None, fail_fast=False):
+    """
+    Parse, validate and export a single image. Returns a result dict; errors
+    are reported in it rather than raised so one bad image does not abort
+    the batch. fail_fast stops validation rules at the first error.
+    """
+    result = {'path': path, 'ok': False, 'valid': False, 'messages': [], 'outputs': []}
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        parsed = get_layout(parser).parse(data)
+        validation = validate_eeprom(parsed, data, fail_fast=fail_fast)
+        result['valid'] = validation['valid']
+        result['messages'] = validation['messages']
+
+        if out_dir:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            if 'json' in formats:
+                out = os.path.join(out_dir, stem + '.json')
+                with open(out, 'w') as f:
+                    write_json(parsed, f)
+                result['outputs'].append(out)
+            if 'csv' in formats:
+                out = os.path.join(out_dir, stem + '.csv')
+                with open(out, 'w', newline='') as f:
+                    write_channels_csv(parsed, f)
+                result['outputs'].append(out)
+        result['ok'] = True
+    except Exception as e:
+        result['messages'].append(f"Failed to process file: {e}")
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def _process(args):
+    return process_image(*args)
+
+
+def run_batch(paths, out_dir=None, formats=(), workers=None, chunksize=16, parser=None,
+              fail_fast=False):
+    """Process paths across a pool of workers, yielding results as they complete."""
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    tasks = [(path, out_dir, tuple(formats), parser, fail_fast) for path in paths]
+    if workers == 1:
+        for task in tasks:
+            yield _process(task)
+        return
+    from multiprocessing import Pool
+    with Pool(processes=workers) as pool:
+        yield from pool.imap_unordered(_process, tasks, chunksize=chunksize)
+
+
+def run_rules(paths, workers=None, chunksize=16, fail_fast=False):
+    """Validate paths with the rule engine only, returning results in order."""
+    results = []
+    images = []
+    for path in paths:
+        result = {'path': path, 'ok': False, 'valid': False, 'messages': [], 'outputs': []}
+        results.append(result)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            result['messages'].append(f"Failed to process file: {e}")
+            continue
+        if len(data) < EEPROM_SIZE:
+            result['messages'].append(
+                f"Failed to process file: image is {len(data)} bytes, expected at least {EEPROM_SIZE}")
+            continue
+        images.append((result, data))
+
+    start = time.perf_counter()
+    reports = validate_batch([data for _, data in images], fail_fast, workers, chunksize)
+    seconds = (time.perf_counter() - start) / len(images) if images else 0.0
+    for (result, _), report in zip(images, reports):
+        result['ok'] = True
+        result['valid'] = report.valid
+        result['messages'] = report.messages()
+    for result in results:
+        result['seconds'] = seconds
+    return results
+
+
+def summarize(results, elapsed):
+    """Aggregate per-image results into a summary report."""
+    failed = [r['path'] for r in results if not r['ok']]
+    invalid = [r['path'] for r in results if r['ok'] and not r['valid']]
+    return {
+        'total': len(results),
+        'parsed': len(results) - len(failed),
+        'valid': sum(1 for r in results if r['valid']),
+        'invalid': invalid,
+        'failed': failed,
+        'seconds': elapsed,
+        'images_per_second': len(results) / elapsed if elapsed else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse, validate and export EEPROM images in bulk.")
+    parser.add_argument('sources', nargs='+', help="directories or glob patterns of images")
+    parser.add_argument('--pattern', default='*.nfw', help="file pattern used inside directories")
+    parser.add_argument('--out', help="directory to write exports to")
+    parser.add_argument('--format', dest='formats', action='append', choices=('json', 'csv'),
+                        default=[], help="export format (repeatable)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunksize', type=int, default=16, help="images handed to a worker at a time")
+    parser.add_argument('--parser', choices=('fast', 'construct'), default=None)
+    parser.add_argument('--fail-fast', action='store_true',
+                        help="stop validating an image at its first error")
+    parser.add_argument('--rules-only', action='store_true',
+                        help="only run the validation rules on the raw images, without parsing or exports")
+    parser.add_argument('--report', help="write the summary report as JSON to this file")
+    parser.add_argument('--quiet', action='store_true', help="only print the summary")
+    args = parser.parse_args(argv)
+
+    if args.rules_only and args.out:
+        parser.error("--rules-only does not write exports")
+    if args.formats and not args.out:
+        parser.error("--format needs --out to write the exports to")
+
+    paths = find_images(args.sources, args.pattern)
+    if not paths:
+        print("No images found", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    results = []
+    if args.rules_only:
+        batch = run_rules(paths, args.workers, args.chunksize, args.fail_fast)
+    else:
+        batch = run_batch(paths, args.out, args.formats, args.workers, args.chunksize,
+                          args.parser, args.fail_fast)
+    for result in batch:
+        results.append(result)
+        if not args.quiet:
+            status = 'ok' if result['valid'] else ('invalid' if result['ok'] else 'error')
+            print(f"{status:8} {result['path']}", flush=True)
+            if status != 'ok':
+                for message in result['messages']:
+                    print(f"         {message}", flush=True)
+    summary = summarize(results, time.perf_counter() - start)
+
+    print(f"{summary['total']} images, {summary['valid']} valid, "
+          f"{len(summary['invalid'])} invalid, {len(summary['failed'])} failed "
+          f"in {summary['seconds']:.2f}s")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'summary': summary, 'results': results}, f, indent=2)
+    return 0 if not summary['failed'] and not summary['invalid'] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
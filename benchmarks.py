@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks for the parse, build, validate and render hot paths.
+
+Generates synthetic valid images, times each stage and the full GET/POST
+request through the Flask test client, and writes the results as JSON.
+A previous results file can be given as a baseline to flag regressions.
+--imports instead checks that the offline entry points start within their
+import-time budgets without pulling in construct, Flask or NumPy.
+
+    python benchmarks.py --out bench.json
+    python benchmarks.py --baseline bench.json --threshold 0.10
+    python benchmarks.py --imports
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from fast_codec import (
+    EEPROM_SIZE, CHANNELS_OFFSET, CHANNEL_COUNT, CHANNEL_SIZE,
+    VFO_A_OFFSET, VFO_B_OFFSET, SETTINGS_OFFSET, BANDPLAN_MAGIC_OFFSET,
+    BANDPLANS_OFFSET, BANDPLAN_COUNT, BANDPLAN_SIZE,
+    SCAN_PRESETS_OFFSET, SCAN_PRESET_COUNT, SCAN_PRESET_SIZE,
+    GROUP_LABELS_OFFSET, GROUP_LABEL_COUNT, GROUP_LABEL_SIZE,
+    DTMF_OFFSET, DTMF_COUNT, DTMF_SIZE, POWER_OFFSET,
+    POWER_TABLE_VHF_OFFSET, POWER_TABLE_UHF_OFFSET, POWER_TABLE_SIZE,
+    eepromCodec,
+)
+
+
+def synthetic_image(seed=0, programmed=150):
+    """
+    A valid 0x2000-byte image: the settings (0xD82F), band plan (0xA46D)
+    and power table (0x57/0xD1) magics are set, the first two band plans
+    allow transmit on 2 m and 70 cm, the first `programmed` channels hold
+    frequencies in those bands with subtones, groups and ASCII names, and
+    the rest are erased (0xFF), as are the scan presets, group labels and
+    DTMF presets. The settings block holds random bytes.
+    """
+    rng = random.Random(seed)
+    data = bytearray(rng.randbytes(EEPROM_SIZE))
+    for i in range(CHANNEL_COUNT):
+        offset = CHANNELS_OFFSET + i * CHANNEL_SIZE
+        if i >= programmed:
+            data[offset:offset + CHANNEL_SIZE] = b'\xFF' * CHANNEL_SIZE
+            continue
+        # Frequencies are in 10 Hz units, with a repeater split on some
+        # that keeps tx inside the band
+        if rng.random() < 0.5:
+            rx = rng.randrange(14460000, 14740000, 125)
+            tx = rx + rng.choice((0, 60000, -60000))
+        else:
+            rx = rng.randrange(43500000, 44500000, 125)
+            tx = rx + rng.choice((0, 500000, -500000))
+        data[offset:offset + 4] = rx.to_bytes(4, 'big')
+        data[offset + 4:offset + 8] = tx.to_bytes(4, 'big')
+        # Off, 88.5 Hz CTCSS or DCS 023
+        tone = rng.choice((0, 885, 0x8013))
+        data[offset + 8:offset + 10] = (tone if rng.random() < 0.5 else 0).to_bytes(2, 'big')
+        data[offset + 10:offset + 12] = tone.to_bytes(2, 'big')
+        data[offset + 12] = rng.randrange(256)
+        groups = rng.sample(range(1, 16), rng.randrange(3))
+        value = sum(g << (4 * n) for n, g in enumerate(groups))
+        data[offset + 13:offset + 15] = value.to_bytes(2, 'big')
+        data[offset + 15] = rng.randrange(256) & 0xFE
+        data[offset + 16:offset + 20] = bytes(4)
+        name = f"CH{i + 1:03d}".encode('ascii').ljust(12, b'\x00')
+        data[offset + 20:offset + 32] = name
+    data[VFO_A_OFFSET:VFO_A_OFFSET + CHANNEL_SIZE] = data[CHANNELS_OFFSET:CHANNELS_OFFSET + CHANNEL_SIZE]
+    data[VFO_B_OFFSET:VFO_B_OFFSET + CHANNEL_SIZE] = \
+        data[CHANNELS_OFFSET + CHANNEL_SIZE:CHANNELS_OFFSET + 2 * CHANNEL_SIZE]
+    for offset, size in ((SCAN_PRESETS_OFFSET, SCAN_PRESET_COUNT * SCAN_PRESET_SIZE),
+                         (GROUP_LABELS_OFFSET, GROUP_LABEL_COUNT * GROUP_LABEL_SIZE),
+                         (DTMF_OFFSET, DTMF_COUNT * DTMF_SIZE)):
+        data[offset:offset + size] = b'\xFF' * size
+    # 5 W at setting 200 on UHF, 8 W at setting 255 on VHF
+    data[POWER_OFFSET:POWER_OFFSET + 4] = bytes((5, 200, 8, 255))
+    data[SETTINGS_OFFSET:SETTINGS_OFFSET + 2] = (0xD82F).to_bytes(2, 'big')
+    data[BANDPLAN_MAGIC_OFFSET:BANDPLAN_MAGIC_OFFSET + 2] = (0xA46D).to_bytes(2, 'big')
+    plans = ((14400000, 14800000), (43000000, 45000000))
+    for i in range(BANDPLAN_COUNT):
+        offset = BANDPLANS_OFFSET + i * BANDPLAN_SIZE
+        if i < len(plans):
+            start, end = plans[i]
+            # maxPower 255, txAllowed set
+            data[offset:offset + BANDPLAN_SIZE] = (
+                start.to_bytes(4, 'big') + end.to_bytes(4, 'big') + b'\xFF\x01'
+            )
+        else:
+            data[offset:offset + BANDPLAN_SIZE] = b'\xFF' * BANDPLAN_SIZE
+    data[POWER_TABLE_VHF_OFFSET] = 0x57
+    data[POWER_TABLE_UHF_OFFSET] = 0xD1
+    for base in (POWER_TABLE_VHF_OFFSET, POWER_TABLE_UHF_OFFSET):
+        data[base + 1:base + 1 + POWER_TABLE_SIZE] = bytes(range(POWER_TABLE_SIZE))
+    return bytes(data)
+
+
+def measure(fn, repeat=5, number=None, min_time=0.2):
+    """
+    Time fn() and return per-call statistics in seconds. number is the
+    calls per repeat; by default it is calibrated to take about min_time.
+    """
+    import statistics
+
+    if number is None:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            if time.perf_counter() - start >= min_time / repeat or number >= 10000:
+                break
+            number *= 2
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        'mean': statistics.fmean(samples),
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'max': max(samples),
+        'repeat': repeat,
+        'number': number,
+    }
+
+
+def stage_benchmarks(data):
+    """Benchmarks of the individual stages, as {name: callable}."""
+    from construct_parser import eepromLayout
+    from validation import validate_eeprom
+    from export import iter_ndjson
+
+    parsed_construct = eepromLayout.parse(data)
+    parsed_fast = eepromCodec.parse(data)
+    return {
+        'parse.construct': lambda: eepromLayout.parse(data),
+        'parse.fast': lambda: eepromCodec.parse(data),
+        'build.construct': lambda: eepromLayout.build(parsed_construct),
+        'build.fast': lambda: eepromCodec.build(parsed_fast),
+        'validate': lambda: validate_eeprom(parsed_fast, data),
+        # What the display page's debug tab loads, in place of the old
+        # server-rendered debug dump
+        'export.ndjson': lambda: ''.join(iter_ndjson(parsed_fast)),
+    }
+
+
+def request_benchmarks(data, upload_dir):
+    """Benchmarks of full requests through the Flask test client."""
+    from app import app, codeplug_store
+
+    app.config['UPLOAD_FOLDER'] = upload_dir
+    app.config['TESTING'] = True
+    client = app.test_client()
+    filename = 'bench.nfw'
+    with open(os.path.join(upload_dir, filename), 'wb') as f:
+        f.write(data)
+
+    url = f'/display/{filename}'
+    form = {'channel_info': '1'}
+    form.update({'channel_index': [str(i) for i in range(CHANNEL_COUNT)]})
+
+    def get_cold():
+        codeplug_store.clear()
+        client.get(url)
+
+    def post_toggle():
+        # Alternate one flag so every POST writes a byte
+        post_toggle.state = not post_toggle.state
+        body = dict(form)
+        if post_toggle.state:
+            body['busyLock_0'] = '1'
+        client.post(url, data=body)
+    post_toggle.state = False
+
+    def render():
+        with app.test_request_context(url):
+            from flask import render_template
+            from app import fragment_cache, load_image, load_validation
+            digest, data, parsed = load_image(os.path.join(upload_dir, filename))
+            fragments = fragment_cache.render_all(
+                data, lambda template: render_template(template, parsed=parsed))
+            render_template('display.html', filename=filename, parsed=parsed,
+                            validation=load_validation(digest, data), fragments=fragments)
+
+    return {
+        'request.get': lambda: client.get(url),
+        'request.get_cold': get_cold,
+        'request.post': post_toggle,
+        'render.display': render,
+    }
+
+
+# Import-time budgets (cumulative microseconds, with a warm bytecode cache)
+# for the entry points that short-lived tools and workers start from
+IMPORT_BUDGETS = {
+    'fast_codec': 10000,
+    'codeplug_view': 12000,
+    'validation': 20000,
+    'batch': 40000,
+    'codeplug_archive': 30000,
+    'channel_import': 40000,
+    'radio_transport': 30000,
+}
+
+# Heavy packages none of the entry points above may import at startup
+FORBIDDEN_IMPORTS = ('construct', 'flask', 'werkzeug', 'jinja2', 'numpy')
+
+
+def import_time(module, repeat=5):
+    """
+    Fastest cumulative import time of module in a fresh interpreter, in
+    microseconds, and the top-level packages the import pulled in.
+    """
+    env = dict(os.environ)
+    # Startup budgets assume the bytecode cache is in use
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, '-X', 'importtime', '-c', f'import {module}']
+    subprocess.run(command, cwd=cwd, env=env, capture_output=True, check=True)
+    best, packages = None, set()
+    for _ in range(repeat):
+        result = subprocess.run(command, cwd=cwd, env=env, capture_output=True,
+                                text=True, check=True)
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            packages.add(name.strip().split('.')[0])
+            if name.strip() == module:
+                micros = int(cumulative)
+                best = micros if best is None else min(best, micros)
+    return best, packages
+
+
+def import_benchmarks(budgets=IMPORT_BUDGETS, repeat=5):
+    """import_time() of each module against its budget."""
+    report = {}
+    for module, budget in budgets.items():
+        micros, packages = import_time(module, repeat)
+        forbidden = sorted(packages.intersection(FORBIDDEN_IMPORTS))
+        report[module] = {
+            'micros': micros,
+            'budget': budget,
+            'forbidden': forbidden,
+            'over_budget': micros > budget or bool(forbidden),
+        }
+    return report
+
+
+def compare(results, baseline, threshold):
+    """Relative change of each benchmark's median against a baseline."""
+    report = {}
+    for name, result in results.items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            continue
+        change = result['median'] / old['median'] - 1
+        report[name] = {
+            'baseline': old['median'],
+            'current': result['median'],
+            'change': change,
+            'regression': change > threshold,
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark parse/build/validate/render hot paths.")
+    parser.add_argument('--out', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="relative slowdown counted as a regression (default 0.10)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--filter', help="only run benchmarks whose name contains this")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--imports', action='store_true',
+                        help="only check entry point import times against their budgets")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        status = 0
+        report = import_benchmarks(repeat=args.repeat)
+        for module, row in report.items():
+            flag = ''
+            if row['forbidden']:
+                flag = f"  imports {', '.join(row['forbidden'])}"
+            elif row['over_budget']:
+                flag = '  OVER BUDGET'
+            print(f"{module:20} {row['micros'] / 1e3:8.1f} ms  (budget {row['budget'] / 1e3:.0f} ms){flag}")
+            if row['over_budget']:
+                status = 1
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump({'imports': report}, f, indent=2)
+        return status
+
+    data = synthetic_image(args.seed)
+    with tempfile.TemporaryDirectory() as upload_dir:
+        benchmarks = stage_benchmarks(data)
+        benchmarks.update(request_benchmarks(data, upload_dir))
+
+        results = {}
+        for name, fn in benchmarks.items():
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = measure(fn, repeat=args.repeat)
+            print(f"{name:20} {results[name]['median'] * 1e3:10.3f} ms", flush=True)
+
+    import platform
+    output = {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        output['comparison'] = compare(results, baseline, args.threshold)
+        for name, row in output['comparison'].items():
+            flag = '  REGRESSION' if row['regression'] else ''
+            print(f"{name:20} {row['change'] * 100:+8.1f}%{flag}")
+            if row['regression']:
+                status = 1
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(output, f, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
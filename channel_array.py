@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+Vectorized NumPy view of the memoryChannels region (0x0040-0x1900).
+
+The structured dtype mirrors channelInfo byte for byte, so whole images,
+or stacks of thousands of images, can be queried in a single pass
+instead of iterating construct Containers.
+"""
+
+import numpy as np
+
+from fast_codec import (
+    EEPROM_SIZE, CHANNELS_OFFSET, CHANNEL_COUNT, CHANNEL_SIZE, EMPTY_FREQS,
+)
+
+# Mirrors channelInfo: big-endian fields, no alignment padding
+channel_dtype = np.dtype([
+    ("rxFreq", ">u4"),
+    ("txFreq", ">u4"),
+    ("rxSubTone", ">u2"),
+    ("txSubTone", ">u2"),
+    ("txPower", "u1"),
+    ("groups", ">u2"),
+    ("bits", "u1"),
+    ("reserved", "V4"),
+    ("name", "S12"),   # trailing NULs are dropped when read as bytes
+])
+assert channel_dtype.itemsize == CHANNEL_SIZE
+
+
+def channel_array(data):
+    """Zero-copy structured array of the 198 memory channels in one image."""
+    return np.frombuffer(data, dtype=channel_dtype,
+                         count=CHANNEL_COUNT, offset=CHANNELS_OFFSET)
+
+
+def channel_arrays(images):
+    """
+    Stack the memory channels of many images into one (n_images, 198)
+    structured array.
+    """
+    images = list(images)
+    raw = np.empty((len(images), EEPROM_SIZE), dtype=np.uint8)
+    for i, data in enumerate(images):
+        raw[i] = np.frombuffer(data, dtype=np.uint8, count=EEPROM_SIZE)
+    region = raw[:, CHANNELS_OFFSET:CHANNELS_OFFSET + CHANNEL_COUNT * CHANNEL_SIZE]
+    return np.ascontiguousarray(region).view(channel_dtype)
+
+
+def channel_bits(channels):
+    """Unpack the bits_channelinfo flag byte into one array per field."""
+    b = channels["bits"]
+    return {
+        "busyLock": (b & 0x80) != 0,
+        "reversed": (b & 0x40) != 0,
+        "position": (b & 0x20) != 0,
+        "pttID": (b >> 3) & 0x3,
+        "modulation": (b >> 2) & 0x1,
+        "bandwidth": (b & 0x02) != 0,
+    }
+
+
+def group_nibbles(channels):
+    """
+    Split the groups value into its four nibbles, lowest first, in the
+    order format_group_letters reads them. Shape is channels.shape + (4,).
+    """
+    g = channels["groups"].astype(np.uint16)
+    shifts = np.array([0, 4, 8, 12], dtype=np.uint16)
+    return ((g[..., np.newaxis] >> shifts) & 0xF).astype(np.uint8)
+
+
+def in_group(channels, letter):
+    """Boolean mask of channels assigned to group letter 'A'-'O'."""
+    number = ord(letter.upper()) - ord('A') + 1
+    if not 1 <= number <= 15:
+        raise ValueError(f"Invalid group letter {letter!r}")
+    return (group_nibbles(channels) == number).any(axis=-1)
+
+
+def is_empty(channels):
+    """Boolean mask of channels with no programmed receive frequency."""
+    rx = channels["rxFreq"]
+    return np.isin(rx, EMPTY_FREQS)
+
+
+def frequency_histogram(channels, bins):
+    """Histogram of programmed rx frequencies (in 10 Hz units)."""
+    rx = channels["rxFreq"][~is_empty(channels)]
+    return np.histogram(rx.astype(np.uint64), bins=bins)
+
+
+def duplicate_channels(channels):
+    """
+    Indices of programmed channels in a single image that repeat an earlier
+    channel's rx/tx frequency and subtone pair.
+    """
+    keys = np.stack([
+        channels["rxFreq"].astype(np.uint64),
+        channels["txFreq"].astype(np.uint64),
+        channels["rxSubTone"].astype(np.uint64),
+        channels["txSubTone"].astype(np.uint64),
+    ], axis=-1)
+    programmed = np.flatnonzero(~is_empty(channels))
+    _, first = np.unique(keys[programmed], axis=0, return_index=True)
+    duplicate = np.ones(len(programmed), dtype=bool)
+    duplicate[first] = False
+    return programmed[duplicate]
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+
+"""
+Bulk import of memory channels from CSV.
+
+Two column layouts are accepted:
+
+  native -- the columns written by export.write_channels_csv (raw field
+            values, frequencies in 10 Hz units, group letters)
+  chirp  -- a CHIRP channel export (Location, Name, Frequency, Duplex,
+            Offset, Tone, rToneFreq, cToneFreq, DtcsCode, ..., Mode, Power)
+
+Every row is checked against the image's band plans before anything is
+written, and all channels are then encoded into a copy of the 0x0040
+channel region in one pass. The changed byte ranges are returned as
+patches for patch_writer.
+
+    python channel_import.py radio.nfw channels.csv
+    python channel_import.py radio.nfw chirp.csv --replace --out new.nfw
+"""
+
+import argparse
+import csv
+import sys
+from decimal import Decimal, InvalidOperation
+
+from fast_codec import (
+    CHANNELS_OFFSET, CHANNEL_COUNT, CHANNEL_SIZE, EMPTY_FREQS,
+    POWER_OFFSET, SUBTONE_DCS, SUBTONE_DCS_INVERTED, Record, CHANNEL_STRUCT,
+)
+from bandplan_index import BandPlanIndex
+from export import format_group_letters
+from patch_writer import coalesce_patches
+
+
+# Channel flag byte bits written from the CHIRP Mode column
+MODULATION_BIT = 0x04
+BANDWIDTH_BIT = 0x02
+CHIRP_MODES = {
+    'FM': (0, 0),
+    'NFM': (0, BANDWIDTH_BIT),
+    'AM': (MODULATION_BIT, 0),
+}
+
+# Channels below this receive frequency (10 Hz units) use the VHF power limits
+VHF_UHF_SPLIT = 30000000
+
+ERASED_CHANNEL = b'\xFF' * CHANNEL_SIZE
+
+CHIRP_COLUMNS = ('Location', 'Frequency')
+
+# CSV dialects read_channels() understands
+FORMATS = ('native', 'chirp')
+
+
+class ChannelImportError(ValueError):
+    """Raised when an import has invalid rows; errors lists (line, message)."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        lines = '; '.join(f"line {line}: {message}" for line, message in errors[:10])
+        more = f" (and {len(errors) - 10} more)" if len(errors) > 10 else ''
+        super().__init__(f"{len(errors)} invalid rows: {lines}{more}")
+
+
+class _RowError(ValueError):
+    pass
+
+
+def detect_format(header):
+    """'chirp' or 'native' from a CSV header row."""
+    if all(column in header for column in CHIRP_COLUMNS):
+        return 'chirp'
+    if 'index' in header and 'rxFreq' in header:
+        return 'native'
+    raise ChannelImportError([(1, "unrecognised header, expected native or CHIRP columns")])
+
+
+def _int(row, column, default=None):
+    value = (row.get(column) or '').strip()
+    if value == '':
+        if default is None:
+            raise _RowError(f"{column} is required")
+        return default
+    try:
+        return int(value, 0)
+    except ValueError:
+        raise _RowError(f"{column} must be an integer, got {value!r}") from None
+
+
+def _mhz(value, column):
+    """MHz string to 10 Hz units."""
+    try:
+        units = Decimal(value.strip()) * 100000
+    except InvalidOperation:
+        raise _RowError(f"{column} must be a frequency in MHz, got {value!r}") from None
+    if units != units.to_integral_value():
+        raise _RowError(f"{column} {value} is not a multiple of 10 Hz")
+    return int(units)
+
+
+def encode_name(name):
+    """Channel name as the 12-byte NUL-padded field."""
+    try:
+        raw = name.encode('ascii')
+    except UnicodeEncodeError:
+        raise _RowError(f"name {name!r} is not ASCII") from None
+    if len(raw) > 12:
+        raise _RowError(f"name {name!r} is longer than 12 characters")
+    return raw.ljust(12, b'\x00')
+
+
+def encode_group_letters(letters):
+    """Inverse of export.format_group_letters: 'A,C' -> nibbles, lowest first."""
+    letters = [l.strip().upper() for l in letters.replace(' ', ',').split(',') if l.strip()]
+    if len(letters) > 4:
+        raise _RowError("a channel can be in at most 4 groups")
+    value = 0
+    for i, letter in enumerate(letters):
+        if len(letter) != 1 or not 'A' <= letter <= 'O':
+            raise _RowError(f"group {letter!r} is not a letter A-O")
+        value |= (ord(letter) - ord('A') + 1) << (i * 4)
+    return value
+
+
+def encode_ctcss(hz):
+    try:
+        value = round(Decimal(hz) * 10)
+    except InvalidOperation:
+        raise _RowError(f"CTCSS tone must be in Hz, got {hz!r}") from None
+    if not 0 < value < SUBTONE_DCS_INVERTED:
+        raise _RowError(f"CTCSS tone {hz} out of range")
+    return value
+
+
+def encode_dcs(code, polarity='N'):
+    try:
+        value = int(code, 8)
+    except ValueError:
+        raise _RowError(f"DCS code must be octal, got {code!r}") from None
+    if not 0 < value <= 0o777:
+        raise _RowError(f"DCS code {code} out of range")
+    value |= SUBTONE_DCS
+    if polarity == 'R':
+        value |= SUBTONE_DCS_INVERTED
+    return value
+
+
+def parse_native_row(row):
+    """(index, channel fields) from a row written by write_channels_csv."""
+    index = _int(row, 'index')
+    rx = _int(row, 'rxFreq')
+    if rx in EMPTY_FREQS:
+        return index, None
+    flags = (
+        (0x80 if _int(row, 'busyLock', 0) else 0)
+        | (0x40 if _int(row, 'reversed', 0) else 0)
+        | (0x20 if _int(row, 'position', 0) else 0)
+        | ((_int(row, 'pttID', 0) & 0x3) << 3)
+        | (MODULATION_BIT if _int(row, 'modulation', 0) else 0)
+        | (BANDWIDTH_BIT if _int(row, 'bandwidth', 0) else 0)
+    )
+    return index, Record(
+        rxFreq=rx,
+        txFreq=_int(row, 'txFreq', rx),
+        rxSubTone=_int(row, 'rxSubTone', 0),
+        txSubTone=_int(row, 'txSubTone', 0),
+        txPower=_int(row, 'txPower', 0),
+        groups=encode_group_letters(row.get('groups') or ''),
+        flags=flags,
+        flags_mask=0xFE,
+        name=encode_name((row.get('name') or '').rstrip('\x00')),
+    )
+
+
+def _chirp_tones(row):
+    """(rxSubTone, txSubTone) from CHIRP's Tone/CrossMode columns."""
+    mode = (row.get('Tone') or '').strip()
+    polarity = (row.get('DtcsPolarity') or 'NN').strip().upper().ljust(2, 'N')
+    dcs = row.get('DtcsCode') or ''
+    if mode == '':
+        return 0, 0
+    if mode == 'Tone':
+        return 0, encode_ctcss(row.get('rToneFreq') or '')
+    if mode == 'TSQL':
+        tone = encode_ctcss(row.get('cToneFreq') or '')
+        return tone, tone
+    if mode == 'DTCS':
+        return encode_dcs(dcs, polarity[1]), encode_dcs(dcs, polarity[0])
+    if mode != 'Cross':
+        raise _RowError(f"unsupported Tone mode {mode!r}")
+
+    cross = (row.get('CrossMode') or '').strip()
+    tx_kind, arrow, rx_kind = cross.partition('->')
+    if not arrow or tx_kind not in ('', 'Tone', 'DTCS') or rx_kind not in ('', 'Tone', 'DTCS'):
+        raise _RowError(f"unsupported CrossMode {cross!r}")
+    tx = rx = 0
+    if tx_kind == 'Tone':
+        tx = encode_ctcss(row.get('rToneFreq') or '')
+    elif tx_kind == 'DTCS':
+        tx = encode_dcs(dcs, polarity[0])
+    if rx_kind == 'Tone':
+        rx = encode_ctcss(row.get('cToneFreq') or '')
+    elif rx_kind == 'DTCS':
+        rx = encode_dcs(row.get('RxDtcsCode') or dcs, polarity[1])
+    return rx, tx
+
+
+def _chirp_power(value, rx, limits):
+    """Power setting from CHIRP's Power column ('5W', '0.5W' or a raw setting)."""
+    watts_max, setting_max = limits['VHF' if rx < VHF_UHF_SPLIT else 'UHF']
+    value = (value or '').strip().upper()
+    if value == '':
+        return setting_max
+    if not value.endswith('W'):
+        try:
+            return int(value, 0)
+        except ValueError:
+            raise _RowError(f"Power must be like 5W, got {value!r}") from None
+    try:
+        watts = Decimal(value[:-1])
+    except InvalidOperation:
+        raise _RowError(f"Power must be like 5W, got {value!r}") from None
+    if not watts_max:
+        raise _RowError("image has no power limits to convert watts to a setting")
+    return min(setting_max, round(watts * setting_max / watts_max))
+
+
+def parse_chirp_row(row, limits):
+    """(index, channel fields) from a CHIRP CSV row. Location is 1-based
+    like the channel numbers shown on the radio and in the web UI."""
+    index = _int(row, 'Location') - 1
+    frequency = (row.get('Frequency') or '').strip()
+    if frequency == '':
+        return index, None
+    rx = _mhz(frequency, 'Frequency')
+    duplex = (row.get('Duplex') or '').strip()
+    offset = (row.get('Offset') or '').strip() or '0'
+    if duplex == '':
+        tx = rx
+    elif duplex == '+':
+        tx = rx + _mhz(offset, 'Offset')
+    elif duplex == '-':
+        tx = rx - _mhz(offset, 'Offset')
+    elif duplex == 'split':
+        tx = _mhz(offset, 'Offset')
+    elif duplex == 'off':
+        tx = 0
+    else:
+        raise _RowError(f"unsupported Duplex {duplex!r}")
+    mode = (row.get('Mode') or 'FM').strip()
+    if mode not in CHIRP_MODES:
+        raise _RowError(f"unsupported Mode {mode!r}, expected one of {', '.join(CHIRP_MODES)}")
+    modulation, bandwidth = CHIRP_MODES[mode]
+    rx_tone, tx_tone = _chirp_tones(row)
+    return index, Record(
+        rxFreq=rx,
+        txFreq=tx,
+        rxSubTone=rx_tone,
+        txSubTone=tx_tone,
+        txPower=_chirp_power(row.get('Power'), rx, limits),
+        groups=None,
+        flags=modulation | bandwidth,
+        flags_mask=MODULATION_BIT | BANDWIDTH_BIT,
+        name=encode_name((row.get('Name') or '').strip()),
+    )
+
+
+def power_limits(data):
+    """{'VHF': (max watts, max setting), 'UHF': (...)} from the image."""
+    return {
+        'UHF': (data[POWER_OFFSET], data[POWER_OFFSET + 1]),
+        'VHF': (data[POWER_OFFSET + 2], data[POWER_OFFSET + 3]),
+    }
+
+
+def check_bandplans(channel, plans):
+    """Raise _RowError if the channel's frequencies fall outside the band
+    plans, or it transmits in a band where transmit is not allowed."""
+    if not plans:
+        return
+    if plans.lookup(channel.rxFreq) is None:
+        raise _RowError(f"rxFreq {channel.rxFreq / 100000:.5f} MHz is outside every band plan")
+    if channel.txFreq in EMPTY_FREQS:
+        return
+    plan = plans.lookup(channel.txFreq)
+    if plan is None:
+        raise _RowError(f"txFreq {channel.txFreq / 100000:.5f} MHz is outside every band plan")
+    if not plan.txAllowed:
+        raise _RowError(f"transmit is not allowed at {channel.txFreq / 100000:.5f} MHz")
+
+
+def read_channels(data, f, fmt=None, bandplans=None):
+    """
+    Parse and validate every row of a CSV text file against the image.
+    bandplans is the image's BandPlanIndex, built from data if not given.
+    Returns {channel index: fields or None for an erased channel}; raises
+    ChannelImportError listing every bad row.
+    """
+    if fmt is not None and fmt not in FORMATS:
+        raise ValueError(f"unknown channel file format {fmt!r}")
+    reader = csv.DictReader(f)
+    fmt = fmt or detect_format(reader.fieldnames or ())
+    plans = bandplans if bandplans is not None else BandPlanIndex.from_image(data)
+    limits = power_limits(data)
+    channels = {}
+    seen = set()
+    errors = []
+    for row in reader:
+        line = reader.line_num
+        # Cells past the header are collected in a list under the None key
+        extra = [cell for cell in row.pop(None, ()) if cell.strip()]
+        if not extra and not any((value or '').strip() for value in row.values()):
+            continue
+        try:
+            if extra:
+                raise _RowError(f"has {len(extra)} more non-empty cells than the header has columns")
+            if fmt == 'chirp':
+                index, channel = parse_chirp_row(row, limits)
+            else:
+                index, channel = parse_native_row(row)
+            if not 0 <= index < CHANNEL_COUNT:
+                raise _RowError(f"channel {index + 1} out of range 1-{CHANNEL_COUNT}")
+            if index in seen:
+                raise _RowError(f"channel {index + 1} appears more than once")
+            seen.add(index)
+            if channel is not None:
+                for field in ('rxFreq', 'txFreq'):
+                    if not 0 <= channel[field] <= 0xFFFFFFFF:
+                        raise _RowError(f"{field} out of range")
+                for field in ('rxSubTone', 'txSubTone'):
+                    if not 0 <= channel[field] <= 0xFFFF:
+                        raise _RowError(f"{field} out of range")
+                if not 0 <= channel.txPower <= 0xFF:
+                    raise _RowError("txPower out of range")
+                check_bandplans(channel, plans)
+            channels[index] = channel
+        except _RowError as e:
+            errors.append((line, str(e)))
+    if errors:
+        raise ChannelImportError(errors)
+    return channels
+
+
+def encode_channel_region(data, channels, replace=False):
+    """
+    Encode imported channels into a copy of the channel region.
+
+    Reserved bytes and channel flag bits the import does not set are kept
+    from the current record, as are CHIRP rows' groups and group values
+    that spell the same letters. With replace,
+    channels missing from the import are erased.
+    """
+    start = CHANNELS_OFFSET
+    end = CHANNELS_OFFSET + CHANNEL_COUNT * CHANNEL_SIZE
+    region = bytearray(data[start:end])
+    for index in range(CHANNEL_COUNT):
+        offset = index * CHANNEL_SIZE
+        if index not in channels:
+            if replace:
+                region[offset:offset + CHANNEL_SIZE] = ERASED_CHANNEL
+            continue
+        channel = channels[index]
+        if channel is None:
+            if region[offset:offset + 4] not in (b'\x00' * 4, b'\xFF' * 4):
+                region[offset:offset + CHANNEL_SIZE] = ERASED_CHANNEL
+            continue
+        current = CHANNEL_STRUCT.unpack_from(region, offset)
+        erased = current[0] in EMPTY_FREQS
+        groups = channel.groups
+        if groups is None:
+            groups = 0 if erased else current[5]
+        elif not erased and format_group_letters(groups) == format_group_letters(current[5]):
+            # Same groups, possibly in other nibbles; leave the value as is
+            groups = current[5]
+        kept = 0 if erased else current[6] & ~channel.flags_mask & 0xFF
+        reserved = b'\x00' * 4 if erased else current[7]
+        CHANNEL_STRUCT.pack_into(
+            region, offset,
+            channel.rxFreq, channel.txFreq, channel.rxSubTone, channel.txSubTone,
+            channel.txPower, groups, kept | channel.flags, reserved, channel.name,
+        )
+    return bytes(region)
+
+
+def region_patches(data, region):
+    """(offset, bytes) patches for the channel records that differ."""
+    patches = []
+    for index in range(CHANNEL_COUNT):
+        start = index * CHANNEL_SIZE
+        record = region[start:start + CHANNEL_SIZE]
+        offset = CHANNELS_OFFSET + start
+        if data[offset:offset + CHANNEL_SIZE] != record:
+            patches.append((offset, record))
+    return coalesce_patches(patches)
+
+
+def import_channels(data, f, fmt=None, replace=False, bandplans=None):
+    """
+    Import a CSV text file of channels into image data.
+    Returns (patches, imported channel count); apply the patches with
+    patch_writer.apply_patches or apply_patches_to_buffer.
+    """
+    channels = read_channels(data, f, fmt, bandplans)
+    region = encode_channel_region(data, channels, replace)
+    return region_patches(data, region), len(channels)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import channels from a native or CHIRP CSV file.")
+    parser.add_argument('image', help="EEPROM image to update")
+    parser.add_argument('csv', help="channel CSV file")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="CSV column layout (detected from the header by default)")
+    parser.add_argument('--replace', action='store_true',
+                        help="erase channels that are not in the CSV")
+    parser.add_argument('--out', help="write the result here instead of updating the image in place")
+    args = parser.parse_args(argv)
+
+    from patch_writer import apply_patches, apply_patches_to_buffer
+
+    with open(args.image, 'rb') as f:
+        data = f.read()
+    try:
+        with open(args.csv, newline='') as f:
+            patches, count = import_channels(data, f, args.format, args.replace)
+    except ChannelImportError as e:
+        for line, message in e.errors:
+            print(f"{args.csv}:{line}: {message}", file=sys.stderr)
+        return 1
+
+    if args.out:
+        image = bytearray(data)
+        apply_patches_to_buffer(image, patches)
+        with open(args.out, 'wb') as f:
+            f.write(image)
+        written = sum(len(chunk) for _, chunk in patches)
+    else:
+        written = apply_patches(args.image, patches)
+    print(f"Imported {count} channels, {written} bytes written")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Filtering and pagination of memory channels for the channel table API.
+"""
+
+from fast_codec import EMPTY_FREQS
+from export import CHANNEL_CSV_COLUMNS, channel_row
+
+
+class QueryError(ValueError):
+    """Raised for malformed channel query parameters."""
+
+
+def is_empty_channel(channel):
+    """True when the channel has no programmed receive frequency."""
+    return channel.rxFreq in EMPTY_FREQS
+
+
+def _parse_int(args, name):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value, 0)
+    except ValueError:
+        raise QueryError(f"{name} must be an integer, got {value!r}") from None
+
+
+def _parse_bool(args, name):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise QueryError(f"{name} must be true or false, got {value!r}")
+
+
+def parse_query(args):
+    """
+    Turn request arguments into query options:
+
+    offset, limit        -- page window over the matching channels
+    columns              -- comma-separated subset of CHANNEL_CSV_COLUMNS
+    rx_min, rx_max       -- inclusive rxFreq range, in 10 Hz units
+    group                -- group letter A-O the channel must belong to
+    modulation           -- modulation bit value
+    empty                -- true for only empty, false for only programmed
+    """
+    columns = args.get('columns')
+    if columns:
+        columns = tuple(c.strip() for c in columns.split(',') if c.strip())
+        unknown = [c for c in columns if c not in CHANNEL_CSV_COLUMNS]
+        if unknown:
+            raise QueryError(f"Unknown columns: {', '.join(unknown)}")
+        if 'index' not in columns:
+            columns = ('index',) + columns
+    else:
+        columns = CHANNEL_CSV_COLUMNS
+
+    group = args.get('group') or None
+    if group is not None:
+        group = group.strip().upper()
+        if len(group) != 1 or not 'A' <= group <= 'O':
+            raise QueryError(f"group must be a letter A-O, got {group!r}")
+
+    offset = _parse_int(args, 'offset') or 0
+    limit = _parse_int(args, 'limit')
+    if offset < 0 or (limit is not None and limit < 0):
+        raise QueryError("offset and limit must not be negative")
+
+    return {
+        'offset': offset,
+        'limit': limit,
+        'columns': columns,
+        'rx_min': _parse_int(args, 'rx_min'),
+        'rx_max': _parse_int(args, 'rx_max'),
+        'group': group,
+        'modulation': _parse_int(args, 'modulation'),
+        'empty': _parse_bool(args, 'empty'),
+    }
+
+
+def _in_group(channel, group):
+    number = ord(group) - ord('A') + 1
+    value = channel.groups.value
+    return any((value >> shift) & 0xF == number for shift in (0, 4, 8, 12))
+
+
+def filter_channels(channels, rx_min=None, rx_max=None, group=None,
+                    modulation=None, empty=None):
+    """Yield (index, channel) for the channels matching every given filter."""
+    for i, channel in enumerate(channels):
+        if empty is not None and is_empty_channel(channel) != empty:
+            continue
+        if rx_min is not None and channel.rxFreq < rx_min:
+            continue
+        if rx_max is not None and channel.rxFreq > rx_max:
+            continue
+        if modulation is not None and channel.bits.modulation != modulation:
+            continue
+        if group is not None and not _in_group(channel, group):
+            continue
+        yield i, channel
+
+
+def query_channels(channels, offset=0, limit=None, columns=CHANNEL_CSV_COLUMNS, **filters):
+    """Return one page of matching channels plus the total match count."""
+    matches = list(filter_channels(channels, **filters))
+    end = len(matches) if limit is None else offset + limit
+    rows = []
+    for i, channel in matches[offset:end]:
+        row = channel_row(i, channel)
+        rows.append({column: row[column] for column in columns})
+    return {
+        'total': len(matches),
+        'offset': offset,
+        'limit': limit,
+        'channels': rows,
+    }
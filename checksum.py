@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+Settings block checksum.
+
+The checksum is the sum, modulo 0x10000, of the big-endian 16-bit words
+of the settings block (0x1900, settingsBlock.sizeof() bytes) after its
+2-byte magic. Words are summed with array/memoryview instead of a Python
+loop, and SettingsChecksum can update the sum when only a few bytes change.
+"""
+
+import sys
+from array import array
+
+from fast_codec import SETTINGS_OFFSET, SETTINGS_SIZE
+
+# Summed range: the settings block minus its magic value
+CHECKSUM_START = SETTINGS_OFFSET + 2
+CHECKSUM_END = SETTINGS_OFFSET + SETTINGS_SIZE
+
+_SWAP = sys.byteorder == 'little'
+
+
+def sum_words(data):
+    """Sum big-endian 16-bit words of data modulo 0x10000; an odd trailing
+    byte counts as the high byte of a final word."""
+    data = memoryview(data).cast('B')
+    even = len(data) & ~1
+    words = array('H')
+    words.frombytes(data[:even])
+    if _SWAP:
+        words.byteswap()
+    total = sum(words)
+    if even != len(data):
+        total += data[even] << 8
+    return total & 0xFFFF
+
+
+def calculate_settings_checksum(settings_data):
+    """Calculate the checksum for the settings block.
+
+    settings_data is the settings block itself (starting with its magic),
+    not the whole image."""
+    # Skip the magic value itself in calculation
+    return sum_words(memoryview(settings_data)[2:])
+
+
+def image_settings_checksum(image):
+    """Checksum of the settings block inside a full image."""
+    return sum_words(memoryview(image)[CHECKSUM_START:CHECKSUM_END])
+
+
+class SettingsChecksum:
+    """
+    Running settings checksum for an image that is being edited.
+
+    Call update() (or apply_patches()) with the old and new bytes whenever
+    the image is written; only the words touched by the change are
+    re-summed.
+    """
+
+    def __init__(self, image):
+        self.value = image_settings_checksum(image)
+
+    def update(self, offset, old, new):
+        """Account for image[offset:offset + len(old)] changing from old to new."""
+        if len(old) != len(new):
+            raise ValueError("old and new must be the same length")
+        start = max(offset, CHECKSUM_START)
+        end = min(offset + len(new), CHECKSUM_END)
+        if start >= end:
+            return self.value
+        # Widen to whole words, relative to the (even) start of the range
+        start -= (start - CHECKSUM_START) & 1
+        end += (end - CHECKSUM_START) & 1
+        old_words = bytearray(end - start)
+        new_words = bytearray(end - start)
+        lo = max(offset, start)
+        hi = min(offset + len(new), end)
+        old_words[lo - start:hi - start] = old[lo - offset:hi - offset]
+        new_words[lo - start:hi - start] = new[lo - offset:hi - offset]
+        self.value = (self.value - sum_words(old_words) + sum_words(new_words)) & 0xFFFF
+        return self.value
+
+    def apply_patches(self, image, patches):
+        """Update for (offset, bytes) patches about to be applied to image."""
+        image = memoryview(image)
+        for offset, chunk in patches:
+            self.update(offset, image[offset:offset + len(chunk)], chunk)
+        return self.value
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+
+"""
+Packed multi-image archive.
+
+Layout (all integers big-endian):
+
+    header   64 bytes   magic, version, slot size, count, capacity
+    index    capacity x 128-byte entries: name, flags, SHA-256, timestamp
+    slots    capacity x 0x2000-byte images, in index order
+
+Archives are read through a read-only mmap: get() and iteration hand out
+memoryview slices of the mapping, which eepromCodec.parse(), CodeplugView
+and the validation rules accept directly, so scanning a fleet touches one
+mapped file and copies no image bytes. Appends write the slot and its
+index entry before bumping the count in the header; a full archive is
+rewritten with twice the capacity.
+
+    python codeplug_archive.py add fleet.tda uploads/
+    python codeplug_archive.py list fleet.tda
+    python codeplug_archive.py validate fleet.tda
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from fast_codec import EEPROM_SIZE
+
+
+ARCHIVE_MAGIC = b'TDRADARC'
+ARCHIVE_VERSION = 1
+SLOT_SIZE = EEPROM_SIZE
+NAME_SIZE = 84
+
+_header = struct.Struct('>8sHHIII40x')
+_entry = struct.Struct(f'>{NAME_SIZE}sI32sd')
+HEADER_SIZE = _header.size
+ENTRY_SIZE = _entry.size
+
+FLAG_DELETED = 0x1
+
+ArchiveEntry = namedtuple('ArchiveEntry', 'slot name sha256 timestamp deleted')
+
+
+class ArchiveError(ValueError):
+    """Raised for files that are not archives or operations they cannot hold."""
+
+
+def _data_offset(capacity):
+    return HEADER_SIZE + capacity * ENTRY_SIZE
+
+
+def _slot_offset(capacity, slot):
+    return _data_offset(capacity) + slot * SLOT_SIZE
+
+
+def _read_header(buf):
+    if len(buf) < HEADER_SIZE:
+        raise ArchiveError("file is too short to be an archive")
+    magic, version, _, slot_size, count, capacity = _header.unpack_from(buf, 0)
+    if magic != ARCHIVE_MAGIC:
+        raise ArchiveError("not a codeplug archive")
+    if version != ARCHIVE_VERSION:
+        raise ArchiveError(f"unsupported archive version {version}")
+    if slot_size != SLOT_SIZE:
+        raise ArchiveError(f"archive slots are {slot_size} bytes, expected {SLOT_SIZE}")
+    if count > capacity:
+        raise ArchiveError(f"archive header claims {count} images but has room for {capacity}")
+    return count, capacity
+
+
+def _encode_name(name):
+    raw = name.encode('utf-8')
+    if len(raw) > NAME_SIZE:
+        raise ArchiveError(f"name {name!r} is longer than {NAME_SIZE} bytes")
+    return raw
+
+
+def _decode_entry(buf, slot):
+    name, flags, digest, timestamp = _entry.unpack_from(buf, HEADER_SIZE + slot * ENTRY_SIZE)
+    return ArchiveEntry(slot, name.rstrip(b'\x00').decode('utf-8', errors='replace'),
+                        digest.hex(), timestamp, bool(flags & FLAG_DELETED))
+
+
+def create(path, capacity=64):
+    """Create an empty archive with room for capacity images."""
+    with open(path, 'wb') as f:
+        f.write(_header.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, 0, SLOT_SIZE, 0, capacity))
+        f.truncate(_data_offset(capacity))
+
+
+def _rewrite(path, entries, capacity):
+    """Write entries [(name, data, timestamp)] as a new archive at path, atomically."""
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.archive-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_header.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, 0, SLOT_SIZE,
+                                 len(entries), capacity))
+            index = bytearray(capacity * ENTRY_SIZE)
+            for slot, (name, data, timestamp) in enumerate(entries):
+                _entry.pack_into(index, slot * ENTRY_SIZE, _encode_name(name), 0,
+                                 hashlib.sha256(data).digest(), timestamp)
+            f.write(index)
+            for _, data, _ in entries:
+                f.write(data)
+            f.truncate(_data_offset(capacity) + len(entries) * SLOT_SIZE)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def append(path, images):
+    """
+    Append (name, data) or (name, data, timestamp) images, creating the
+    archive if needed. Returns the slots they were written to.
+    """
+    images = [(name, bytes(data[:SLOT_SIZE]), rest[0] if rest else time.time())
+              for name, data, *rest in images]
+    for name, data, _ in images:
+        _encode_name(name)
+        if len(data) != SLOT_SIZE:
+            raise ArchiveError(f"{name}: image is {len(data)} bytes, expected {SLOT_SIZE}")
+    if not os.path.exists(path):
+        create(path, capacity=max(64, len(images)))
+
+    with open(path, 'r+b') as f:
+        count, capacity = _read_header(f.read(HEADER_SIZE))
+        if count + len(images) > capacity:
+            # Out of index room: rewrite with the existing images first
+            with CodeplugArchive(path) as archive:
+                existing = [(e.name, bytes(archive.get(e.slot)), e.timestamp)
+                            for e in archive.entries(include_deleted=True)]
+                deleted = [e.slot for e in archive.entries(include_deleted=True) if e.deleted]
+            new_capacity = max(capacity * 2, count + len(images))
+            _rewrite(path, existing, new_capacity)
+            if deleted:
+                remove_slots(path, deleted)
+            return append(path, images)
+
+        slots = []
+        for name, data, timestamp in images:
+            slot = count + len(slots)
+            f.seek(_slot_offset(capacity, slot))
+            f.write(data)
+            f.seek(HEADER_SIZE + slot * ENTRY_SIZE)
+            f.write(_entry.pack(_encode_name(name), 0, hashlib.sha256(data).digest(), timestamp))
+            slots.append(slot)
+        # The count is the commit point: slots past it are ignored by readers
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(0)
+        f.write(_header.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, 0, SLOT_SIZE,
+                             count + len(slots), capacity))
+    return slots
+
+
+def remove_slots(path, slots):
+    """Mark slots as deleted; compact() reclaims their space."""
+    with open(path, 'r+b') as f:
+        count, _ = _read_header(f.read(HEADER_SIZE))
+        for slot in slots:
+            if not 0 <= slot < count:
+                raise ArchiveError(f"slot {slot} out of range")
+            offset = HEADER_SIZE + slot * ENTRY_SIZE + NAME_SIZE
+            f.seek(offset)
+            flags, = struct.unpack('>I', f.read(4))
+            f.seek(offset)
+            f.write(struct.pack('>I', flags | FLAG_DELETED))
+
+
+def remove(path, names):
+    """Mark every image with one of names as deleted. Returns the slots."""
+    names = set(names)
+    with CodeplugArchive(path) as archive:
+        slots = [e.slot for e in archive.entries() if e.name in names]
+    remove_slots(path, slots)
+    return slots
+
+
+def compact(path, dedupe=False):
+    """
+    Rewrite the archive without deleted images (and, with dedupe, without
+    repeated content, keeping the latest name for each hash), shrinking
+    the index to fit. Returns the number of images kept.
+    """
+    with CodeplugArchive(path) as archive:
+        entries = archive.entries()
+        if dedupe:
+            latest = {}
+            for entry in entries:
+                latest[entry.sha256] = entry
+            entries = sorted(latest.values(), key=lambda e: e.slot)
+        kept = [(e.name, bytes(archive.get(e.slot)), e.timestamp) for e in entries]
+    _rewrite(path, kept, max(1, len(kept)))
+    return len(kept)
+
+
+class CodeplugArchive:
+    """Read-only, memory-mapped view of an archive."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+            self._buf = memoryview(self._map)
+            self.count, self.capacity = _read_header(self._buf)
+            if size < _slot_offset(self.capacity, self.count):
+                raise ArchiveError("archive is truncated")
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        """
+        Unmap the archive. Slices handed out by get() that are still alive
+        keep the mapping open until they are released.
+        """
+        buf = getattr(self, '_buf', None)
+        if buf is not None:
+            buf.release()
+            self._buf = None
+        mapping = getattr(self, '_map', None)
+        if isinstance(mapping, mmap.mmap):
+            try:
+                mapping.close()
+            except BufferError:
+                pass
+        self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, slot):
+        if not 0 <= slot < self.count:
+            raise IndexError("archive slot out of range")
+        return _decode_entry(self._buf, slot)
+
+    def entries(self, include_deleted=False):
+        """Index entries in slot order, without deleted images by default."""
+        entries = (_decode_entry(self._buf, slot) for slot in range(self.count))
+        return [e for e in entries if include_deleted or not e.deleted]
+
+    def get(self, slot):
+        """The image in slot as a zero-copy memoryview of the mapping."""
+        if not 0 <= slot < self.count:
+            raise IndexError("archive slot out of range")
+        offset = _slot_offset(self.capacity, slot)
+        return self._buf[offset:offset + SLOT_SIZE]
+
+    def find(self, name):
+        """The latest live entry with name, or None."""
+        for entry in reversed(self.entries()):
+            if entry.name == name:
+                return entry
+        return None
+
+    def __iter__(self):
+        """(entry, memoryview) for each live image."""
+        for entry in self.entries():
+            yield entry, self.get(entry.slot)
+
+    def view(self, slot):
+        """A lazy CodeplugView over the image in slot."""
+        from codeplug_view import CodeplugView
+        return CodeplugView(self.get(slot))
+
+    def verify(self):
+        """Slots whose content no longer matches the hash in their entry."""
+        return [entry.slot for entry, data in self
+                if hashlib.sha256(data).hexdigest() != entry.sha256]
+
+
+def _image_paths(sources, pattern):
+    from batch import find_images
+    return find_images(sources, pattern)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack EEPROM images into a memory-mapped archive.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="append images (files, directories or globs)")
+    add.add_argument('archive')
+    add.add_argument('sources', nargs='+')
+    add.add_argument('--pattern', default='*.nfw')
+
+    for name, text in (('list', "list the images"), ('verify', "check image hashes"),
+                       ('validate', "run the validation rules over every image")):
+        sub = commands.add_parser(name, help=text)
+        sub.add_argument('archive')
+    commands.choices['validate'].add_argument('--fail-fast', action='store_true')
+
+    extract = commands.add_parser('extract', help="write images back out as files")
+    extract.add_argument('archive')
+    extract.add_argument('out')
+    extract.add_argument('names', nargs='*', help="only these names (default: all)")
+
+    rm = commands.add_parser('remove', help="mark images as deleted")
+    rm.add_argument('archive')
+    rm.add_argument('names', nargs='+')
+
+    pack = commands.add_parser('compact', help="drop deleted images and shrink the index")
+    pack.add_argument('archive')
+    pack.add_argument('--dedupe', action='store_true', help="also drop repeated content")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'add':
+        images = []
+        for path in _image_paths(args.sources, args.pattern):
+            with open(path, 'rb') as f:
+                images.append((os.path.basename(path), f.read(), os.path.getmtime(path)))
+        slots = append(args.archive, images)
+        print(f"Added {len(slots)} images to {args.archive}")
+        return 0
+
+    if args.command == 'remove':
+        slots = remove(args.archive, args.names)
+        print(f"Removed {len(slots)} images")
+        return 0
+
+    if args.command == 'compact':
+        print(f"Kept {compact(args.archive, args.dedupe)} images")
+        return 0
+
+    with CodeplugArchive(args.archive) as archive:
+        if args.command == 'list':
+            for entry in archive.entries():
+                stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.timestamp))
+                print(f"{entry.slot:6} {stamp} {entry.sha256[:16]} {entry.name}")
+            return 0
+
+        if args.command == 'verify':
+            bad = archive.verify()
+            for slot in bad:
+                print(f"hash mismatch in slot {slot} ({archive.entry(slot).name})")
+            return 1 if bad else 0
+
+        if args.command == 'extract':
+            os.makedirs(args.out, exist_ok=True)
+            wanted = set(args.names)
+            for entry, data in archive:
+                if wanted and entry.name not in wanted:
+                    continue
+                with open(os.path.join(args.out, os.path.basename(entry.name)), 'wb') as f:
+                    f.write(data)
+            return 0
+
+        if args.command == 'validate':
+            from validation_rules import validate_image
+            invalid = 0
+            for entry, data in archive:
+                report = validate_image(data, fail_fast=args.fail_fast)
+                if not report.valid:
+                    invalid += 1
+                    print(f"invalid  {entry.name}")
+                    for message in report.messages():
+                        print(f"         {message}")
+            print(f"{len(archive.entries())} images, {invalid} invalid")
+            return 2 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
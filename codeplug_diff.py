@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+
+"""
+Record-level diff and three-way merge of EEPROM images.
+
+Images are compared section by section using the fixed record strides of
+the layout. Unchanged records are skipped with a bytewise compare, so only
+records that differ are decoded and compared field by field. Bytes outside
+every record (padding between sections) are compared as raw bytes, so no
+change goes unreported or is dropped by a merge.
+
+    python codeplug_diff.py golden.nfw radio.nfw
+    python codeplug_diff.py --benchmark 1000
+"""
+
+import argparse
+import random
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from fast_codec import (
+    EEPROM_SIZE, CodecError,
+    VFO_A_OFFSET, VFO_B_OFFSET,
+    CHANNELS_OFFSET, CHANNEL_COUNT, CHANNEL_SIZE,
+    SETTINGS_OFFSET, SETTINGS_SIZE, SETTINGS_MAGIC, BANDPLAN_MAGIC_OFFSET,
+    BANDPLANS_OFFSET, BANDPLAN_COUNT, BANDPLAN_SIZE,
+    SCAN_PRESETS_OFFSET, SCAN_PRESET_COUNT, SCAN_PRESET_SIZE,
+    GROUP_LABELS_OFFSET, GROUP_LABEL_COUNT, GROUP_LABEL_SIZE,
+    DTMF_OFFSET, DTMF_COUNT, DTMF_SIZE,
+    POWER_OFFSET, POWER_TABLE_VHF_OFFSET, POWER_TABLE_UHF_OFFSET,
+    POWER_TABLE_SIZE, Record,
+    decode_channel, encode_channel, decode_settings, encode_settings,
+    decode_bandplan, encode_bandplan, decode_scan_preset, encode_scan_preset,
+    decode_dtmf_preset, encode_dtmf_preset,
+)
+
+
+FieldChange = namedtuple('FieldChange', 'section index field old new')
+MergeConflict = namedtuple('MergeConflict', 'section index field base ours theirs')
+
+
+_u16 = struct.Struct('>H')
+
+
+def _decode_settings(buf, offset):
+    # Decoded with any magic, so a changed magic is reported as a field
+    # change rather than failing the whole diff
+    block = bytearray(buf[offset:offset + SETTINGS_SIZE])
+    magic = _u16.unpack_from(block, 0)[0]
+    _u16.pack_into(block, 0, SETTINGS_MAGIC)
+    settings = decode_settings(block, 0)
+    settings['magic'] = magic
+    return settings
+
+
+def _encode_settings(record, buf, offset):
+    encode_settings(dict(record, magic=SETTINGS_MAGIC), buf, offset)
+    _u16.pack_into(buf, offset, record['magic'])
+
+
+def _decode_bandplan_magic(buf, offset):
+    return Record(bandplanMagic=_u16.unpack_from(buf, offset)[0])
+
+
+def _encode_bandplan_magic(record, buf, offset):
+    _u16.pack_into(buf, offset, record['bandplanMagic'])
+
+
+def _raw_section(name, start, end):
+    def decode(buf, offset):
+        return Record(data=list(buf[offset:offset + end - start]))
+
+    def encode(record, buf, offset):
+        buf[offset:offset + end - start] = bytes(record['data'])
+
+    return (name, start, None, end - start, decode, encode)
+
+
+def _decode_group_label(buf, offset):
+    return Record(label=bytes(buf[offset:offset + GROUP_LABEL_SIZE]))
+
+
+def _encode_group_label(record, buf, offset):
+    buf[offset:offset + GROUP_LABEL_SIZE] = record['label']
+
+
+def _decode_power_limits(buf, offset):
+    return Record(
+        maxPowerWattsUHF=buf[offset],
+        maxPowerSettingUHF=buf[offset + 1],
+        maxPowerWattsVHF=buf[offset + 2],
+        maxPowerSettingVHF=buf[offset + 3],
+    )
+
+
+def _encode_power_limits(record, buf, offset):
+    buf[offset] = record['maxPowerWattsUHF']
+    buf[offset + 1] = record['maxPowerSettingUHF']
+    buf[offset + 2] = record['maxPowerWattsVHF']
+    buf[offset + 3] = record['maxPowerSettingVHF']
+
+
+def _decode_power_table(buf, offset):
+    return Record(magic=buf[offset],
+                  table=list(buf[offset + 1:offset + 1 + POWER_TABLE_SIZE]))
+
+
+def _encode_power_table(record, buf, offset):
+    buf[offset] = record['magic']
+    buf[offset + 1:offset + 1 + POWER_TABLE_SIZE] = bytes(record['table'])
+
+
+# (name, offset, count, stride, decode, encode); count None = single record
+SECTIONS = (
+    ('vfoA', VFO_A_OFFSET, None, CHANNEL_SIZE, decode_channel, encode_channel),
+    ('vfoB', VFO_B_OFFSET, None, CHANNEL_SIZE, decode_channel, encode_channel),
+    ('memoryChannels', CHANNELS_OFFSET, CHANNEL_COUNT, CHANNEL_SIZE,
+     decode_channel, encode_channel),
+    ('settings', SETTINGS_OFFSET, None, SETTINGS_SIZE,
+     _decode_settings, _encode_settings),
+    ('bandplanMagic', BANDPLAN_MAGIC_OFFSET, None, 2,
+     _decode_bandplan_magic, _encode_bandplan_magic),
+    ('bandPlans', BANDPLANS_OFFSET, BANDPLAN_COUNT, BANDPLAN_SIZE,
+     decode_bandplan, encode_bandplan),
+    ('scanPresets', SCAN_PRESETS_OFFSET, SCAN_PRESET_COUNT, SCAN_PRESET_SIZE,
+     decode_scan_preset, encode_scan_preset),
+    ('groupLabels', GROUP_LABELS_OFFSET, GROUP_LABEL_COUNT, GROUP_LABEL_SIZE,
+     _decode_group_label, _encode_group_label),
+    ('dtmfPresets', DTMF_OFFSET, DTMF_COUNT, DTMF_SIZE,
+     decode_dtmf_preset, encode_dtmf_preset),
+    ('powerLimits', POWER_OFFSET, None, 4,
+     _decode_power_limits, _encode_power_limits),
+    ('powerTableVHF', POWER_TABLE_VHF_OFFSET, None, POWER_TABLE_SIZE + 1,
+     _decode_power_table, _encode_power_table),
+    ('powerTableUHF', POWER_TABLE_UHF_OFFSET, None, POWER_TABLE_SIZE + 1,
+     _decode_power_table, _encode_power_table),
+)
+
+
+def _uncovered(sections):
+    """(start, end) byte ranges of the image outside every section."""
+    position = 0
+    for _, offset, count, stride, _, _ in sorted(sections, key=lambda s: s[1]):
+        if offset > position:
+            yield position, offset
+        position = max(position, offset + stride * (count or 1))
+    if position < EEPROM_SIZE:
+        yield position, EEPROM_SIZE
+
+
+# Padding between sections, compared byte by byte as unused_0xSTART
+SECTIONS += tuple(_raw_section(f'unused_0x{start:04X}', start, end)
+                  for start, end in _uncovered(SECTIONS))
+
+# Derived views that duplicate another field and are left out of diffs
+_SKIP_FIELDS = frozenset(('groups.single',))
+
+
+def _as_view(data):
+    view = memoryview(data).cast('B')
+    if len(view) < EEPROM_SIZE:
+        raise CodecError(f"image is {len(view)} bytes, expected at least {EEPROM_SIZE}")
+    return view[:EEPROM_SIZE]
+
+
+def flatten(record, prefix=''):
+    """Flatten a decoded record into {dotted.path: leaf value}."""
+    fields = {}
+    for key, value in record.items():
+        if str(key).startswith('_'):
+            continue
+        path = f'{prefix}{key}'
+        if path in _SKIP_FIELDS:
+            continue
+        if isinstance(value, dict):
+            fields.update(flatten(value, path + '.'))
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                if isinstance(item, dict):
+                    fields.update(flatten(item, f'{path}[{i}].'))
+                else:
+                    fields[f'{path}[{i}]'] = item
+        else:
+            fields[path] = value
+    return fields
+
+
+def _set_path(record, path, value):
+    """Set a dotted path produced by flatten() inside a nested record."""
+    target = record
+    parts = path.split('.')
+    for part in parts[:-1]:
+        target = _step(target, part)
+    last = parts[-1]
+    if last.endswith(']'):
+        name, index = last[:-1].split('[')
+        target[name][int(index)] = value
+    else:
+        target[last] = value
+
+
+def _step(target, part):
+    if part.endswith(']'):
+        name, index = part[:-1].split('[')
+        return target[name][int(index)]
+    return target[part]
+
+
+def changed_records(a, b):
+    """Yield (section, index, offset, stride, decode, encode) for records whose
+    bytes differ, skipping whole unchanged sections with one compare."""
+    for name, offset, count, stride, decode, encode in SECTIONS:
+        total = stride * (count or 1)
+        if a[offset:offset + total] == b[offset:offset + total]:
+            continue
+        if count is None:
+            yield name, None, offset, stride, decode, encode
+            continue
+        for i in range(count):
+            start = offset + i * stride
+            if a[start:start + stride] != b[start:start + stride]:
+                yield name, i, start, stride, decode, encode
+
+
+def diff_images(old, new):
+    """List the field-level changes between two images."""
+    a = _as_view(old)
+    b = _as_view(new)
+    changes = []
+    if a == b:
+        return changes
+    for name, index, offset, stride, decode, _ in changed_records(a, b):
+        before = flatten(decode(a, offset))
+        after = flatten(decode(b, offset))
+        found = len(changes)
+        for field, value in after.items():
+            if before.get(field) != value:
+                changes.append(FieldChange(name, index, field, before.get(field), value))
+        if len(changes) == found:
+            # Only bits no decoder exposes changed (e.g. the channel flag padding bit)
+            changes.append(FieldChange(name, index, 'raw', bytes(a[offset:offset + stride]),
+                                       bytes(b[offset:offset + stride])))
+    return changes
+
+
+def merge_images(base, ours, theirs):
+    """
+    Three-way merge of two edited images against their common base.
+
+    Records changed on only one side are taken from that side byte for byte.
+    Records changed on both sides are merged field by field; fields changed
+    differently on both sides are conflicts, resolved in favour of ours.
+    Returns (merged image bytes, list of MergeConflict).
+    """
+    b = _as_view(base)
+    o = _as_view(ours)
+    t = _as_view(theirs)
+    merged = bytearray(o)
+    conflicts = []
+    if o == t or t == b:
+        return bytes(merged), conflicts
+    if o == b:
+        return bytes(t), conflicts
+
+    for name, index, offset, stride, decode, encode in changed_records(b, t):
+        end = offset + stride
+        if o[offset:end] == b[offset:end]:
+            merged[offset:end] = t[offset:end]
+            continue
+        if o[offset:end] == t[offset:end]:
+            continue
+        base_fields = flatten(decode(b, offset))
+        our_fields = flatten(decode(o, offset))
+        their_fields = flatten(decode(t, offset))
+        record = decode(o, offset)
+        for field, their_value in their_fields.items():
+            base_value = base_fields.get(field)
+            our_value = our_fields.get(field)
+            if their_value == base_value or their_value == our_value:
+                continue
+            if our_value == base_value:
+                _set_path(record, field, their_value)
+            else:
+                conflicts.append(MergeConflict(name, index, field,
+                                               base_value, our_value, their_value))
+        # Apply only the bits the merge changed, so bits no decoder exposes
+        # (e.g. the channel flag padding bit) keep their values from ours
+        before = bytearray(stride)
+        after = bytearray(stride)
+        encode(decode(o, offset), before, 0)
+        encode(record, after, 0)
+        for i in range(stride):
+            merged[offset + i] = o[offset + i] ^ before[i] ^ after[i]
+
+    return bytes(merged), conflicts
+
+
+def benchmark(pairs=1000, edits=5, seed=0):
+    """Time diffing pairs of images that differ in a few random bytes."""
+    from benchmarks import synthetic_image
+
+    rng = random.Random(seed)
+    golden = synthetic_image(seed)
+    images = []
+    for _ in range(pairs):
+        edited = bytearray(golden)
+        for _ in range(edits):
+            offset = rng.randrange(EEPROM_SIZE)
+            if offset in (0x1900, 0x1901, 0x1A00, 0x1A01, 0x1E00, 0x1F00):
+                continue
+            edited[offset] = rng.randrange(256)
+        images.append(bytes(edited))
+
+    start = time.perf_counter()
+    changes = sum(len(diff_images(golden, image)) for image in images)
+    elapsed = time.perf_counter() - start
+    return {
+        'pairs': pairs,
+        'edits_per_pair': edits,
+        'field_changes': changes,
+        'seconds': elapsed,
+        'pairs_per_second': pairs / elapsed if elapsed else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diff or merge EEPROM images record by record.")
+    parser.add_argument('images', nargs='*', help="OLD NEW to diff, or BASE OURS THEIRS to merge")
+    parser.add_argument('--merge-out', help="write the three-way merge of BASE OURS THEIRS here")
+    parser.add_argument('--benchmark', type=int, metavar='PAIRS',
+                        help="time diffing this many synthetic image pairs")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        result = benchmark(args.benchmark)
+        print(f"Diffed {result['pairs']} pairs ({result['field_changes']} field changes) "
+              f"in {result['seconds']:.3f}s, {result['pairs_per_second']:.0f} pairs/s")
+        return 0
+
+    images = []
+    for path in args.images:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+
+    if args.merge_out:
+        if len(images) != 3:
+            parser.error("--merge-out needs BASE OURS THEIRS")
+        merged, conflicts = merge_images(*images)
+        with open(args.merge_out, 'wb') as f:
+            f.write(merged)
+        for c in conflicts:
+            where = c.section if c.index is None else f"{c.section}[{c.index}]"
+            print(f"CONFLICT {where}.{c.field}: base={c.base!r} ours={c.ours!r} theirs={c.theirs!r}")
+        return 1 if conflicts else 0
+
+    if len(images) != 2:
+        parser.error("expected OLD NEW")
+    for c in diff_images(*images):
+        where = c.section if c.index is None else f"{c.section}[{c.index}]"
+        print(f"{where}.{c.field}: {c.old!r} -> {c.new!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
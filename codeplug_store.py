@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""
+Content-addressed in-memory store of codeplug images.
+
+Raw images are keyed by their SHA-256, so identical uploads under
+different names are held once, and everything derived from an image
+(parse, validation, exports) is computed once per content and shared by
+every name that maps to it. Filenames map to hashes, stamped with the
+file's (mtime, size): a hot image is served from memory after a stat,
+without reading the file. Entries are evicted least-recently-used first
+once their estimated memory exceeds the configured budget, together with
+the names that pointed at them.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+
+def estimate_size(obj):
+    """Rough deep size in bytes of a decoded image (dicts, lists, slotted
+    records, scalars)."""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif hasattr(type(item), '__slots__'):
+            stack.extend(getattr(item, name, None) for name in type(item).__slots__)
+    return total
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class CodeplugStore:
+    """Images keyed by content hash, plus a filename -> hash index."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0           # images served without reading the file
+        self.misses = 0
+        self.derived_hits = 0   # parse/validate/export results reused
+        self.derived_misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()   # digest -> {'data', 'derived', 'cost', 'names'}
+        self._names = {}                # abspath -> (stamp, digest)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self, path):
+        """Return (digest, data) for the file at path, reading it only when
+        its content is not already held for the current (mtime, size)."""
+        abspath = os.path.abspath(path)
+        stamp = self._stamp(abspath)
+        with self._lock:
+            known = self._names.get(abspath)
+            if known is not None and known[0] == stamp and known[1] in self._entries:
+                digest = known[1]
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return digest, self._entries[digest]['data']
+            self.misses += 1
+
+        with open(abspath, "rb") as f:
+            data = f.read()
+        return self._add(abspath, stamp, data), data
+
+    def put(self, path, data):
+        """Record that the file at path now holds data (after writing it),
+        so the next load() does not need to read it back."""
+        abspath = os.path.abspath(path)
+        return self._add(abspath, self._stamp(abspath), bytes(data))
+
+    def add(self, data):
+        """Hold an image that has no file name; returns its digest."""
+        return self._add(None, None, bytes(data))
+
+    def _add(self, abspath, stamp, data):
+        digest = content_hash(data)
+        with self._lock:
+            entry = self._hold(digest, data)
+            if abspath is not None:
+                self._unname(abspath)
+                self._names[abspath] = (stamp, digest)
+                entry['names'].add(abspath)
+            self._evict()
+        return digest
+
+    def _hold(self, digest, data):
+        # Caller holds the lock and evicts afterwards
+        entry = self._entries.get(digest)
+        if entry is None:
+            entry = {'data': data, 'derived': {}, 'cost': len(data), 'names': set()}
+            self._entries[digest] = entry
+            self._bytes += entry['cost']
+        else:
+            self._entries.move_to_end(digest)
+        return entry
+
+    def _unname(self, abspath):
+        # Caller holds the lock
+        known = self._names.pop(abspath, None)
+        if known is not None:
+            entry = self._entries.get(known[1])
+            if entry is not None:
+                entry['names'].discard(abspath)
+
+    def get(self, digest):
+        """Raw image for digest, or None if it is not held."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            return entry['data'] if entry is not None else None
+
+    def derived(self, digest, key, compute, data=None):
+        """
+        Return the result stored under key for this content, computing it
+        as compute(data) on first use. Results are shared by every name
+        whose content has this digest, so they must not be mutated.
+
+        data is the content for digest, as returned by load(). If another
+        thread evicted it since, it is held again rather than raising
+        KeyError; without data an evicted digest raises KeyError.
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                if data is None:
+                    raise KeyError(digest)
+                entry = self._hold(digest, data)
+                self._evict()
+            if key in entry['derived']:
+                self.derived_hits += 1
+                self._entries.move_to_end(digest)
+                return entry['derived'][key]
+            self.derived_misses += 1
+            data = entry['data']
+
+        result = compute(data)
+        cost = estimate_size(result)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and key not in entry['derived']:
+                entry['derived'][key] = result
+                entry['cost'] += cost
+                self._bytes += cost
+                self._evict()
+        return result
+
+    def _evict(self):
+        # Never evict the most recently used entry, even if over budget
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry['cost']
+            self.evictions += 1
+            for abspath in entry['names']:
+                self._names.pop(abspath, None)
+
+    def invalidate(self, path):
+        """Forget which content path holds; the content itself stays cached."""
+        with self._lock:
+            self._unname(os.path.abspath(path))
+
+    def aliases(self, digest):
+        """Names currently known to hold the content with this digest."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            return sorted(entry['names']) if entry is not None else []
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._names.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Hit/miss counters and current memory use."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'derived_hits': self.derived_hits,
+                'derived_misses': self.derived_misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'names': len(self._names),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
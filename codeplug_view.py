@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+"""
+Lazy, offset-indexed view over an EEPROM image.
+
+Unlike eepromLayout.parse(), nothing is decoded up front: each section,
+and each individual channel, is decoded from its fixed offset the first
+time it is accessed and cached afterwards.
+"""
+
+from collections.abc import Sequence
+from functools import cached_property
+
+from fast_codec import (
+    EEPROM_SIZE, CodecError, Record,
+    VFO_A_OFFSET, VFO_B_OFFSET,
+    CHANNELS_OFFSET, CHANNEL_COUNT, CHANNEL_SIZE,
+    BANDPLAN_MAGIC_OFFSET, BANDPLAN_MAGIC,
+    BANDPLANS_OFFSET, BANDPLAN_COUNT, BANDPLAN_SIZE,
+    SCAN_PRESETS_OFFSET, SCAN_PRESET_COUNT, SCAN_PRESET_SIZE,
+    GROUP_LABELS_OFFSET, GROUP_LABEL_COUNT, GROUP_LABEL_SIZE,
+    DTMF_OFFSET, DTMF_COUNT, DTMF_SIZE,
+    decode_channel, decode_settings, decode_bandplan,
+    decode_scan_preset, decode_dtmf_preset, decode_power,
+)
+
+
+class LazyRecords(Sequence):
+    """Fixed-stride array of records decoded one at a time on access."""
+
+    def __init__(self, buf, offset, count, stride, decode):
+        self._buf = buf
+        self._offset = offset
+        self._count = count
+        self._stride = stride
+        self._decode = decode
+        self._cache = [None] * count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("record index out of range")
+        record = self._cache[index]
+        if record is None:
+            record = self._decode(self._buf, self._offset + index * self._stride)
+            self._cache[index] = record
+        return record
+
+    def raw(self, index):
+        """Return the undecoded bytes of one record as a memoryview."""
+        start = self._offset + index * self._stride
+        return self._buf[start:start + self._stride]
+
+    @property
+    def decoded_count(self):
+        """Number of records decoded so far."""
+        return sum(record is not None for record in self._cache)
+
+
+def _decode_group_label(buf, offset):
+    return bytes(buf[offset:offset + GROUP_LABEL_SIZE])
+
+
+class CodeplugView:
+    """
+    Read-only view of an EEPROM image exposing the same attribute names as
+    eepromLayout.parse(): vfoA, vfoB, memoryChannels, settings, bandPlans,
+    scanPresets, groupLabels, dtmfPresets and the power tables.
+    """
+
+    def __init__(self, data):
+        if len(data) < EEPROM_SIZE:
+            raise CodecError(
+                f"image is {len(data)} bytes, expected at least {EEPROM_SIZE}"
+            )
+        buf = memoryview(data)
+        if buf.format != "B" or buf.ndim != 1:
+            buf = buf.cast("B")
+        self._buf = buf[:EEPROM_SIZE]
+
+    @property
+    def raw(self):
+        """The underlying image as a memoryview."""
+        return self._buf
+
+    # 0x0000
+    @cached_property
+    def vfoA(self):
+        return decode_channel(self._buf, VFO_A_OFFSET)
+
+    # 0x0020
+    @cached_property
+    def vfoB(self):
+        return decode_channel(self._buf, VFO_B_OFFSET)
+
+    # 0x0040
+    @cached_property
+    def memoryChannels(self):
+        return LazyRecords(self._buf, CHANNELS_OFFSET, CHANNEL_COUNT,
+                           CHANNEL_SIZE, decode_channel)
+
+    # 0x1900
+    @cached_property
+    def settings(self):
+        return decode_settings(self._buf)
+
+    # 0x1A00
+    @cached_property
+    def bandplanMagic(self):
+        magic = (self._buf[BANDPLAN_MAGIC_OFFSET] << 8) | self._buf[BANDPLAN_MAGIC_OFFSET + 1]
+        if magic != BANDPLAN_MAGIC:
+            raise CodecError(
+                f"parsing bandplanMagic: expected 0x{BANDPLAN_MAGIC:04X}, found 0x{magic:04X}"
+            )
+        return magic
+
+    @cached_property
+    def bandPlans(self):
+        return LazyRecords(self._buf, BANDPLANS_OFFSET, BANDPLAN_COUNT,
+                           BANDPLAN_SIZE, decode_bandplan)
+
+    # 0x1B00
+    @cached_property
+    def scanPresets(self):
+        return LazyRecords(self._buf, SCAN_PRESETS_OFFSET, SCAN_PRESET_COUNT,
+                           SCAN_PRESET_SIZE, decode_scan_preset)
+
+    # 0x1C90
+    @cached_property
+    def groupLabels(self):
+        return LazyRecords(self._buf, GROUP_LABELS_OFFSET, GROUP_LABEL_COUNT,
+                           GROUP_LABEL_SIZE, _decode_group_label)
+
+    # 0x1CF0
+    @cached_property
+    def dtmfPresets(self):
+        return LazyRecords(self._buf, DTMF_OFFSET, DTMF_COUNT,
+                           DTMF_SIZE, decode_dtmf_preset)
+
+    # 0x1DFC
+    @cached_property
+    def _power(self):
+        return decode_power(self._buf)
+
+    @property
+    def maxPowerWattsUHF(self):
+        return self._power.maxPowerWattsUHF
+
+    @property
+    def maxPowerSettingUHF(self):
+        return self._power.maxPowerSettingUHF
+
+    @property
+    def maxPowerWattsVHF(self):
+        return self._power.maxPowerWattsVHF
+
+    @property
+    def maxPowerSettingVHF(self):
+        return self._power.maxPowerSettingVHF
+
+    @property
+    def powerTableVHF(self):
+        return self._power.powerTableVHF
+
+    @property
+    def powerTableUHF(self):
+        return self._power.powerTableUHF
+
+    def materialize(self):
+        """Decode every section and return a Record equal to eepromLayout.parse()."""
+        parsed = Record(
+            vfoA=self.vfoA,
+            vfoB=self.vfoB,
+            memoryChannels=list(self.memoryChannels),
+            settings=self.settings,
+            bandplanMagic=self.bandplanMagic,
+            bandPlans=list(self.bandPlans),
+            scanPresets=list(self.scanPresets),
+            groupLabels=list(self.groupLabels),
+            dtmfPresets=list(self.dtmfPresets),
+        )
+        parsed.update(self._power)
+        return parsed
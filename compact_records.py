@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+
+"""
+Compact in-memory records for decoded images.
+
+Parsed channels, band plans, scan presets and DTMF presets are dicts
+(construct Containers or fast_codec Records) with nested dicts for their
+bitfields. The classes here keep each record in __slots__ and hold the
+bitfields as the packed integers stored in the image. Nested fields are
+decoded on access. Field names are the same as in construct_parser, and
+from_record()/to_record()/to_container() convert to and from the
+dict-based records.
+
+CompactCodeplug holds a whole image as its bytes and decodes these records
+on access, for keeping many decoded images resident.
+"""
+
+from collections.abc import Sequence
+
+from fast_codec import (
+    EEPROM_SIZE, CodecError, Record,
+    VFO_A_OFFSET, VFO_B_OFFSET,
+    CHANNELS_OFFSET, CHANNEL_COUNT, CHANNEL_SIZE,
+    SETTINGS_OFFSET, BANDPLAN_MAGIC_OFFSET, BANDPLAN_MAGIC,
+    BANDPLANS_OFFSET, BANDPLAN_COUNT, BANDPLAN_SIZE,
+    SCAN_PRESETS_OFFSET, SCAN_PRESET_COUNT, SCAN_PRESET_SIZE,
+    GROUP_LABELS_OFFSET, GROUP_LABEL_COUNT, GROUP_LABEL_SIZE,
+    DTMF_OFFSET, DTMF_COUNT, DTMF_SIZE,
+    POWER_OFFSET, POWER_TABLE_VHF_OFFSET, POWER_TABLE_UHF_OFFSET, POWER_TABLE_SIZE,
+    POWER_TABLE_VHF_MAGIC, POWER_TABLE_UHF_MAGIC, eepromCodec,
+    decode_channel_bits, encode_channel_bits, decode_groups, encode_groups,
+    decode_settings,
+    CHANNEL_STRUCT, BANDPLAN_STRUCT, SCAN_PRESET_STRUCT, DTMF_STRUCT,
+)
+
+
+class CompactRecord:
+    """Base for slotted records; subclasses list their fields in __slots__."""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def unpack_from(cls, buf, offset=0):
+        """Decode one record from buf at offset."""
+        return cls(*cls._struct.unpack_from(buf, offset))
+
+    def pack_into(self, buf, offset=0):
+        """Encode the record into buf at offset."""
+        self._struct.pack_into(buf, offset, *self._values())
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return self._values() == other._values()
+        if isinstance(other, dict):
+            return self.to_record() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_record()!r})"
+
+    def to_container(self):
+        """The record as a construct Container, as eepromLayout.parse() returns."""
+        return _to_container(self.to_record())
+
+    def __getstate__(self):
+        return self._values()
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+
+def _to_container(value):
+    from construct import Container, ListContainer
+
+    if isinstance(value, dict):
+        return Container((k, _to_container(v)) for k, v in value.items()
+                         if not str(k).startswith('_'))
+    if isinstance(value, list):
+        return ListContainer(_to_container(v) for v in value)
+    return value
+
+
+class CompactChannel(CompactRecord):
+    """channelInfo; groups and bits are kept as the raw u16 and flag byte."""
+
+    __slots__ = ('rxFreq', 'txFreq', 'rxSubTone', 'txSubTone', 'txPower',
+                 'groupsValue', 'flags', 'reserved', 'name')
+    _struct = CHANNEL_STRUCT
+
+    @classmethod
+    def unpack_from(cls, buf, offset=0):
+        return cls.from_tuple(CHANNEL_STRUCT.unpack_from(buf, offset))
+
+    @classmethod
+    def from_tuple(cls, t):
+        # Bit 0 of the flag byte is padding, which construct drops
+        return cls(t[0], t[1], t[2], t[3], t[4], t[5], t[6] & 0xFE, t[7], t[8])
+
+    @property
+    def groups(self):
+        return decode_groups(self.groupsValue)
+
+    @property
+    def bits(self):
+        return decode_channel_bits(self.flags)
+
+    @classmethod
+    def from_record(cls, channel):
+        return cls(channel['rxFreq'], channel['txFreq'],
+                   channel['rxSubTone'], channel['txSubTone'], channel['txPower'],
+                   encode_groups(channel['groups']),
+                   encode_channel_bits(channel['bits']),
+                   bytes(channel['reserved']), bytes(channel['name']))
+
+    def to_record(self):
+        return Record(rxFreq=self.rxFreq, txFreq=self.txFreq,
+                      rxSubTone=self.rxSubTone, txSubTone=self.txSubTone,
+                      txPower=self.txPower, groups=self.groups, bits=self.bits,
+                      reserved=self.reserved, name=self.name)
+
+
+class CompactBandPlan(CompactRecord):
+    """bandPlan; bits is kept as the packed byte."""
+
+    __slots__ = ('startFreq', 'endFreq', 'maxPower', 'flags')
+    _struct = BANDPLAN_STRUCT
+
+    @property
+    def bits(self):
+        b = self.flags
+        return Record(bandwidth=b >> 5, modulation=(b >> 2) & 0x7,
+                      wrap=bool(b & 0x02), txAllowed=bool(b & 0x01))
+
+    @classmethod
+    def from_record(cls, plan):
+        bits = plan['bits']
+        return cls(plan['startFreq'], plan['endFreq'], plan['maxPower'],
+                   ((bits['bandwidth'] & 0x7) << 5)
+                   | ((bits['modulation'] & 0x7) << 2)
+                   | (0x02 if bits['wrap'] else 0)
+                   | (0x01 if bits['txAllowed'] else 0))
+
+    def to_record(self):
+        return Record(startFreq=self.startFreq, endFreq=self.endFreq,
+                      maxPower=self.maxPower, bits=self.bits)
+
+
+class CompactScanPreset(CompactRecord):
+    """scanPreset; bits is kept as the packed byte."""
+
+    __slots__ = ('startFreq', 'range', 'step', 'resume', 'persist', 'flags', 'label')
+    _struct = SCAN_PRESET_STRUCT
+
+    @property
+    def bits(self):
+        return Record(ultrascan=self.flags >> 2, modulation=self.flags & 0x3)
+
+    @classmethod
+    def from_record(cls, preset):
+        bits = preset['bits']
+        return cls(preset['startFreq'], preset['range'], preset['step'],
+                   preset['resume'], preset['persist'],
+                   ((bits['ultrascan'] & 0x3F) << 2) | (bits['modulation'] & 0x3),
+                   bytes(preset['label']))
+
+    def to_record(self):
+        return Record(startFreq=self.startFreq, range=self.range, step=self.step,
+                      resume=self.resume, persist=self.persist, bits=self.bits,
+                      label=self.label)
+
+
+class CompactDtmfPreset(CompactRecord):
+    """DTMF preset; the dtmfSequence is kept as its packed u32 and u8."""
+
+    __slots__ = ('first', 'second', 'sequenceLabel')
+    _struct = DTMF_STRUCT
+
+    @property
+    def sequence(self):
+        first, second = self.first, self.second
+        return Record(
+            first=Record(d6=first >> 28, d5=(first >> 24) & 0xF,
+                         d4=(first >> 20) & 0xF, d3=(first >> 16) & 0xF,
+                         d2=(first >> 12) & 0xF, d1=(first >> 8) & 0xF,
+                         d0=(first >> 4) & 0xF, length=first & 0xF),
+            second=Record(d8=second >> 4, d7=second & 0xF),
+        )
+
+    @classmethod
+    def from_record(cls, preset):
+        first = preset['sequence']['first']
+        second = preset['sequence']['second']
+        packed = 0
+        for name in ('d6', 'd5', 'd4', 'd3', 'd2', 'd1', 'd0', 'length'):
+            packed = (packed << 4) | (first[name] & 0xF)
+        return cls(packed, ((second['d8'] & 0xF) << 4) | (second['d7'] & 0xF),
+                   bytes(preset['sequenceLabel']))
+
+    def to_record(self):
+        return Record(sequence=self.sequence, sequenceLabel=self.sequenceLabel)
+
+
+class CompactPowerTable(CompactRecord):
+    """powerTableVHF/UHF with the 255 entries kept as bytes."""
+
+    __slots__ = ('magic', 'table')
+
+    @classmethod
+    def unpack_from(cls, buf, offset=0):
+        return cls(buf[offset], bytes(buf[offset + 1:offset + 1 + POWER_TABLE_SIZE]))
+
+    def pack_into(self, buf, offset=0):
+        buf[offset] = self.magic
+        buf[offset + 1:offset + 1 + POWER_TABLE_SIZE] = self.table
+
+    @classmethod
+    def from_record(cls, table):
+        return cls(table['magic'], bytes(table['table']))
+
+    def to_record(self):
+        return Record(magic=self.magic, table=list(self.table))
+
+
+class RecordArray(Sequence):
+    """Fixed-stride records in an image buffer, decoded on every access."""
+
+    __slots__ = ('_buf', '_offset', '_count', '_stride', '_decode')
+
+    def __init__(self, buf, offset, count, stride, decode):
+        self._buf = buf
+        self._offset = offset
+        self._count = count
+        self._stride = stride
+        self._decode = decode
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("record index out of range")
+        return self._decode(self._buf, self._offset + index * self._stride)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, Sequence)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+
+def _group_label(buf, offset):
+    return bytes(buf[offset:offset + GROUP_LABEL_SIZE])
+
+
+class CompactCodeplug:
+    """
+    A decoded image held as its 0x2000 bytes, with the attribute names of
+    eepromLayout.parse(). Records are decoded on access into the compact
+    classes above and are not cached, so a resident image costs little more
+    than its bytes. Build a new image (from_record()) to change it.
+    """
+
+    __slots__ = ('_data', '__weakref__')
+
+    def __init__(self, data):
+        if len(data) < EEPROM_SIZE:
+            raise CodecError(f"image is {len(data)} bytes, expected at least {EEPROM_SIZE}")
+        data = bytes(data[:EEPROM_SIZE])
+        magic = int.from_bytes(data[BANDPLAN_MAGIC_OFFSET:BANDPLAN_MAGIC_OFFSET + 2], 'big')
+        if magic != BANDPLAN_MAGIC:
+            raise CodecError(
+                f"parsing bandplanMagic: expected 0x{BANDPLAN_MAGIC:04X}, found 0x{magic:04X}"
+            )
+        for name, offset, expected in (
+                ('powerTableVHF', POWER_TABLE_VHF_OFFSET, POWER_TABLE_VHF_MAGIC),
+                ('powerTableUHF', POWER_TABLE_UHF_OFFSET, POWER_TABLE_UHF_MAGIC)):
+            if data[offset] != expected:
+                raise CodecError(
+                    f"parsing {name}.magic: expected 0x{expected:02X}, found 0x{data[offset]:02X}"
+                )
+        # Settings carries the remaining magic check
+        decode_settings(data, SETTINGS_OFFSET)
+        self._data = data
+
+    @classmethod
+    def from_record(cls, parsed):
+        """Compact a parsed image (construct Container or fast_codec Record)."""
+        return cls(eepromCodec.build(parsed))
+
+    @property
+    def raw(self):
+        """The image bytes as given, including padding and unused regions."""
+        return self._data
+
+    def build(self):
+        """The image as eepromLayout.build() would produce it from the parse,
+        i.e. with padding and unused regions zeroed."""
+        return eepromCodec.build(self.to_record())
+
+    @property
+    def vfoA(self):
+        return CompactChannel.unpack_from(self._data, VFO_A_OFFSET)
+
+    @property
+    def vfoB(self):
+        return CompactChannel.unpack_from(self._data, VFO_B_OFFSET)
+
+    @property
+    def memoryChannels(self):
+        return RecordArray(self._data, CHANNELS_OFFSET, CHANNEL_COUNT,
+                           CHANNEL_SIZE, CompactChannel.unpack_from)
+
+    @property
+    def settings(self):
+        return decode_settings(self._data, SETTINGS_OFFSET)
+
+    @property
+    def bandplanMagic(self):
+        return BANDPLAN_MAGIC
+
+    @property
+    def bandPlans(self):
+        return RecordArray(self._data, BANDPLANS_OFFSET, BANDPLAN_COUNT,
+                           BANDPLAN_SIZE, CompactBandPlan.unpack_from)
+
+    @property
+    def scanPresets(self):
+        return RecordArray(self._data, SCAN_PRESETS_OFFSET, SCAN_PRESET_COUNT,
+                           SCAN_PRESET_SIZE, CompactScanPreset.unpack_from)
+
+    @property
+    def groupLabels(self):
+        return RecordArray(self._data, GROUP_LABELS_OFFSET, GROUP_LABEL_COUNT,
+                           GROUP_LABEL_SIZE, _group_label)
+
+    @property
+    def dtmfPresets(self):
+        return RecordArray(self._data, DTMF_OFFSET, DTMF_COUNT,
+                           DTMF_SIZE, CompactDtmfPreset.unpack_from)
+
+    @property
+    def maxPowerWattsUHF(self):
+        return self._data[POWER_OFFSET]
+
+    @property
+    def maxPowerSettingUHF(self):
+        return self._data[POWER_OFFSET + 1]
+
+    @property
+    def maxPowerWattsVHF(self):
+        return self._data[POWER_OFFSET + 2]
+
+    @property
+    def maxPowerSettingVHF(self):
+        return self._data[POWER_OFFSET + 3]
+
+    @property
+    def powerTableVHF(self):
+        return CompactPowerTable.unpack_from(self._data, POWER_TABLE_VHF_OFFSET)
+
+    @property
+    def powerTableUHF(self):
+        return CompactPowerTable.unpack_from(self._data, POWER_TABLE_UHF_OFFSET)
+
+    def to_record(self):
+        """A Record equal to eepromLayout.parse() of the same image."""
+        return eepromCodec.parse(self._data)
+
+    def to_container(self):
+        """The image as construct Containers, as eepromLayout.parse() returns."""
+        return _to_container(self.to_record())
+
+    def __eq__(self, other):
+        if isinstance(other, CompactCodeplug):
+            # Images that differ only in padding decode to the same records
+            return self._data == other._data or self.to_record() == other.to_record()
+        if isinstance(other, dict):
+            return self.to_record() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (type(self), (self._data,))
+
+
+def compact_image(data):
+    """Wrap image bytes in a CompactCodeplug, checking the layout's magics."""
+    return CompactCodeplug(data)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+"""
+JSON and CSV export of parsed EEPROM images.
+
+Works on the output of either eepromLayout.parse() or eepromCodec.parse().
+"""
+
+import csv
+import json
+
+from lookup_tables import group_letters
+
+
+CHANNEL_CSV_COLUMNS = (
+    'index', 'name', 'rxFreq', 'txFreq', 'rxSubTone', 'txSubTone',
+    'txPower', 'groups', 'busyLock', 'reversed', 'position', 'pttID',
+    'modulation', 'bandwidth',
+)
+
+
+def format_group_letters(group_value):
+    """Convert a group value into letters A-O.
+    Each nibble (4 bits) represents one group number (1-15).
+    Returns up to 4 letters representing the groups."""
+    return group_letters(group_value)
+
+
+_SCALARS = (int, bool, float, str, type(None))
+
+
+def to_jsonable(obj):
+    """Recursively convert parsed records into JSON-serializable values.
+    Byte fields become hex strings; stream references (_io) are dropped."""
+    if isinstance(obj, dict):
+        return {
+            k: v if type(v) in _SCALARS else to_jsonable(v)
+            for k, v in obj.items()
+            if not str(k).startswith('_')
+        }
+    if isinstance(obj, (list, tuple)):
+        return [v if type(v) in _SCALARS else to_jsonable(v) for v in obj]
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).hex()
+    return obj
+
+
+def channel_row(index, channel):
+    """Flatten one channel into a dict keyed by CHANNEL_CSV_COLUMNS."""
+    bits = channel.bits
+    return {
+        'index': index,
+        'name': channel.name.decode('ascii', errors='replace').rstrip('\x00'),
+        'rxFreq': channel.rxFreq,
+        'txFreq': channel.txFreq,
+        'rxSubTone': channel.rxSubTone,
+        'txSubTone': channel.txSubTone,
+        'txPower': channel.txPower,
+        'groups': format_group_letters(channel.groups.value),
+        'busyLock': int(bits.busyLock),
+        'reversed': int(bits.reversed),
+        'position': int(bits.position),
+        'pttID': bits.pttID,
+        'modulation': bits.modulation,
+        'bandwidth': int(bits.bandwidth),
+    }
+
+
+def write_json(parsed, f):
+    """Write the whole parsed image as a JSON document to a text file."""
+    # json.dumps without indent uses the C encoder; dump() with indent does not
+    f.write(json.dumps(to_jsonable(parsed)))
+
+
+def write_channels_csv(parsed, f):
+    """Write the memory channels as CSV rows to a text file."""
+    writer = csv.writer(f)
+    writer.writerow(CHANNEL_CSV_COLUMNS)
+    for i, channel in enumerate(parsed.memoryChannels):
+        row = channel_row(i, channel)
+        writer.writerow([row[column] for column in CHANNEL_CSV_COLUMNS])
+
+
+# Top-level fields in layout order; arrays are streamed one record per line
+SECTIONS = (
+    'vfoA', 'vfoB', 'memoryChannels', 'settings', 'bandplanMagic',
+    'bandPlans', 'scanPresets', 'groupLabels', 'dtmfPresets',
+    'maxPowerWattsUHF', 'maxPowerSettingUHF', 'maxPowerWattsVHF',
+    'maxPowerSettingVHF', 'powerTableVHF', 'powerTableUHF',
+)
+ARRAY_SECTIONS = frozenset((
+    'memoryChannels', 'bandPlans', 'scanPresets', 'groupLabels', 'dtmfPresets',
+))
+
+
+def iter_records(parsed):
+    """Walk the layout section by section, yielding (section, index, value).
+    Index is None for non-array sections. Accepts a lazy CodeplugView too,
+    in which case records are decoded only as they are reached."""
+    for section in SECTIONS:
+        value = getattr(parsed, section)
+        if section in ARRAY_SECTIONS:
+            for i, record in enumerate(value):
+                yield section, i, record
+        else:
+            yield section, None, value
+
+
+def iter_ndjson(parsed):
+    """Yield the image as NDJSON, one line per section or array record."""
+    for section, index, value in iter_records(parsed):
+        line = {'section': section}
+        if index is not None:
+            line['index'] = index
+        line['data'] = to_jsonable(value)
+        yield json.dumps(line) + '\n'
+
+
+def iter_json(parsed):
+    """Yield the image as one JSON object, produced incrementally in chunks."""
+    yield '{'
+    current = None
+    for section, index, value in iter_records(parsed):
+        if section != current:
+            if current is not None:
+                yield ']' if current in ARRAY_SECTIONS else ''
+                yield ', '
+            yield json.dumps(section) + ': '
+            if index is not None:
+                yield '['
+            current = section
+        elif index:
+            yield ', '
+        yield json.dumps(to_jsonable(value))
+    if current in ARRAY_SECTIONS:
+        yield ']'
+    yield '}'
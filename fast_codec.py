@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+
+"""
+Precompiled codec for the EEPROM image described by construct_parser.
+
+The construct definitions are interpreted field by field on every parse and
+build. This module decodes and encodes the very same layout with
+precomputed struct.Struct formats and bit masks over a memoryview, and
+produces records that compare equal to the construct Containers.
+"""
+
+import os
+import struct
+from io import BytesIO
+
+from lookup_tables import CHANNEL_FLAGS
+
+
+EEPROM_SIZE = 0x2000
+
+
+class CodecError(ValueError):
+    """Raised when an image or record does not match the layout."""
+
+
+class Record(dict):
+    """
+    Lightweight stand-in for construct's Container: a dict with attribute
+    access. Keys starting with an underscore are ignored for equality,
+    like construct does with its stream references.
+    """
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __delattr__(self, name):
+        try:
+            del self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, dict):
+            return NotImplemented
+        mine = {k: v for k, v in self.items() if not str(k).startswith("_")}
+        theirs = {k: v for k, v in other.items() if not str(k).startswith("_")}
+        return mine == theirs
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{k}={v!r}" for k, v in self.items() if not str(k).startswith("_")
+        )
+        return f"Record({fields})"
+
+
+#
+# Offsets and strides (see the comments in construct_parser.eepromLayout)
+#
+VFO_A_OFFSET = 0x0000
+VFO_B_OFFSET = 0x0020
+CHANNELS_OFFSET = 0x0040
+CHANNEL_COUNT = 198
+CHANNEL_SIZE = 32
+SETTINGS_OFFSET = 0x1900
+SETTINGS_SIZE = 0x80
+BANDPLAN_MAGIC_OFFSET = 0x1A00
+BANDPLANS_OFFSET = 0x1A02
+BANDPLAN_COUNT = 20
+BANDPLAN_SIZE = 10
+SCAN_PRESETS_OFFSET = 0x1B00
+SCAN_PRESET_COUNT = 20
+SCAN_PRESET_SIZE = 20
+GROUP_LABELS_OFFSET = 0x1C90
+GROUP_LABEL_COUNT = 16
+GROUP_LABEL_SIZE = 6
+DTMF_OFFSET = 0x1CF0
+DTMF_COUNT = 20
+DTMF_SIZE = 13
+POWER_OFFSET = 0x1DFC
+POWER_TABLE_VHF_OFFSET = 0x1E00
+POWER_TABLE_UHF_OFFSET = 0x1F00
+POWER_TABLE_SIZE = 255
+
+SETTINGS_MAGIC = 0xD82F
+BANDPLAN_MAGIC = 0xA46D
+POWER_TABLE_VHF_MAGIC = 0x57
+POWER_TABLE_UHF_MAGIC = 0xD1
+
+# Unset channels are left erased (0xFF) or zeroed
+EMPTY_FREQS = (0x00000000, 0xFFFFFFFF)
+
+# Subtone encoding: 0 is off, CTCSS is in 0.1 Hz units, DCS is the octal
+# code's value with the DCS flag set (plus the inverted flag for "R")
+SUBTONE_DCS = 0x8000
+SUBTONE_DCS_INVERTED = 0x4000
+
+
+#
+# Precompiled formats. The record structs are public for modules that
+# unpack records in bulk (validation_rules, compact_records, channel_import)
+#
+CHANNEL_STRUCT = struct.Struct(">IIHHBHB4s12s")
+BANDPLAN_STRUCT = struct.Struct(">IIBB")
+SCAN_PRESET_STRUCT = struct.Struct(">IHHBBB9s")
+DTMF_STRUCT = struct.Struct(">IB8s")
+_group_label = struct.Struct(">6s")
+_u16 = struct.Struct(">H")
+_power = struct.Struct(">BBBBB255s")
+
+_SETTINGS_HEAD = (
+    ("magic", "H"), ("squelch", "B"), ("dualWatch", "B"),
+    ("autoFloor", "B"), ("activeVfo", "B"), ("step", "H"),
+    ("rxSplit", "H"), ("txSplit", "H"), ("pttMode", "B"),
+    ("txModMeter", "B"), ("micGain", "B"), ("txDeviation", "B"),
+    ("xtal671", "B"), ("battStyle", "B"), ("scanRange", "H"),
+    ("scanPersist", "H"), ("scanResume", "B"), ("ultraScan", "B"),
+    ("toneMonitor", "B"), ("lcdBrightness", "B"), ("lcdTimeout", "B"),
+    ("breathe", "B"), ("dtmfDev", "B"), ("gamma", "B"),
+    ("repeaterTone", "H"),
+)
+_SETTINGS_TAIL = (
+    ("keyLock", "B"), ("bluetooth", "B"), ("powerSave", "B"),
+    ("keyTones", "B"), ("ste", "B"), ("rfGain", "B"),
+    ("sBarStyle", "B"), ("sqNoiseLev", "B"), ("lastFmtFreq", "I"),
+    ("vox", "B"), ("voxTail", "H"), ("txTimeout", "B"),
+    ("dimmer", "B"), ("dtmfSpeed", "B"), ("noiseGate", "B"),
+    ("scanUpdate", "B"), ("asl", "B"), ("disableFmt", "B"),
+    ("pin", "H"), ("pinAction", "B"), ("lcdInverted", "B"),
+    ("afFilters", "B"), ("ifFreq", "B"), ("sBarAlwaysOn", "B"),
+    ("lockedVfo", "B"), ("vfoLockActive", "B"), ("filler", "27s"),
+)
+_VFO_STATE_COUNT = 2
+_VFO_STATE_FORMAT = "BB16BB"
+_VFO_STATE_LEN = 19
+
+_settings = struct.Struct(
+    ">"
+    + "".join(code for _, code in _SETTINGS_HEAD)
+    + _VFO_STATE_FORMAT * _VFO_STATE_COUNT
+    + "".join(code for _, code in _SETTINGS_TAIL)
+)
+_SETTINGS_HEAD_NAMES = tuple(name for name, _ in _SETTINGS_HEAD)
+_SETTINGS_TAIL_NAMES = tuple(name for name, _ in _SETTINGS_TAIL)
+_SETTINGS_VFO_START = len(_SETTINGS_HEAD)
+_SETTINGS_TAIL_START = _SETTINGS_VFO_START + _VFO_STATE_COUNT * _VFO_STATE_LEN
+
+assert CHANNEL_STRUCT.size == CHANNEL_SIZE
+assert _settings.size == SETTINGS_SIZE
+assert BANDPLAN_STRUCT.size == BANDPLAN_SIZE
+assert SCAN_PRESET_STRUCT.size == SCAN_PRESET_SIZE
+assert DTMF_STRUCT.size == DTMF_SIZE
+
+
+#
+# Bitfield helpers (BitStruct fields are packed most significant bit first)
+#
+def decode_channel_bits(b):
+    """Decode the channelInfo flag byte into the bits_channelinfo fields."""
+    return Record(CHANNEL_FLAGS[b])
+
+
+def encode_channel_bits(bits):
+    """Encode bits_channelinfo fields into the flag byte (padding bit is 0)."""
+    return (
+        (0x80 if bits["busyLock"] else 0)
+        | (0x40 if bits["reversed"] else 0)
+        | (0x20 if bits["position"] else 0)
+        | ((bits["pttID"] & 0x3) << 3)
+        | ((bits["modulation"] & 0x1) << 2)
+        | (0x02 if bits["bandwidth"] else 0)
+    )
+
+
+def decode_groups(value):
+    """Decode the groups union: raw value plus its four nibbles."""
+    return Record(
+        value=value,
+        single=Record(
+            g0=(value >> 12) & 0xF,
+            g1=(value >> 8) & 0xF,
+            g2=(value >> 4) & 0xF,
+            g3=value & 0xF,
+        ),
+    )
+
+
+def encode_groups(groups):
+    """Encode the groups union, preferring 'value' like construct's Union."""
+    if "value" in groups:
+        return groups["value"]
+    single = groups["single"]
+    return (
+        ((single["g0"] & 0xF) << 12)
+        | ((single["g1"] & 0xF) << 8)
+        | ((single["g2"] & 0xF) << 4)
+        | (single["g3"] & 0xF)
+    )
+
+
+def _check_bytes(name, value, size):
+    if len(value) != size:
+        raise CodecError(f"{name} must be {size} bytes, got {len(value)}")
+    return bytes(value)
+
+
+def _check_const(name, value, expected, fmt):
+    if value != expected:
+        raise CodecError(
+            f"parsing {name}: expected 0x{expected:{fmt}}, found 0x{value:{fmt}}"
+        )
+
+
+#
+# Record decoders / encoders
+#
+def decode_channel(buf, offset=0):
+    """Decode one 32-byte channelInfo record from buf at offset."""
+    return _channel_from_tuple(CHANNEL_STRUCT.unpack_from(buf, offset))
+
+
+def _channel_from_tuple(t):
+    rx, tx, rx_tone, tx_tone, power, groups, bits, reserved, name = t
+    return Record(
+        rxFreq=rx,
+        txFreq=tx,
+        rxSubTone=rx_tone,
+        txSubTone=tx_tone,
+        txPower=power,
+        groups=decode_groups(groups),
+        bits=decode_channel_bits(bits),
+        reserved=reserved,
+        name=name,
+    )
+
+
+def encode_channel(channel, buf, offset=0):
+    """Encode one channelInfo record into buf at offset."""
+    CHANNEL_STRUCT.pack_into(
+        buf, offset,
+        channel["rxFreq"],
+        channel["txFreq"],
+        channel["rxSubTone"],
+        channel["txSubTone"],
+        channel["txPower"],
+        encode_groups(channel["groups"]),
+        encode_channel_bits(channel["bits"]),
+        _check_bytes("reserved", channel["reserved"], 4),
+        _check_bytes("name", channel["name"], 12),
+    )
+
+
+def decode_settings(buf, offset=SETTINGS_OFFSET):
+    """Decode the 0x80-byte settingsBlock from buf at offset."""
+    values = _settings.unpack_from(buf, offset)
+    _check_const("magic", values[0], SETTINGS_MAGIC, "04X")
+    settings = Record(zip(_SETTINGS_HEAD_NAMES, values))
+    vfo_states = []
+    pos = _SETTINGS_VFO_START
+    for _ in range(_VFO_STATE_COUNT):
+        vfo_states.append(Record(
+            group=values[pos],
+            lastGroup=values[pos + 1],
+            groupModeChannels=list(values[pos + 2:pos + 18]),
+            mode=values[pos + 18],
+        ))
+        pos += _VFO_STATE_LEN
+    settings["vfoState"] = vfo_states
+    settings.update(zip(_SETTINGS_TAIL_NAMES, values[_SETTINGS_TAIL_START:]))
+    return settings
+
+
+def encode_settings(settings, buf, offset=SETTINGS_OFFSET):
+    """Encode a settingsBlock into buf at offset."""
+    if settings.get("magic") not in (None, SETTINGS_MAGIC):
+        raise CodecError(f"settings magic must be 0x{SETTINGS_MAGIC:04X}")
+    values = [SETTINGS_MAGIC]
+    values.extend(settings[name] for name in _SETTINGS_HEAD_NAMES[1:])
+    vfo_states = settings["vfoState"]
+    if len(vfo_states) != _VFO_STATE_COUNT:
+        raise CodecError(f"vfoState must have {_VFO_STATE_COUNT} entries")
+    for state in vfo_states:
+        channels = state["groupModeChannels"]
+        if len(channels) != 16:
+            raise CodecError("groupModeChannels must have 16 entries")
+        values.append(state["group"])
+        values.append(state["lastGroup"])
+        values.extend(channels)
+        values.append(state["mode"])
+    values.extend(settings[name] for name in _SETTINGS_TAIL_NAMES[:-1])
+    values.append(_check_bytes("filler", settings["filler"], 27))
+    _settings.pack_into(buf, offset, *values)
+
+
+def decode_bandplan(buf, offset):
+    """Decode one 10-byte bandPlan record from buf at offset."""
+    start, end, power, bits = BANDPLAN_STRUCT.unpack_from(buf, offset)
+    return Record(
+        startFreq=start,
+        endFreq=end,
+        maxPower=power,
+        bits=Record(
+            bandwidth=bits >> 5,
+            modulation=(bits >> 2) & 0x7,
+            wrap=bool(bits & 0x02),
+            txAllowed=bool(bits & 0x01),
+        ),
+    )
+
+
+def encode_bandplan(plan, buf, offset):
+    """Encode one bandPlan record into buf at offset."""
+    bits = plan["bits"]
+    BANDPLAN_STRUCT.pack_into(
+        buf, offset,
+        plan["startFreq"],
+        plan["endFreq"],
+        plan["maxPower"],
+        ((bits["bandwidth"] & 0x7) << 5)
+        | ((bits["modulation"] & 0x7) << 2)
+        | (0x02 if bits["wrap"] else 0)
+        | (0x01 if bits["txAllowed"] else 0),
+    )
+
+
+def decode_scan_preset(buf, offset):
+    """Decode one 20-byte scanPreset record from buf at offset."""
+    start, rng, step, resume, persist, bits, label = \
+        SCAN_PRESET_STRUCT.unpack_from(buf, offset)
+    return Record(
+        startFreq=start,
+        range=rng,
+        step=step,
+        resume=resume,
+        persist=persist,
+        bits=Record(ultrascan=bits >> 2, modulation=bits & 0x3),
+        label=label,
+    )
+
+
+def encode_scan_preset(preset, buf, offset):
+    """Encode one scanPreset record into buf at offset."""
+    bits = preset["bits"]
+    SCAN_PRESET_STRUCT.pack_into(
+        buf, offset,
+        preset["startFreq"],
+        preset["range"],
+        preset["step"],
+        preset["resume"],
+        preset["persist"],
+        ((bits["ultrascan"] & 0x3F) << 2) | (bits["modulation"] & 0x3),
+        _check_bytes("label", preset["label"], 9),
+    )
+
+
+def decode_dtmf_preset(buf, offset):
+    """Decode one 13-byte DTMF preset (sequence plus label) at offset."""
+    first, second, label = DTMF_STRUCT.unpack_from(buf, offset)
+    return Record(
+        sequence=Record(
+            first=Record(
+                d6=first >> 28,
+                d5=(first >> 24) & 0xF,
+                d4=(first >> 20) & 0xF,
+                d3=(first >> 16) & 0xF,
+                d2=(first >> 12) & 0xF,
+                d1=(first >> 8) & 0xF,
+                d0=(first >> 4) & 0xF,
+                length=first & 0xF,
+            ),
+            second=Record(d8=second >> 4, d7=second & 0xF),
+        ),
+        sequenceLabel=label,
+    )
+
+
+def encode_dtmf_preset(preset, buf, offset):
+    """Encode one DTMF preset into buf at offset."""
+    first = preset["sequence"]["first"]
+    second = preset["sequence"]["second"]
+    DTMF_STRUCT.pack_into(
+        buf, offset,
+        ((first["d6"] & 0xF) << 28)
+        | ((first["d5"] & 0xF) << 24)
+        | ((first["d4"] & 0xF) << 20)
+        | ((first["d3"] & 0xF) << 16)
+        | ((first["d2"] & 0xF) << 12)
+        | ((first["d1"] & 0xF) << 8)
+        | ((first["d0"] & 0xF) << 4)
+        | (first["length"] & 0xF),
+        ((second["d8"] & 0xF) << 4) | (second["d7"] & 0xF),
+        _check_bytes("sequenceLabel", preset["sequenceLabel"], 8),
+    )
+
+
+def decode_power(buf, offset=POWER_OFFSET):
+    """Decode the power limits and both power tables at offset."""
+    (watts_uhf, setting_uhf, watts_vhf, setting_vhf,
+     vhf_magic, vhf_table) = _power.unpack_from(buf, offset)
+    _check_const("powerTableVHF.magic", vhf_magic, POWER_TABLE_VHF_MAGIC, "02X")
+    uhf_magic = buf[offset + 4 + 256]
+    _check_const("powerTableUHF.magic", uhf_magic, POWER_TABLE_UHF_MAGIC, "02X")
+    uhf_start = offset + 4 + 256 + 1
+    return Record(
+        maxPowerWattsUHF=watts_uhf,
+        maxPowerSettingUHF=setting_uhf,
+        maxPowerWattsVHF=watts_vhf,
+        maxPowerSettingVHF=setting_vhf,
+        powerTableVHF=Record(magic=vhf_magic, table=list(vhf_table)),
+        powerTableUHF=Record(
+            magic=uhf_magic,
+            table=list(buf[uhf_start:uhf_start + POWER_TABLE_SIZE]),
+        ),
+    )
+
+
+def _encode_power_table(name, table, magic, buf, offset):
+    if table.get("magic") not in (None, magic):
+        raise CodecError(f"{name}.magic must be 0x{magic:02X}")
+    values = table["table"]
+    if len(values) != POWER_TABLE_SIZE:
+        raise CodecError(f"{name}.table must have {POWER_TABLE_SIZE} entries")
+    buf[offset] = magic
+    buf[offset + 1:offset + 1 + POWER_TABLE_SIZE] = bytes(values)
+
+
+class EepromCodec:
+    """
+    Drop-in replacement for eepromLayout's parse/build pair.
+
+    parse() returns nested Records with the same field names and values as
+    eepromLayout.parse(); build() accepts either Records or construct
+    Containers and returns the same bytes as eepromLayout.build().
+    """
+
+    size = EEPROM_SIZE
+
+    def sizeof(self):
+        return EEPROM_SIZE
+
+    def parse(self, data):
+        if len(data) < EEPROM_SIZE:
+            raise CodecError(
+                f"image is {len(data)} bytes, expected at least {EEPROM_SIZE}"
+            )
+        buf = memoryview(data)
+        if buf.format != "B" or buf.ndim != 1:
+            buf = buf.cast("B")
+
+        bandplan_magic = _u16.unpack_from(buf, BANDPLAN_MAGIC_OFFSET)[0]
+        settings = decode_settings(buf)
+        _check_const("bandplanMagic", bandplan_magic, BANDPLAN_MAGIC, "04X")
+        power = decode_power(buf)
+
+        # Mirror construct, which keeps a reference to the parsed stream
+        stream = BytesIO(bytes(buf[:EEPROM_SIZE]))
+        settings["_io"] = stream
+
+        parsed = Record(
+            _io=stream,
+            vfoA=decode_channel(buf, VFO_A_OFFSET),
+            vfoB=decode_channel(buf, VFO_B_OFFSET),
+            memoryChannels=[
+                _channel_from_tuple(t)
+                for t in CHANNEL_STRUCT.iter_unpack(
+                    buf[CHANNELS_OFFSET:CHANNELS_OFFSET + CHANNEL_COUNT * CHANNEL_SIZE]
+                )
+            ],
+            settings=settings,
+            bandplanMagic=bandplan_magic,
+            bandPlans=[
+                decode_bandplan(buf, BANDPLANS_OFFSET + i * BANDPLAN_SIZE)
+                for i in range(BANDPLAN_COUNT)
+            ],
+            scanPresets=[
+                decode_scan_preset(buf, SCAN_PRESETS_OFFSET + i * SCAN_PRESET_SIZE)
+                for i in range(SCAN_PRESET_COUNT)
+            ],
+            groupLabels=[
+                bytes(buf[o:o + GROUP_LABEL_SIZE])
+                for o in range(
+                    GROUP_LABELS_OFFSET,
+                    GROUP_LABELS_OFFSET + GROUP_LABEL_COUNT * GROUP_LABEL_SIZE,
+                    GROUP_LABEL_SIZE,
+                )
+            ],
+            dtmfPresets=[
+                decode_dtmf_preset(buf, DTMF_OFFSET + i * DTMF_SIZE)
+                for i in range(DTMF_COUNT)
+            ],
+        )
+        parsed.update(power)
+        return parsed
+
+    def build(self, obj):
+        buf = bytearray(EEPROM_SIZE)
+
+        encode_channel(obj["vfoA"], buf, VFO_A_OFFSET)
+        encode_channel(obj["vfoB"], buf, VFO_B_OFFSET)
+        channels = obj["memoryChannels"]
+        if len(channels) != CHANNEL_COUNT:
+            raise CodecError(f"memoryChannels must have {CHANNEL_COUNT} entries")
+        for i, channel in enumerate(channels):
+            encode_channel(channel, buf, CHANNELS_OFFSET + i * CHANNEL_SIZE)
+
+        encode_settings(obj["settings"], buf)
+
+        if obj.get("bandplanMagic") not in (None, BANDPLAN_MAGIC):
+            raise CodecError(f"bandplanMagic must be 0x{BANDPLAN_MAGIC:04X}")
+        _u16.pack_into(buf, BANDPLAN_MAGIC_OFFSET, BANDPLAN_MAGIC)
+        plans = obj["bandPlans"]
+        if len(plans) != BANDPLAN_COUNT:
+            raise CodecError(f"bandPlans must have {BANDPLAN_COUNT} entries")
+        for i, plan in enumerate(plans):
+            encode_bandplan(plan, buf, BANDPLANS_OFFSET + i * BANDPLAN_SIZE)
+
+        presets = obj["scanPresets"]
+        if len(presets) != SCAN_PRESET_COUNT:
+            raise CodecError(f"scanPresets must have {SCAN_PRESET_COUNT} entries")
+        for i, preset in enumerate(presets):
+            encode_scan_preset(preset, buf, SCAN_PRESETS_OFFSET + i * SCAN_PRESET_SIZE)
+
+        labels = obj["groupLabels"]
+        if len(labels) != GROUP_LABEL_COUNT:
+            raise CodecError(f"groupLabels must have {GROUP_LABEL_COUNT} entries")
+        for i, label in enumerate(labels):
+            _group_label.pack_into(
+                buf, GROUP_LABELS_OFFSET + i * GROUP_LABEL_SIZE,
+                _check_bytes("groupLabels", label, GROUP_LABEL_SIZE),
+            )
+
+        dtmf = obj["dtmfPresets"]
+        if len(dtmf) != DTMF_COUNT:
+            raise CodecError(f"dtmfPresets must have {DTMF_COUNT} entries")
+        for i, preset in enumerate(dtmf):
+            encode_dtmf_preset(preset, buf, DTMF_OFFSET + i * DTMF_SIZE)
+
+        buf[POWER_OFFSET] = obj["maxPowerWattsUHF"]
+        buf[POWER_OFFSET + 1] = obj["maxPowerSettingUHF"]
+        buf[POWER_OFFSET + 2] = obj["maxPowerWattsVHF"]
+        buf[POWER_OFFSET + 3] = obj["maxPowerSettingVHF"]
+        _encode_power_table("powerTableVHF", obj["powerTableVHF"],
+                            POWER_TABLE_VHF_MAGIC, buf, POWER_TABLE_VHF_OFFSET)
+        _encode_power_table("powerTableUHF", obj["powerTableUHF"],
+                            POWER_TABLE_UHF_MAGIC, buf, POWER_TABLE_UHF_OFFSET)
+
+        return bytes(buf)
+
+
+eepromCodec = EepromCodec()
+
+
+def get_layout(name=None):
+    """
+    Return the parser selected by name, or by the TIDRADIO_PARSER
+    environment variable: "fast" (the default) or "construct".
+    """
+    name = name or os.environ.get("TIDRADIO_PARSER", "fast")
+    if name == "fast":
+        return eepromCodec
+    if name == "construct":
+        from construct_parser import eepromLayout
+        return eepromLayout
+    raise ValueError(f"Unknown parser {name!r} (expected 'fast' or 'construct')")
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+"""
+Program a rack of radios concurrently from one template image.
+
+Each radio gets the template plus its own overrides (channel names and
+scalar settingsBlock fields such as pin), is written with dirty-block
+writes over radio_transport, and is verified by reading the whole EEPROM
+back and comparing SHA-256 hashes. Serial I/O runs in worker threads under
+an asyncio semaphore, so at most `concurrency` radios are busy at once;
+progress events are streamed per device and a report is returned at the
+end.
+
+The manifest is JSON; channel numbers are 1-based as in the UI:
+
+    {
+        "template": "template.nfw",
+        "concurrency": 4,
+        "radios": [
+            {"name": "R1", "port": "/dev/ttyUSB0",
+             "names": {"1": "OPS 1"}, "settings": {"pin": 1234}}
+        ]
+    }
+
+    python fleet_programmer.py fleet.json --report report.json --unverified-protocol
+    python fleet_programmer.py --simulate 8 template.nfw
+"""
+
+import argparse
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from fast_codec import (
+    EEPROM_SIZE, CHANNELS_OFFSET, CHANNEL_COUNT, CHANNEL_SIZE, SETTINGS_OFFSET, SETTINGS_SIZE,
+    CodecError, decode_settings, encode_settings,
+)
+from checksum import SettingsChecksum
+from channel_import import encode_name
+from patch_writer import apply_patches_to_buffer, coalesce_patches
+from radio_transport import (
+    LoopbackPort, ProgrammingSession, SimulatedRadio, TransportError, open_serial,
+)
+from validation_rules import validate_image
+
+# Offset of the name field inside a channelInfo record
+CHANNEL_NAME_OFFSET = 20
+
+# Settings that are not plain scalars and cannot be overridden
+_STRUCTURED_SETTINGS = ('magic', 'vfoState', 'filler')
+
+RadioSpec = namedtuple('RadioSpec', 'name port names settings')
+RadioSpec.__new__.__defaults__ = ((), ())
+
+Progress = namedtuple('Progress', 'name stage done total')
+
+DeviceResult = namedtuple(
+    'DeviceResult',
+    'name port ok stage blocks sha256 settingsChecksum seconds error',
+)
+
+
+class TemplateError(ValueError):
+    """Raised when the template is not a usable image."""
+
+
+class OverrideError(ValueError):
+    """Raised when a radio's overrides cannot be applied to the template."""
+
+
+class VerifyError(TransportError):
+    """Raised when the image read back differs from the one written."""
+
+
+def override_patches(template, names=(), settings=()):
+    """
+    (offset, bytes) patches applying channel name and settings overrides to
+    template. names maps 0-based channel indexes to names; settings maps
+    settingsBlock field names to values.
+    """
+    patches = []
+    for index, name in dict(names).items():
+        if not 0 <= index < CHANNEL_COUNT:
+            raise OverrideError(f"channel {index + 1} is out of range")
+        try:
+            raw = encode_name(name)
+        except ValueError as e:
+            raise OverrideError(f"channel {index + 1}: {e}") from None
+        patches.append((CHANNELS_OFFSET + index * CHANNEL_SIZE + CHANNEL_NAME_OFFSET, raw))
+
+    settings = dict(settings)
+    if settings:
+        try:
+            block = decode_settings(template)
+        except CodecError as e:
+            raise OverrideError(f"settings: {e}") from None
+        for field, value in settings.items():
+            if field not in block or field in _STRUCTURED_SETTINGS:
+                raise OverrideError(f"unknown settings field {field!r}")
+            block[field] = value
+        buf = bytearray(SETTINGS_SIZE)
+        try:
+            encode_settings(block, buf, 0)
+        except (CodecError, TypeError, ValueError, struct.error) as e:
+            # struct.error: a value out of range or of the wrong type for its field
+            raise OverrideError(f"settings: {e}") from None
+        patches.append((SETTINGS_OFFSET, bytes(buf)))
+    return coalesce_patches(patches)
+
+
+def check_template(template):
+    """Raise TemplateError unless template is a whole image that decodes."""
+    if len(template) != EEPROM_SIZE:
+        raise TemplateError(f"template is {len(template)} bytes, expected {EEPROM_SIZE}")
+    try:
+        decode_settings(template)
+    except CodecError as e:
+        raise TemplateError(f"template: {e}") from None
+
+
+def build_image(template, spec, checksum=None):
+    """
+    The image for one radio and its settings checksum. checksum is the
+    template's SettingsChecksum; it is updated for the overrides rather
+    than re-summed.
+    """
+    patches = override_patches(template, spec.names, spec.settings)
+    checksum = copy.copy(checksum) if checksum is not None else SettingsChecksum(template)
+    image = bytearray(template)
+    checksum.apply_patches(image, patches)
+    apply_patches_to_buffer(image, patches)
+    return bytes(image), checksum.value
+
+
+class FleetReport:
+    """Results for every radio of one run."""
+
+    def __init__(self, results, seconds):
+        self.results = results
+        self.seconds = seconds
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def as_dict(self):
+        return {
+            'ok': self.ok,
+            'seconds': round(self.seconds, 3),
+            'succeeded': len(self.succeeded),
+            'failed': len(self.failed),
+            'radios': [r._asdict() for r in self.results],
+        }
+
+    def format(self):
+        lines = []
+        for r in self.results:
+            if r.ok:
+                lines.append(f"ok      {r.name:12} {r.blocks:4} blocks  {r.seconds:6.2f}s  "
+                             f"sha256 {r.sha256[:16]}  settings 0x{r.settingsChecksum:04X}")
+            else:
+                lines.append(f"FAILED  {r.name:12} during {r.stage}: {r.error}")
+        lines.append(f"{len(self.succeeded)} programmed, {len(self.failed)} failed "
+                     f"in {self.seconds:.2f}s")
+        return '\n'.join(lines)
+
+
+class FleetProgrammer:
+    """
+    Program radios concurrently. open_port(port) returns a radio_transport
+    port for a RadioSpec's port; it defaults to open_serial.
+    """
+
+    def __init__(self, template, radios, concurrency=4, open_port=open_serial,
+                 verify=True, window=4, retries=3):
+        check_template(template)
+        self.template = bytes(template)
+        self.radios = list(radios)
+        self.concurrency = max(1, concurrency)
+        self.open_port = open_port
+        self.verify = verify
+        self.window = window
+        self.retries = retries
+
+    async def run(self, progress=None):
+        """
+        Program every radio and return a FleetReport. progress, if given, is
+        called on the event loop with a Progress for each transferred block
+        and stage change.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        checksum = SettingsChecksum(self.template)
+
+        def emit(event):
+            if progress is not None:
+                loop.call_soon_threadsafe(progress, event)
+
+        async def program(spec):
+            start = time.perf_counter()
+            try:
+                image, settings_checksum = build_image(self.template, spec, checksum)
+            except OverrideError as e:
+                return DeviceResult(spec.name, spec.port, False, 'overrides', 0, None, None, 0.0, str(e))
+            report = validate_image(image)
+            if not report.valid:
+                return DeviceResult(spec.name, spec.port, False, 'validate', 0, None, settings_checksum,
+                                    0.0, '; '.join(report.messages()))
+            async with semaphore:
+                stage, blocks, error = await asyncio.to_thread(self._program, spec, image, emit)
+            digest = hashlib.sha256(image).hexdigest()
+            emit(Progress(spec.name, 'done' if error is None else 'failed', 1, 1))
+            return DeviceResult(spec.name, spec.port, error is None, stage, blocks, digest,
+                                settings_checksum, time.perf_counter() - start, error)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(program(spec) for spec in self.radios))
+        return FleetReport(results, time.perf_counter() - start)
+
+    def _program(self, spec, image, emit):
+        """Read, write and verify one radio (runs in a worker thread).
+        Returns (last stage, blocks written, error message or None)."""
+        stage = 'open'
+        blocks = []
+        port = None
+
+        def on_block(done, total):
+            emit(Progress(spec.name, stage, done, total))
+
+        try:
+            port = self.open_port(spec.port)
+            with ProgrammingSession(port, self.window, self.retries, on_block) as session:
+                stage = 'read'
+                current, _ = session.read_image()
+                stage = 'write'
+                blocks, _ = session.write_image(image, base=current)
+                if self.verify:
+                    stage = 'verify'
+                    readback, _ = session.read_image()
+                    if hashlib.sha256(readback).digest() != hashlib.sha256(image).digest():
+                        raise VerifyError("read-back hash does not match the written image")
+            return stage, len(blocks), None
+        except (TransportError, OSError) as e:
+            return stage, len(blocks), str(e)
+        finally:
+            if port is not None:
+                port.close()
+
+
+def load_manifest(f):
+    """(template path, concurrency, [RadioSpec]) from a JSON manifest."""
+    manifest = json.load(f)
+    radios = []
+    for i, radio in enumerate(manifest.get('radios', [])):
+        try:
+            names = {int(channel) - 1: name for channel, name in radio.get('names', {}).items()}
+        except ValueError:
+            raise OverrideError(f"radio {i + 1}: channel numbers must be integers") from None
+        radios.append(RadioSpec(radio.get('name') or radio['port'], radio['port'],
+                                names, radio.get('settings', {})))
+    return manifest.get('template'), manifest.get('concurrency', 4), radios
+
+
+def _print_progress(event):
+    # One line per stage change and every 64 blocks, to keep the log short
+    if event.done == event.total or event.done == 1 or event.done % 64 == 0:
+        print(f"{event.name:12} {event.stage:7} {event.done}/{event.total}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Program many radios concurrently from a template.")
+    parser.add_argument('manifest', nargs='?', help="JSON fleet manifest")
+    parser.add_argument('--template', help="template image (overrides the manifest)")
+    parser.add_argument('--concurrency', type=int, help="radios programmed at once")
+    parser.add_argument('--report', help="write the final report as JSON to this file")
+    parser.add_argument('--no-verify', action='store_true', help="skip read-back verification")
+    parser.add_argument('--quiet', action='store_true', help="no per-block progress")
+    parser.add_argument('--simulate', type=int, metavar='N',
+                        help="program N simulated radios (template is the positional argument)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="simulated link error rate")
+    parser.add_argument('--unverified-protocol', action='store_true',
+                        help="program real ports although the protocol is only tested "
+                             "against the simulator")
+    args = parser.parse_args(argv)
+
+    open_port = open_serial
+    if args.simulate:
+        template_path = args.template or args.manifest
+        concurrency = 4
+        radios = [RadioSpec(f"sim{i + 1}", f"sim:{i}", {0: f"UNIT {i + 1}"}, {'pin': 1000 + i})
+                  for i in range(args.simulate)]
+        simulated = [SimulatedRadio(error_rate=args.error_rate, seed=i) for i in range(args.simulate)]
+        open_port = lambda port: LoopbackPort(simulated[int(port.split(':')[1])])
+    else:
+        if not args.manifest:
+            parser.error("a manifest is required unless --simulate is given")
+        if not args.unverified_protocol:
+            parser.error("the programming protocol has not been confirmed on real hardware; "
+                         "pass --unverified-protocol to program real ports anyway")
+        try:
+            with open(args.manifest) as f:
+                template_path, concurrency, radios = load_manifest(f)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"error: manifest {args.manifest}: {e}", file=sys.stderr)
+            return 1
+        if template_path and not os.path.isabs(template_path):
+            template_path = os.path.join(os.path.dirname(args.manifest), template_path)
+        template_path = args.template or template_path
+    if not template_path:
+        parser.error("no template image given")
+
+    try:
+        with open(template_path, 'rb') as f:
+            template = f.read()
+        programmer = FleetProgrammer(template, radios, args.concurrency or concurrency,
+                                     open_port, verify=not args.no_verify)
+    except (OSError, TemplateError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    report = asyncio.run(programmer.run(None if args.quiet else _print_progress))
+
+    print(report.format())
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report.as_dict(), f, indent=2)
+    return 0 if report.ok else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+Rendered HTML fragments of the display page, cached by section content.
+
+Each section of display.html is rendered from one partial template that
+only reads a fixed byte range of the image. The rendered HTML is keyed by
+a hash of that range, so after a channel flag save, or for another image
+with the same settings, every unchanged section is served from the cache
+and only what actually changed is rendered again. Fragments must not
+depend on anything outside their byte ranges (filename, flashes,
+validation); those stay in display.html.
+
+precompile() loads every template into the Jinja environment's cache at
+startup, so the first request does not pay for compiling them.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+from fast_codec import (
+    VFO_A_OFFSET, CHANNELS_OFFSET, SETTINGS_OFFSET, SETTINGS_SIZE,
+    BANDPLAN_MAGIC_OFFSET, BANDPLANS_OFFSET, BANDPLAN_COUNT, BANDPLAN_SIZE,
+    SCAN_PRESETS_OFFSET, SCAN_PRESET_COUNT, SCAN_PRESET_SIZE,
+    POWER_OFFSET, EEPROM_SIZE,
+)
+
+
+# section -> (partial template, [(start, end)] byte ranges it reads)
+SECTIONS = {
+    'vfo': ('partials/vfo.html', [(VFO_A_OFFSET, CHANNELS_OFFSET)]),
+    'settings': ('partials/settings.html', [(SETTINGS_OFFSET, SETTINGS_OFFSET + SETTINGS_SIZE)]),
+    'power': ('partials/power_tables.html', [(POWER_OFFSET, EEPROM_SIZE)]),
+    'bandplans': ('partials/band_plan.html',
+                  [(BANDPLAN_MAGIC_OFFSET, BANDPLANS_OFFSET + BANDPLAN_COUNT * BANDPLAN_SIZE)]),
+    'scan_presets': ('partials/scan_preset.html',
+                     [(SCAN_PRESETS_OFFSET, SCAN_PRESETS_OFFSET + SCAN_PRESET_COUNT * SCAN_PRESET_SIZE)]),
+}
+
+
+def section_key(data, section):
+    """Cache key for a section: its template plus a hash of its bytes."""
+    template, ranges = SECTIONS[section]
+    h = hashlib.blake2b(digest_size=16)
+    for start, end in ranges:
+        h.update(data[start:end])
+    return (template, h.hexdigest())
+
+
+class FragmentCache:
+    """Least-recently-used rendered fragments, bounded by total size."""
+
+    def __init__(self, max_bytes=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._fragments = OrderedDict()     # section_key -> Markup
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def render(self, data, section, render):
+        """
+        HTML for section of the image data, calling render(template) only
+        when no fragment is cached for the section's current bytes.
+        """
+        key = section_key(data, section)
+        with self._lock:
+            html = self._fragments.get(key)
+            if html is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        html = Markup(render(key[0]))
+        with self._lock:
+            if key not in self._fragments:
+                self._fragments[key] = html
+                self._bytes += len(html)
+                # Never evict the fragment just rendered, even if over budget
+                while self._bytes > self.max_bytes and len(self._fragments) > 1:
+                    _, old = self._fragments.popitem(last=False)
+                    self._bytes -= len(old)
+                    self.evictions += 1
+        return html
+
+    def render_all(self, data, render, sections=None):
+        """{section: html} for every section (or the given ones)."""
+        return {section: self.render(data, section, render)
+                for section in (sections or SECTIONS)}
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._fragments),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+def precompile(jinja_env):
+    """Compile every template the environment can find; returns their names."""
+    names = jinja_env.list_templates(extensions=('html',))
+    for name in names:
+        jinja_env.get_template(name)
+    return names
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""
+Asynchronous ingestion of uploaded images.
+
+Uploads are streamed to disk with a size cap, then parsing, validation and
+cache warming run as jobs on a bounded thread pool so request threads
+return immediately. Job status and results are kept for polling.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload cannot be accepted."""
+
+
+class UploadTooLarge(UploadRejected):
+    """Raised when an upload exceeds the configured size cap."""
+
+
+class QueueFull(RuntimeError):
+    """Raised when the pipeline already has max_pending jobs queued or running."""
+
+
+def save_upload(stream, path, max_bytes, chunk_size=64 * 1024):
+    """
+    Stream a file-like object to path, refusing more than max_bytes.
+    The file is written under a temporary name and renamed into place, so
+    readers never see a partial upload. Returns the number of bytes written.
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    written = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return written
+
+
+class IngestPipeline:
+    """Bounded pool of ingestion jobs with pollable status."""
+
+    def __init__(self, max_workers=4, max_pending=64, keep_jobs=1000):
+        self.max_pending = max_pending
+        self.keep_jobs = keep_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='ingest')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) and return its job id, or raise QueueFull."""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f"{self.max_pending} ingestion jobs already pending")
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'submitted': time.time(),
+            'started': None,
+            'finished': None,
+            'result': None,
+            'error': None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.keep_jobs:
+                oldest = next(iter(self._jobs.values()))
+                if oldest['status'] in ('queued', 'running'):
+                    break
+                self._jobs.popitem(last=False)
+        try:
+            self._executor.submit(self._run, job, fn, args, kwargs)
+        except BaseException:
+            self._slots.release()
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            raise
+        return job_id
+
+    def _run(self, job, fn, args, kwargs):
+        job['started'] = time.time()
+        job['status'] = 'running'
+        try:
+            job['result'] = fn(*args, **kwargs)
+            job['status'] = 'done'
+        except Exception as e:
+            job['error'] = str(e)
+            job['status'] = 'failed'
+        finally:
+            job['finished'] = time.time()
+            self._slots.release()
+
+    def status(self, job_id):
+        """A copy of the job's state, or None for unknown (or expired) jobs."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+"""
+Per-request timing, counters and opt-in profiling for the Flask app.
+
+Code under a request wraps its stages in `timed('parse')` etc.; the stage
+durations are returned in a Server-Timing header and accumulated into
+Prometheus-style histograms served at /metrics. Setting PROFILE_DIR and
+sending `?profile=1` (or an `X-Profile: 1` header) runs that request under
+cProfile and writes the stats to PROFILE_DIR.
+"""
+
+import bisect
+import cProfile
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Thread-safe counters and histograms keyed by (name, labels)."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self, gauges=(), totals=()):
+        """Prometheus text exposition; gauges and totals (externally kept
+        counters) are iterables of (name, value, help)."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            histograms = [(key, (list(h.counts), h.sum, h.count, h.buckets))
+                          for key, h in histograms]
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                header(name, 'counter')
+                seen.add(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+        for (name, labels), (counts, total, count, buckets) in histograms:
+            if name not in seen:
+                header(name, 'histogram')
+                seen.add(name)
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for kind, values in (('counter', totals), ('gauge', gauges)):
+            for name, value, text in values:
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+metrics = Metrics()
+metrics.describe('tidradio_requests_total', "Requests handled, by endpoint and status.")
+metrics.describe('tidradio_request_seconds', "Request duration, by endpoint.")
+metrics.describe('tidradio_stage_seconds', "Time spent in each stage of a request.")
+metrics.describe('tidradio_parses_total', "Images parsed, by parser.")
+
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block as `stage` of the current request (and of the
+    stage histogram when there is no request, e.g. on the ingest pool)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if has_request_context() and hasattr(g, 'stage_timings'):
+            g.stage_timings[stage] = g.stage_timings.get(stage, 0.0) + elapsed
+        else:
+            metrics.observe('tidradio_stage_seconds', elapsed, stage=stage)
+
+
+def _profiling_requested(app):
+    return bool(app.config.get('PROFILE_DIR')) and (
+        request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1'
+    )
+
+
+# Cache stats that only ever increase, exported as counters named *_total;
+# the rest (entries, bytes, limits) are gauges
+_CACHE_COUNTERS = frozenset(('hits', 'misses', 'derived_hits', 'derived_misses', 'evictions'))
+
+
+def init_app(app, store=None, fragments=None):
+    """Install the timing hooks and the /metrics endpoint on app. store and
+    fragments, if given, are a CodeplugStore and a FragmentCache whose
+    stats are exported as counters and gauges."""
+
+    @app.before_request
+    def _start_timing():
+        g.request_start = time.perf_counter()
+        g.stage_timings = {}
+        g.profiler = None
+        if _profiling_requested(app):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def _finish_timing(response):
+        start = g.pop('request_start', None)
+        if start is None:
+            return response
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unknown'}-{os.getpid()}-{time.monotonic_ns()}.prof"
+            path = os.path.join(app.config['PROFILE_DIR'], name)
+            profiler.dump_stats(path)
+            response.headers['X-Profile-File'] = name
+
+        total = time.perf_counter() - start
+        timings = g.pop('stage_timings', {})
+        endpoint = request.endpoint or 'unknown'
+        for stage, seconds in timings.items():
+            metrics.observe('tidradio_stage_seconds', seconds, stage=stage)
+        metrics.observe('tidradio_request_seconds', total, endpoint=endpoint)
+        metrics.inc('tidradio_requests_total', endpoint=endpoint, status=response.status_code)
+
+        entries = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in timings.items()]
+        entries.append(f"total;dur={total * 1000:.3f}")
+        response.headers.add('Server-Timing', ', '.join(entries))
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        gauges = []
+        totals = []
+        for prefix, cache in (('store', store), ('fragments', fragments)):
+            if cache is None:
+                continue
+            kind = type(cache).__name__
+            for key, value in cache.stats().items():
+                if key in _CACHE_COUNTERS:
+                    totals.append((f"tidradio_{prefix}_{key}_total", value, f"{kind} {key}."))
+                else:
+                    gauges.append((f"tidradio_{prefix}_{key}", value, f"{kind} {key}."))
+        return Response(metrics.render(gauges, totals), mimetype='text/plain; version=0.0.4')
+
+    return metrics
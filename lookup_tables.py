@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""
+Precomputed lookup tables for per-channel fields.
+
+Each channel carries a groups u16, a bits_channelinfo flag byte and a
+txPower setting. Instead of shifting nibbles and masking bits for every
+channel on every render, the values are looked up:
+
+    CHANNEL_FLAGS[b]           decoded flag fields for each of the 256 bytes
+    group_letters(value)       'A,C' for a groups value, memoized per value
+    watts_table(watts, setting)  power setting -> watts, per power limit pair
+
+This module has no dependencies on the rest of the package, so the codec
+can build its records from these tables too.
+"""
+
+from functools import lru_cache
+
+
+# bits_channelinfo is packed most significant bit first; bit 0 is padding
+BUSY_LOCK_BIT = 0x80
+REVERSED_BIT = 0x40
+POSITION_BIT = 0x20
+PTT_ID_SHIFT = 3
+MODULATION_SHIFT = 2
+BANDWIDTH_BIT = 0x02
+
+GROUP_COUNT = 15
+
+
+def _flags(b):
+    return {
+        'busyLock': bool(b & BUSY_LOCK_BIT),
+        'reversed': bool(b & REVERSED_BIT),
+        'position': bool(b & POSITION_BIT),
+        'pttID': (b >> PTT_ID_SHIFT) & 0x3,
+        'modulation': (b >> MODULATION_SHIFT) & 0x1,
+        'bandwidth': bool(b & BANDWIDTH_BIT),
+    }
+
+
+# Decoded bits_channelinfo fields for every flag byte. Entries are shared:
+# copy them (dict(CHANNEL_FLAGS[b])) before handing them out as records.
+CHANNEL_FLAGS = tuple(_flags(b) for b in range(256))
+
+# Letter for each group nibble: 0 is no group, 1-15 are A-O
+_NIBBLE_LETTERS = ('',) + tuple(chr(ord('A') + i) for i in range(GROUP_COUNT))
+
+# Letters for one byte (two nibbles, low first); a u16 is two bytes
+_BYTE_LETTERS = tuple(
+    tuple(letter for letter in (_NIBBLE_LETTERS[b & 0xF], _NIBBLE_LETTERS[b >> 4]) if letter)
+    for b in range(256)
+)
+
+_group_letters = {}
+
+
+def group_letters(value):
+    """
+    Comma-separated letters for a groups value, lowest nibble first.
+    Each distinct value is joined once and memoized; images only ever use a
+    handful, so this stays far smaller than a full 65,536-entry table.
+    """
+    try:
+        return _group_letters[value]
+    except KeyError:
+        letters = ','.join(_BYTE_LETTERS[value & 0xFF] + _BYTE_LETTERS[(value >> 8) & 0xFF])
+        _group_letters[value] = letters
+        return letters
+
+
+@lru_cache(maxsize=64)
+def watts_table(max_watts, max_setting):
+    """
+    Watts for each power setting 0-255, interpolated linearly from the
+    maxPowerWatts*/maxPowerSetting* pair (setting max_setting gives
+    max_watts). Rounded to 0.01 W; all zero when max_setting is 0.
+    """
+    if not max_setting:
+        return (0.0,) * 256
+    scale = max_watts / max_setting
+    return tuple(round(setting * scale, 2) for setting in range(256))
+
+
+def power_table_watts(parsed):
+    """
+    Watts for every entry of both power tables, as {'vhf': [...], 'uhf': [...]}.
+    Works on parsed images and CodeplugView.
+    """
+    vhf = watts_table(parsed.maxPowerWattsVHF, parsed.maxPowerSettingVHF)
+    uhf = watts_table(parsed.maxPowerWattsUHF, parsed.maxPowerSettingUHF)
+    return {
+        'vhf': [vhf[setting] for setting in parsed.powerTableVHF.table],
+        'uhf': [uhf[setting] for setting in parsed.powerTableUHF.table],
+    }
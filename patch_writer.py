@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""
+In-place patching of EEPROM images.
+
+Instead of rebuilding the whole 0x2000-byte image and rewriting the file,
+edits are diffed against the current bytes, reduced to the minimal set of
+changed byte ranges and written back with seek+write.
+"""
+
+from bisect import bisect_right
+
+from fast_codec import CHANNELS_OFFSET, CHANNEL_COUNT, CHANNEL_SIZE
+
+# Offset of the bits_channelinfo flag byte inside a channelInfo record
+CHANNEL_FLAGS_OFFSET = 0x0F
+
+# Flag-byte masks of the checkboxes editable from the channel form
+FORM_FLAGS = (
+    ("busyLock", 0x80),
+    ("reversed", 0x40),
+    ("position", 0x20),
+    ("bandwidth", 0x02),
+)
+FORM_FLAGS_MASK = sum(mask for _, mask in FORM_FLAGS)
+
+
+def channel_flags_offset(index):
+    """Absolute image offset of the flag byte of memory channel index."""
+    return CHANNELS_OFFSET + index * CHANNEL_SIZE + CHANNEL_FLAGS_OFFSET
+
+
+def diff_channel_flags(data, form, indices=None):
+    """
+    Compare the submitted channel form against the flag bytes in data.
+
+    Only the channels in indices are compared (all of them by default), so
+    a partially loaded form cannot clear the flags of rows it never showed.
+    Returns a list of (channel index, new flag byte) for the channels whose
+    byte changes. Bits not editable from the form (pttID, modulation and
+    the padding bit) are preserved.
+    """
+    if indices is None:
+        indices = range(CHANNEL_COUNT)
+    changes = []
+    for i in sorted(set(indices)):
+        if not 0 <= i < CHANNEL_COUNT:
+            raise IndexError(f"channel index {i} out of range")
+        offset = channel_flags_offset(i)
+        current = data[offset]
+        flags = current & ~FORM_FLAGS_MASK & 0xFF
+        for name, mask in FORM_FLAGS:
+            if form.get(f'{name}_{i}', '0') == '1':
+                flags |= mask
+        if flags != current:
+            changes.append((i, flags))
+    return changes
+
+
+def channel_flag_patches(changes):
+    """Turn (channel index, flag byte) changes into (offset, bytes) patches."""
+    return coalesce_patches(
+        (channel_flags_offset(i), bytes((flags,))) for i, flags in changes
+    )
+
+
+def coalesce_patches(patches):
+    """
+    Merge adjacent or overlapping (offset, bytes) patches into the minimal
+    sorted list of contiguous ranges. Where patches overlap, the one that
+    comes later in the input wins, as if they were applied in order.
+    """
+    patches = list(patches)
+    ranges = []     # [start, end] of each merged range, in offset order
+    for offset, chunk in sorted(patches, key=lambda p: p[0]):
+        end = offset + len(chunk)
+        if ranges and offset <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([offset, end])
+    starts = [start for start, _ in ranges]
+    buffers = [bytearray(end - start) for start, end in ranges]
+    for offset, chunk in patches:
+        i = bisect_right(starts, offset) - 1
+        start = starts[i]
+        buffers[i][offset - start:offset - start + len(chunk)] = chunk
+    return [(start, bytes(buf)) for start, buf in zip(starts, buffers)]
+
+
+def apply_patches_to_buffer(buf, patches):
+    """Apply (offset, bytes) patches to a writable buffer in memory."""
+    for offset, chunk in patches:
+        buf[offset:offset + len(chunk)] = chunk
+
+
+def apply_patches(path, patches):
+    """
+    Write (offset, bytes) patches into the file at path in place.
+
+    Returns the number of bytes written.
+    """
+    written = 0
+    if not patches:
+        return written
+    with open(path, "r+b") as f:
+        for offset, chunk in patches:
+            f.seek(offset)
+            f.write(chunk)
+            written += len(chunk)
+    return written
@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+
+"""
+Serial programming transport for the radio's EEPROM.
+
+The EEPROM is transferred in 32-byte blocks. The command bytes below are
+unverified placeholders: they have not been checked against the radio's
+firmware or a real radio, only against SimulatedRadio, which implements
+the same placeholders:
+
+    0x45                    -> 0x45        leave normal operation
+    0x30 block              -> 0x30 data[32] sum    read a block
+    0x31 block data[32] sum -> 0x31        write a block
+    0x46                    -> 0x46        resume normal operation
+    0x49                                   reboot
+
+where sum is the byte sum of data modulo 0x100. ProgrammingSession keeps
+up to `window` requests in flight, retries failed blocks one at a time,
+and writes only the blocks that differ from the image last read from the
+radio, so a small edit costs a handful of blocks instead of all 256.
+
+Ports are anything with pyserial's read(n)/write(data)/reset_input_buffer()
+subset. open_serial() opens a real port (pyserial is only needed there);
+LoopbackPort talks to a SimulatedRadio in memory, and serve_pty() puts the
+simulator behind a pseudo-terminal for tools that want a device path.
+
+Until the protocol is confirmed on hardware, the command line refuses to
+read from or write to a serial port unless --unverified-protocol is given.
+
+    python radio_transport.py read radio.nfw --port /dev/ttyUSB0 --unverified-protocol
+    python radio_transport.py write edited.nfw --port /dev/ttyUSB0 --base radio.nfw --unverified-protocol
+    python radio_transport.py simulate --image radio.nfw
+    python radio_transport.py bench --changed 3
+"""
+
+import argparse
+import os
+import random
+import select
+import sys
+import threading
+import time
+from collections import Counter, namedtuple
+
+from fast_codec import EEPROM_SIZE
+
+
+BLOCK_SIZE = 32
+BLOCK_COUNT = EEPROM_SIZE // BLOCK_SIZE
+BAUDRATE = 38400
+
+# Unverified placeholders, only tested against SimulatedRadio (see above)
+CMD_READ = 0x30
+CMD_WRITE = 0x31
+CMD_DISABLE = 0x45
+CMD_ENABLE = 0x46
+CMD_REBOOT = 0x49
+
+READ_REPLY_SIZE = 1 + BLOCK_SIZE + 1
+
+
+class TransportError(IOError):
+    """Raised when the radio does not answer, or answers with garbage."""
+
+
+class BlockError(TransportError):
+    """Raised when a block still fails after every retry."""
+
+    def __init__(self, block, message):
+        super().__init__(f"block {block} (0x{block * BLOCK_SIZE:04X}): {message}")
+        self.block = block
+
+
+def block_sum(data):
+    return sum(data) & 0xFF
+
+
+def dirty_blocks(old, new):
+    """Indexes of the blocks that differ between two images."""
+    old = memoryview(old)
+    new = memoryview(new)
+    return [block for block in range(BLOCK_COUNT)
+            if old[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE]
+            != new[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE]]
+
+
+class TransferStats(namedtuple('TransferStats', 'blocks bytes retries seconds')):
+    """What one read or write moved, and how long it took."""
+
+    @property
+    def throughput(self):
+        """Payload bytes per second."""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.blocks} blocks, {self.bytes} bytes in {self.seconds:.2f}s "
+                f"({self.throughput:.0f} B/s, {self.retries} retries)")
+
+
+#
+# Ports
+#
+def open_serial(device, baudrate=BAUDRATE, timeout=1.0):
+    """Open a serial port with pyserial, or as a raw POSIX tty without it."""
+    try:
+        import serial
+    except ImportError:
+        if os.name != 'posix':
+            raise TransportError("pyserial is required to talk to a radio: pip install pyserial") from None
+        return FdPort.open(device, timeout, baudrate)
+    return serial.Serial(device, baudrate=baudrate, timeout=timeout)
+
+
+class FdPort:
+    """Port over a raw file descriptor (a tty or pty), with a read timeout."""
+
+    def __init__(self, fd, timeout=1.0):
+        self.fd = fd
+        self.timeout = timeout
+
+    @classmethod
+    def open(cls, path, timeout=1.0, baudrate=None):
+        """Open a tty in raw mode, 8N1 at baudrate if given."""
+        import termios
+        import tty
+        fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        try:
+            tty.setraw(fd)
+            if baudrate is not None:
+                speed = getattr(termios, f'B{baudrate}', None)
+                if speed is None:
+                    raise TransportError(f"unsupported baud rate {baudrate}")
+                attrs = termios.tcgetattr(fd)
+                attrs[4] = attrs[5] = speed
+                termios.tcsetattr(fd, termios.TCSANOW, attrs)
+        except BaseException:
+            os.close(fd)
+            raise
+        return cls(fd, timeout)
+
+    def read(self, size=1):
+        data = b''
+        deadline = time.monotonic() + self.timeout
+        while len(data) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.fd], [], [], remaining)[0]:
+                break
+            data += os.read(self.fd, size - len(data))
+        return data
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.fd, view):]
+        return len(data)
+
+    def reset_input_buffer(self):
+        while select.select([self.fd], [], [], 0)[0]:
+            if not os.read(self.fd, 4096):
+                break
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SimulatedRadio:
+    """
+    The radio's side of the protocol over an in-memory EEPROM. error_rate
+    is the chance that any reply is corrupted (a wrong checksum or a lost
+    write acknowledgement), to exercise the retry paths.
+    """
+
+    def __init__(self, image=None, error_rate=0.0, seed=None):
+        self.eeprom = bytearray(image if image is not None else b'\xff' * EEPROM_SIZE)
+        if len(self.eeprom) != EEPROM_SIZE:
+            raise ValueError(f"image must be {EEPROM_SIZE} bytes")
+        self.error_rate = error_rate
+        self.programming = False
+        self.reads = Counter()
+        self.writes = Counter()
+        self._random = random.Random(seed)
+        self._pending = bytearray()
+
+    def _fault(self):
+        return self.error_rate and self._random.random() < self.error_rate
+
+    def feed(self, data):
+        """Bytes from the host; returns the radio's reply bytes."""
+        self._pending += data
+        out = bytearray()
+        while self._pending:
+            cmd = self._pending[0]
+            if cmd in (CMD_DISABLE, CMD_ENABLE):
+                del self._pending[0]
+                self.programming = cmd == CMD_DISABLE
+                out.append(cmd)
+            elif cmd == CMD_REBOOT:
+                del self._pending[0]
+                self.programming = False
+            elif cmd == CMD_READ:
+                if len(self._pending) < 2:
+                    break
+                block = self._pending[1]
+                del self._pending[:2]
+                data = bytes(self.eeprom[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE])
+                self.reads[block] += 1
+                checksum = block_sum(data) ^ (0xFF if self._fault() else 0)
+                out += bytes([CMD_READ]) + data + bytes([checksum])
+            elif cmd == CMD_WRITE:
+                if len(self._pending) < 3 + BLOCK_SIZE:
+                    break
+                block = self._pending[1]
+                data = bytes(self._pending[2:2 + BLOCK_SIZE])
+                checksum = self._pending[2 + BLOCK_SIZE]
+                del self._pending[:3 + BLOCK_SIZE]
+                # A bad frame is dropped without an acknowledgement
+                if checksum != block_sum(data) or block >= BLOCK_COUNT or self._fault():
+                    continue
+                self.eeprom[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE] = data
+                self.writes[block] += 1
+                out.append(CMD_WRITE)
+            else:
+                del self._pending[0]
+        return bytes(out)
+
+
+class LoopbackPort:
+    """In-memory port wired straight to a SimulatedRadio."""
+
+    def __init__(self, radio):
+        self.radio = radio
+        self._rx = bytearray()
+
+    def write(self, data):
+        self._rx += self.radio.feed(bytes(data))
+        return len(data)
+
+    def read(self, size=1):
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def reset_input_buffer(self):
+        self._rx.clear()
+
+    def close(self):
+        pass
+
+
+def serve_pty(radio):
+    """
+    Run radio behind a pseudo-terminal on a daemon thread. Returns
+    (device path, stop function); open the path with FdPort.open() or
+    open_serial().
+    """
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+    stopped = threading.Event()
+
+    def serve():
+        while not stopped.is_set():
+            if not select.select([master], [], [], 0.1)[0]:
+                continue
+            try:
+                data = os.read(master, 4096)
+            except OSError:
+                break
+            reply = radio.feed(data)
+            if reply:
+                os.write(master, reply)
+
+    thread = threading.Thread(target=serve, name='simulated-radio', daemon=True)
+    thread.start()
+
+    def stop():
+        stopped.set()
+        thread.join()
+        os.close(master)
+        os.close(slave)
+
+    return path, stop
+
+
+#
+# Programming
+#
+class ProgrammingSession:
+    """
+    Block transfers with one radio. Used as a context manager, the radio
+    is taken out of normal operation on entry and resumed on exit.
+    progress, if set, is called as progress(done, total) after each block.
+    """
+
+    def __init__(self, port, window=4, retries=3, progress=None):
+        self.port = port
+        self.window = max(1, window)
+        self.retries = retries
+        self.progress = progress
+        self.last_read = None   # image as last read from / written to the radio
+
+    def __enter__(self):
+        self.command(CMD_DISABLE)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.command(CMD_ENABLE)
+        except TransportError:
+            # Do not hide the error that ended the session
+            if exc_type is None:
+                raise
+
+    def command(self, cmd):
+        """Send a single-byte command and wait for its echo."""
+        for _ in range(self.retries + 1):
+            self.port.write(bytes([cmd]))
+            if self.port.read(1) == bytes([cmd]):
+                return
+            self._drain()
+        raise TransportError(f"radio did not acknowledge command 0x{cmd:02X}")
+
+    def _drain(self, quiet=0.1):
+        # Drop replies still arriving for requests that are being resent,
+        # until the line has been quiet for `quiet` seconds
+        timeout = getattr(self.port, 'timeout', None)
+        if timeout is not None:
+            self.port.timeout = min(timeout, quiet)
+        try:
+            while self.port.read(READ_REPLY_SIZE):
+                pass
+        finally:
+            if timeout is not None:
+                self.port.timeout = timeout
+        self.port.reset_input_buffer()
+
+    def _read_exact(self, size):
+        data = self.port.read(size)
+        if len(data) != size:
+            raise TransportError(f"expected {size} bytes, got {len(data)}")
+        return data
+
+    def _transfer(self, blocks, send, receive):
+        """
+        Send blocks a window at a time and collect the replies in order.
+        Replies carry no block number, so a lost reply shifts every later
+        one onto the wrong request: nothing in a window counts as done
+        until all of its replies are good. A window that fails is drained
+        and redone one block at a time, where each failure is attributable
+        and retried up to the retry limit.
+        """
+        blocks = list(blocks)
+        total = len(blocks)
+        retried = 0
+        for start in range(0, total, self.window):
+            window = blocks[start:start + self.window]
+            for block in window:
+                send(block)
+            try:
+                for block in window:
+                    receive(block)
+            except TransportError:
+                retried += 1
+                self._drain()
+                for i, block in enumerate(window):
+                    retried += self._transfer_one(block, send, receive)
+                    self._report(start + i + 1, total)
+                continue
+            self._report(start + len(window), total)
+        return retried
+
+    def _transfer_one(self, block, send, receive):
+        for attempt in range(self.retries + 1):
+            send(block)
+            try:
+                receive(block)
+                return attempt
+            except TransportError as e:
+                if attempt == self.retries:
+                    raise BlockError(block, str(e)) from e
+                self._drain()
+
+    def _report(self, done, total):
+        if self.progress is not None:
+            self.progress(done, total)
+
+    def read_blocks(self, blocks, into=None):
+        """Read blocks into a bytearray image (a fresh one unless into is given)."""
+        image = into if into is not None else bytearray(EEPROM_SIZE)
+
+        def send(block):
+            self.port.write(bytes([CMD_READ, block]))
+
+        def receive(block):
+            reply = self._read_exact(READ_REPLY_SIZE)
+            data = reply[1:1 + BLOCK_SIZE]
+            if reply[0] != CMD_READ or reply[-1] != block_sum(data):
+                raise TransportError("bad read reply")
+            image[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE] = data
+
+        start = time.perf_counter()
+        retried = self._transfer(blocks, send, receive)
+        stats = TransferStats(len(blocks), len(blocks) * BLOCK_SIZE, retried,
+                              time.perf_counter() - start)
+        return image, stats
+
+    def write_blocks(self, image, blocks):
+        """Write the given blocks of image to the radio."""
+        image = memoryview(image)
+
+        def send(block):
+            data = image[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE]
+            self.port.write(bytes([CMD_WRITE, block]) + data + bytes([block_sum(data)]))
+
+        def receive(block):
+            if self._read_exact(1) != bytes([CMD_WRITE]):
+                raise TransportError("bad write acknowledgement")
+
+        start = time.perf_counter()
+        retried = self._transfer(blocks, send, receive)
+        return TransferStats(len(blocks), len(blocks) * BLOCK_SIZE, retried,
+                             time.perf_counter() - start)
+
+    def read_image(self):
+        """Read the whole EEPROM. Returns (bytes, stats)."""
+        image, stats = self.read_blocks(range(BLOCK_COUNT))
+        self.last_read = bytes(image)
+        return self.last_read, stats
+
+    def write_image(self, image, base=None, verify=False, full=False):
+        """
+        Write image, sending only the blocks that differ from base (by
+        default the image last read or written in this session; the whole
+        image is read first if there is none), or every block with full.
+        With verify, the written blocks are read back and compared.
+        Returns (blocks written, stats).
+        """
+        image = bytes(image)
+        if len(image) != EEPROM_SIZE:
+            raise ValueError(f"image must be {EEPROM_SIZE} bytes")
+        if full:
+            blocks = list(range(BLOCK_COUNT))
+        else:
+            if base is None:
+                base = self.last_read if self.last_read is not None else self.read_image()[0]
+            blocks = dirty_blocks(base, image)
+        stats = self.write_blocks(image, blocks)
+        if verify and blocks:
+            readback, _ = self.read_blocks(blocks, into=bytearray(image))
+            mismatched = dirty_blocks(image, readback)
+            if mismatched:
+                raise BlockError(mismatched[0], "read-back does not match what was written")
+        self.last_read = image
+        return blocks, stats
+
+
+def _open_port(args):
+    if not args.port:
+        raise SystemExit("--port is required")
+    if not args.unverified_protocol:
+        raise SystemExit(f"refusing to {args.command}: the programming protocol has not been "
+                         f"confirmed on real hardware; pass --unverified-protocol to use it anyway")
+    return open_serial(args.port, args.baudrate)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read and write the radio's EEPROM over serial.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    read = commands.add_parser('read', help="read the EEPROM into a file")
+    read.add_argument('out')
+    write = commands.add_parser('write', help="write an image, sending only changed blocks")
+    write.add_argument('image')
+    write.add_argument('--base', help="image last read from this radio (read from the radio if omitted); "
+                                      "updated after a successful write")
+    write.add_argument('--full', action='store_true', help="write every block")
+    write.add_argument('--verify', action='store_true', help="read written blocks back")
+    for sub in (read, write):
+        sub.add_argument('--unverified-protocol', action='store_true',
+                         help="talk to a real port although the protocol is only tested "
+                              "against the simulator")
+        sub.add_argument('--port', help="serial device, e.g. /dev/ttyUSB0")
+        sub.add_argument('--baudrate', type=int, default=BAUDRATE)
+        sub.add_argument('--window', type=int, default=4, help="requests kept in flight")
+        sub.add_argument('--retries', type=int, default=3)
+
+    simulate = commands.add_parser('simulate', help="serve a simulated radio on a pty")
+    simulate.add_argument('--image', help="initial EEPROM contents")
+    simulate.add_argument('--error-rate', type=float, default=0.0)
+
+    bench = commands.add_parser('bench', help="time full and dirty-block writes against the simulator")
+    bench.add_argument('--changed', type=int, default=3, help="blocks changed by the edit")
+    bench.add_argument('--error-rate', type=float, default=0.0)
+    bench.add_argument('--pty', action='store_true', help="go through a pty instead of in memory")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'simulate':
+        image = None
+        if args.image:
+            with open(args.image, 'rb') as f:
+                image = f.read(EEPROM_SIZE)
+        path, stop = serve_pty(SimulatedRadio(image, args.error_rate))
+        print(f"Simulated radio on {path}; Ctrl-C to stop")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            stop()
+        return 0
+
+    if args.command == 'bench':
+        from benchmarks import synthetic_image
+        original = synthetic_image()
+        radio = SimulatedRadio(original, args.error_rate, seed=0)
+        stop = None
+        if args.pty:
+            path, stop = serve_pty(radio)
+            port = FdPort.open(path, timeout=0.2)
+        else:
+            port = LoopbackPort(radio)
+        try:
+            with ProgrammingSession(port) as session:
+                _, stats = session.read_image()
+                print(f"read:        {stats}")
+                print(f"full write:  {session.write_blocks(original, range(BLOCK_COUNT))}")
+                edited = bytearray(original)
+                for block in random.Random(1).sample(range(BLOCK_COUNT), args.changed):
+                    edited[block * BLOCK_SIZE] ^= 0xFF
+                blocks, stats = session.write_image(edited, verify=True)
+                print(f"dirty write: {stats}")
+            seconds_per_block = (1 + BLOCK_SIZE + 3) * 10 / BAUDRATE
+            print(f"at {BAUDRATE} baud: full write ~{BLOCK_COUNT * seconds_per_block:.1f}s, "
+                  f"dirty write ~{len(blocks) * seconds_per_block:.2f}s")
+        finally:
+            port.close()
+            if stop:
+                stop()
+        return 0 if bytes(radio.eeprom) == bytes(edited) else 1
+
+    port = _open_port(args)
+    try:
+        with ProgrammingSession(port, args.window, args.retries) as session:
+            if args.command == 'read':
+                image, stats = session.read_image()
+                with open(args.out, 'wb') as f:
+                    f.write(image)
+                print(f"Read {stats}")
+                return 0
+
+            with open(args.image, 'rb') as f:
+                image = f.read()
+            base = None
+            if args.base and os.path.exists(args.base):
+                with open(args.base, 'rb') as f:
+                    base = f.read()
+            blocks, stats = session.write_image(image, base, args.verify, args.full)
+            print(f"Wrote {stats}")
+        if args.base:
+            with open(args.base, 'wb') as f:
+                f.write(image)
+        return 0
+    except TransportError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        port.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+"""
+Tests for channel_import's CSV reading.
+
+    python -m unittest test_channel_import
+"""
+
+import io
+import unittest
+
+from benchmarks import synthetic_image
+from channel_import import ChannelImportError, import_channels, read_channels
+from export import write_channels_csv
+from fast_codec import eepromCodec
+
+
+def exported_csv(data):
+    out = io.StringIO()
+    write_channels_csv(eepromCodec.parse(data), out)
+    return out.getvalue()
+
+
+class ReadChannelsTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = synthetic_image()
+        patches, count = import_channels(data, io.StringIO(exported_csv(data)))
+        self.assertEqual(patches, [])
+        self.assertGreater(count, 0)
+
+    def test_extra_cells_in_blank_row(self):
+        with self.assertRaises(ChannelImportError) as caught:
+            read_channels(synthetic_image(), io.StringIO("a,b\n,,,,x\n"), 'native')
+        self.assertEqual(caught.exception.errors[0][0], 2)
+        self.assertIn('more non-empty cells', str(caught.exception))
+
+    def test_extra_cells_in_channel_row(self):
+        data = synthetic_image()
+        header, first, *_ = exported_csv(data).splitlines()
+        text = f"{header}\n{first},surplus\n"
+        with self.assertRaises(ChannelImportError):
+            read_channels(data, io.StringIO(text))
+
+    def test_empty_extra_cells_are_ignored(self):
+        data = synthetic_image()
+        header, first, *_ = exported_csv(data).splitlines()
+        text = f"{header}\n{first},,\n,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,\n"
+        self.assertEqual(len(read_channels(data, io.StringIO(text))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
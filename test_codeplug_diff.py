@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""
+Tests for codeplug_diff's diff and three-way merge.
+
+    python -m unittest test_codeplug_diff
+"""
+
+import unittest
+
+from benchmarks import synthetic_image
+from codeplug_diff import SECTIONS, diff_images, merge_images
+from fast_codec import (
+    EEPROM_SIZE, SETTINGS_OFFSET, BANDPLAN_MAGIC_OFFSET, CHANNELS_OFFSET,
+)
+
+
+def edited(data, *edits):
+    data = bytearray(data)
+    for offset, value in edits:
+        data[offset] = value
+    return bytes(data)
+
+
+class SectionsTest(unittest.TestCase):
+
+    def test_sections_cover_every_byte(self):
+        covered = bytearray(EEPROM_SIZE)
+        for _, offset, count, stride, _, _ in SECTIONS:
+            for i in range(offset, offset + stride * (count or 1)):
+                covered[i] += 1
+        self.assertEqual(set(covered), {1})
+
+
+class DiffTest(unittest.TestCase):
+
+    def test_every_byte_change_is_reported(self):
+        base = synthetic_image()
+        for offset in range(0, EEPROM_SIZE, 7):
+            with self.subTest(offset=hex(offset)):
+                self.assertTrue(diff_images(base, edited(base, (offset, base[offset] ^ 0x01))))
+
+    def test_padding(self):
+        base = synthetic_image()
+        changes = diff_images(base, edited(base, (0x1981, 0xAB)))
+        self.assertEqual([(c.section, c.field, c.new) for c in changes],
+                         [('unused_0x1980', 'data[1]', 0xAB)])
+
+    def test_bandplan_magic(self):
+        base = synthetic_image()
+        changes = diff_images(base, edited(base, (BANDPLAN_MAGIC_OFFSET, 0x00)))
+        self.assertEqual([(c.section, c.field, c.old, c.new) for c in changes],
+                         [('bandplanMagic', 'bandplanMagic', 0xA46D, 0x006D)])
+
+    def test_settings_magic(self):
+        base = synthetic_image()
+        changes = diff_images(base, edited(base, (SETTINGS_OFFSET, 0x00)))
+        self.assertEqual([(c.section, c.field, c.old, c.new) for c in changes],
+                         [('settings', 'magic', 0xD82F, 0x002F)])
+
+
+class MergeTest(unittest.TestCase):
+
+    def test_theirs_uncovered_edits_are_kept(self):
+        base = synthetic_image()
+        ours = edited(base, (CHANNELS_OFFSET, base[CHANNELS_OFFSET] ^ 0x01))
+        edits = ((0x1981, 0xAB), (0x1ACA, 0xCD), (0x1DF4, 0xEF),
+                 (BANDPLAN_MAGIC_OFFSET + 1, 0x00), (SETTINGS_OFFSET, 0x00))
+        theirs = edited(base, *edits)
+        merged, conflicts = merge_images(base, ours, theirs)
+        self.assertEqual(conflicts, [])
+        self.assertEqual(merged, edited(ours, *edits))
+
+    def test_settings_magic_conflict(self):
+        base = synthetic_image()
+        ours = edited(base, (SETTINGS_OFFSET, 0x11))
+        theirs = edited(base, (SETTINGS_OFFSET, 0x22))
+        merged, conflicts = merge_images(base, ours, theirs)
+        self.assertEqual([(c.section, c.field) for c in conflicts], [('settings', 'magic')])
+        self.assertEqual(merged, ours)
+
+
+if __name__ == '__main__':
+    unittest.main()
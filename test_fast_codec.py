@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""
+Parity tests: fast_codec against the reference construct layout.
+
+Every image is parsed and built by both codecs, and each codec must build
+the other's parse result into the same bytes. Run with
+
+    python -m unittest test_fast_codec
+"""
+
+import random
+import unittest
+
+from construct import ConstructError
+
+from benchmarks import synthetic_image
+from construct_parser import eepromLayout
+from fast_codec import (
+    EEPROM_SIZE, SETTINGS_OFFSET, BANDPLAN_MAGIC_OFFSET,
+    POWER_TABLE_VHF_OFFSET, POWER_TABLE_UHF_OFFSET,
+    SETTINGS_MAGIC, BANDPLAN_MAGIC, POWER_TABLE_VHF_MAGIC, POWER_TABLE_UHF_MAGIC,
+    CodecError, eepromCodec,
+)
+
+
+def random_image(seed):
+    """Random bytes everywhere except the magics the layout requires."""
+    rng = random.Random(seed)
+    data = bytearray(rng.randbytes(EEPROM_SIZE))
+    data[SETTINGS_OFFSET:SETTINGS_OFFSET + 2] = SETTINGS_MAGIC.to_bytes(2, 'big')
+    data[BANDPLAN_MAGIC_OFFSET:BANDPLAN_MAGIC_OFFSET + 2] = BANDPLAN_MAGIC.to_bytes(2, 'big')
+    data[POWER_TABLE_VHF_OFFSET] = POWER_TABLE_VHF_MAGIC
+    data[POWER_TABLE_UHF_OFFSET] = POWER_TABLE_UHF_MAGIC
+    return bytes(data)
+
+
+def erased_image():
+    """An all-0xFF image, as read from a radio that was never programmed."""
+    data = bytearray(random_image(0))
+    for start, end in ((0, SETTINGS_OFFSET), (SETTINGS_OFFSET + 2, BANDPLAN_MAGIC_OFFSET),
+                       (BANDPLAN_MAGIC_OFFSET + 2, POWER_TABLE_VHF_OFFSET),
+                       (POWER_TABLE_VHF_OFFSET + 1, POWER_TABLE_UHF_OFFSET),
+                       (POWER_TABLE_UHF_OFFSET + 1, EEPROM_SIZE)):
+        data[start:end] = b'\xFF' * (end - start)
+    return bytes(data)
+
+
+def images():
+    yield 'erased', erased_image()
+    for seed in range(3):
+        yield f'synthetic {seed}', synthetic_image(seed)
+    for seed in range(20):
+        yield f'random {seed}', random_image(seed)
+
+
+class ParityTest(unittest.TestCase):
+
+    def test_parse(self):
+        for name, data in images():
+            with self.subTest(name):
+                self.assertEqual(eepromCodec.parse(data), eepromLayout.parse(data))
+
+    def test_build(self):
+        for name, data in images():
+            with self.subTest(name):
+                self.assertEqual(eepromCodec.build(eepromCodec.parse(data)),
+                                 eepromLayout.build(eepromLayout.parse(data)))
+
+    def test_cross_build(self):
+        for name, data in images():
+            with self.subTest(name):
+                fast = eepromCodec.parse(data)
+                reference = eepromLayout.parse(data)
+                expected = eepromLayout.build(reference)
+                self.assertEqual(eepromCodec.build(reference), expected)
+                self.assertEqual(eepromLayout.build(fast), expected)
+
+    def test_round_trip(self):
+        for name, data in images():
+            with self.subTest(name):
+                built = eepromCodec.build(eepromCodec.parse(data))
+                self.assertEqual(eepromCodec.build(eepromCodec.parse(built)), built)
+                self.assertEqual(eepromLayout.parse(built), eepromCodec.parse(built))
+
+    def test_edited_record(self):
+        data = synthetic_image(1)
+        fast = eepromCodec.parse(data)
+        reference = eepromLayout.parse(data)
+        for parsed in (fast, reference):
+            parsed.memoryChannels[3].bits.busyLock = not parsed.memoryChannels[3].bits.busyLock
+            parsed.memoryChannels[3].rxFreq = 14550000
+            parsed.settings.squelch = 7
+        self.assertEqual(eepromCodec.build(fast), eepromLayout.build(reference))
+
+    def test_bad_magic(self):
+        for offset in (SETTINGS_OFFSET, BANDPLAN_MAGIC_OFFSET,
+                       POWER_TABLE_VHF_OFFSET, POWER_TABLE_UHF_OFFSET):
+            with self.subTest(offset=hex(offset)):
+                data = bytearray(random_image(0))
+                data[offset] ^= 0xFF
+                with self.assertRaises(ConstructError):
+                    eepromLayout.parse(bytes(data))
+                with self.assertRaises(CodecError):
+                    eepromCodec.parse(bytes(data))
+
+    def test_short_image(self):
+        with self.assertRaises(CodecError):
+            eepromCodec.parse(random_image(0)[:-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
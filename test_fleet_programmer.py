@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""
+Tests for fleet_programmer against simulated radios.
+
+    python -m unittest test_fleet_programmer
+"""
+
+import asyncio
+import unittest
+
+from benchmarks import synthetic_image
+from fast_codec import decode_settings
+from fleet_programmer import FleetProgrammer, OverrideError, RadioSpec, override_patches
+from radio_transport import LoopbackPort, SimulatedRadio
+
+
+def run_fleet(radios):
+    simulated = {spec.port: SimulatedRadio() for spec in radios}
+    programmer = FleetProgrammer(synthetic_image(), radios,
+                                 open_port=lambda port: LoopbackPort(simulated[port]))
+    return asyncio.run(programmer.run()), simulated
+
+
+class OverrideTest(unittest.TestCase):
+
+    def test_bad_settings_values(self):
+        template = synthetic_image()
+        for pin in (70000, -1, '1234', 1.5):
+            with self.subTest(pin=pin):
+                with self.assertRaises(OverrideError):
+                    override_patches(template, settings={'pin': pin})
+
+    def test_unknown_field(self):
+        with self.assertRaises(OverrideError):
+            override_patches(synthetic_image(), settings={'nope': 1})
+
+
+class FleetTest(unittest.TestCase):
+
+    def test_out_of_range_pin_fails_only_that_radio(self):
+        report, simulated = run_fleet([
+            RadioSpec('good', 'sim:0', {0: 'UNIT 1'}, {'pin': 1234}),
+            RadioSpec('bad', 'sim:1', {}, {'pin': 70000}),
+        ])
+        good, bad = report.results
+        self.assertTrue(good.ok)
+        self.assertEqual(decode_settings(bytes(simulated['sim:0'].eeprom)).pin, 1234)
+        self.assertFalse(bad.ok)
+        self.assertEqual(bad.stage, 'overrides')
+        self.assertEqual(sum(simulated['sim:1'].writes.values()), 0)
+        self.assertFalse(report.ok)
+
+
+if __name__ == '__main__':
+    unittest.main()
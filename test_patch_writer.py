@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""
+Tests for patch_writer's patch coalescing.
+
+    python -m unittest test_patch_writer
+"""
+
+import random
+import unittest
+
+from patch_writer import apply_patches_to_buffer, coalesce_patches
+
+
+class CoalesceTest(unittest.TestCase):
+
+    def test_adjacent_patches_merge(self):
+        self.assertEqual(coalesce_patches([(4, b'cd'), (0, b'ab'), (2, b'xy')]),
+                         [(0, b'abxycd')])
+
+    def test_disjoint_patches_stay_apart(self):
+        self.assertEqual(coalesce_patches([(10, b'b'), (0, b'a')]),
+                         [(0, b'a'), (10, b'b')])
+
+    def test_later_patch_wins_over_higher_offset(self):
+        # The earlier patch starts higher; the later one must still win
+        self.assertEqual(coalesce_patches([(2, b'XXXX'), (0, b'aaaa')]),
+                         [(0, b'aaaaXX')])
+        self.assertEqual(coalesce_patches([(0, b'aaaa'), (2, b'XXXX')]),
+                         [(0, b'aaXXXX')])
+
+    def test_contained_patch(self):
+        self.assertEqual(coalesce_patches([(3, b'X'), (0, b'abcdef')]), [(0, b'abcdef')])
+        self.assertEqual(coalesce_patches([(0, b'abcdef'), (3, b'X')]), [(0, b'abcXef')])
+
+    def test_matches_applying_in_order(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            patches = [(rng.randrange(64), rng.randbytes(rng.randrange(1, 9)))
+                       for _ in range(rng.randrange(1, 8))]
+            expected = bytearray(80)
+            apply_patches_to_buffer(expected, patches)
+            actual = bytearray(80)
+            merged = coalesce_patches(patches)
+            apply_patches_to_buffer(actual, merged)
+            self.assertEqual(actual, expected, patches)
+            for (a, chunk), (b, _) in zip(merged, merged[1:]):
+                self.assertLess(a + len(chunk), b)
+
+
+if __name__ == '__main__':
+    unittest.main()
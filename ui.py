@@ -1,39 +1,259 @@
+#!/usr/bin/env python3
+
+"""
+Desktop viewer for EEPROM images.
+
+Files are read and parsed on a worker thread; results are handed back to
+the Tk main thread through a queue polled with after(), so the window
+never blocks on a load. Each image opens in its own tab with a tree of
+sections whose children are only built when a node is expanded, and a
+channel table that only creates widgets for the rows currently visible.
+
+    python ui.py [image.nfw ...]
+"""
+
+import os
+import queue
+import sys
 import tkinter as tk
-from tkinter import filedialog, messagebox
-from pprint import pformat
-from construct_parser import eepromLayout
-
-def load_file():
-    file_path = filedialog.askopenfilename(
-        title="Select EEPROM File",
-        filetypes=(("Binary files", "*.nfw"), ("All files", "*.*"))
-    )
-    if not file_path:
-        return
-
-    try:
-        with open(file_path, "rb") as f:
-            data = f.read()
-        parsed = eepromLayout.parse(data)
-        display_data(parsed)
-    except Exception as e:
-        messagebox.showerror("Error", f"Failed to parse file: {e}")
-
-def display_data(parsed):
-    text_area.delete(1.0, tk.END)
-    text_area.insert(tk.END, pformat(parsed))
-
-# Set up the main application window
-root = tk.Tk()
-root.title("EEPROM Parser")
-
-# Create a text area to display parsed data
-text_area = tk.Text(root, wrap=tk.WORD, width=80, height=30)
-text_area.pack(expand=True, fill=tk.BOTH)
-
-# Create a button to load and parse a file
-load_button = tk.Button(root, text="Load EEPROM File", command=load_file)
-load_button.pack(pady=10)
-
-# Start the Tkinter event loop
-root.mainloop() 
\ No newline at end of file
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import filedialog, messagebox, ttk
+
+from fast_codec import get_layout
+from export import CHANNEL_CSV_COLUMNS, channel_row
+
+# Set TIDRADIO_PARSER=construct to use the reference construct parser
+layout = get_layout()
+
+POLL_MS = 50
+FREQ_COLUMNS = ('rxFreq', 'txFreq')
+_PLACEHOLDER = '…'
+
+
+def load_image(path):
+    """Read and parse an image (runs on the worker thread)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    return data, layout.parse(data)
+
+
+def node_children(value):
+    """(label, child) pairs of a parsed node; scalars have none."""
+    if isinstance(value, dict):
+        return [(str(k), v) for k, v in value.items() if not str(k).startswith('_')]
+    if isinstance(value, (list, tuple)):
+        return [(f"[{i}]", v) for i, v in enumerate(value)]
+    return []
+
+
+def node_text(value):
+    """Summary shown next to a node: the value for scalars, a size for containers."""
+    if isinstance(value, dict):
+        return ''
+    if isinstance(value, (list, tuple)):
+        return f"{len(value)} items"
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex(' ')
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value} (0x{value:X})"
+    return str(value)
+
+
+def channel_values(index, channel):
+    """One channel table row, in CHANNEL_CSV_COLUMNS order."""
+    row = channel_row(index, channel)
+    row['index'] = index + 1
+    for column in FREQ_COLUMNS:
+        row[column] = f"{row[column] / 100000:.5f}"
+    return tuple(row[column] for column in CHANNEL_CSV_COLUMNS)
+
+
+class LazyTree(ttk.Frame):
+    """Treeview over a parsed image that builds children on expand."""
+
+    def __init__(self, master, parsed):
+        super().__init__(master)
+        self.tree = ttk.Treeview(self, columns=('value',), selectmode='browse')
+        self.tree.heading('#0', text='Field')
+        self.tree.heading('value', text='Value')
+        self.tree.column('#0', width=220)
+        self.tree.column('value', width=260)
+        scroll = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self._values = {}       # item id -> parsed value, until it is expanded
+        self.tree.bind('<<TreeviewOpen>>', self._expand)
+        self._insert_children('', parsed)
+
+    def _insert_children(self, parent, value):
+        for label, child in node_children(value):
+            item = self.tree.insert(parent, tk.END, text=label, values=(node_text(child),))
+            if isinstance(child, (dict, list, tuple)) and child:
+                self._values[item] = child
+                self.tree.insert(item, tk.END, text=_PLACEHOLDER)
+
+    def _expand(self, event):
+        item = self.tree.focus()
+        value = self._values.pop(item, None)
+        if value is not None:
+            self.tree.delete(*self.tree.get_children(item))
+            self._insert_children(item, value)
+
+
+class VirtualTable(ttk.Frame):
+    """
+    Table of row_count rows that only holds the visible ones: the Treeview
+    has as many items as fit, refilled through get_row(index) on scroll.
+    """
+
+    def __init__(self, master, columns, row_count, get_row):
+        super().__init__(master)
+        self.row_count = row_count
+        self.get_row = get_row
+        self.first = 0
+        self.visible = 0
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', selectmode='browse')
+        for column in columns:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=80, stretch=True)
+        self.scroll = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scroll)
+        self.tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
+        self.scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<MouseWheel>', self._on_wheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll_to(self.first - 3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_to(self.first + 3))
+        self.tree.bind('<Prior>', lambda e: self.scroll_to(self.first - self.visible))
+        self.tree.bind('<Next>', lambda e: self.scroll_to(self.first + self.visible))
+
+    def _row_height(self):
+        return int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+
+    def _on_resize(self, event):
+        header = 24
+        visible = max(1, (event.height - header) // self._row_height())
+        if visible != self.visible:
+            self.visible = visible
+            self.refresh()
+
+    def _on_wheel(self, event):
+        self.scroll_to(self.first - (event.delta // 120) * 3)
+        return 'break'
+
+    def _on_scroll(self, *args):
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * self.row_count))
+        elif args[0] == 'scroll':
+            step = self.visible if args[2] == 'pages' else 1
+            self.scroll_to(self.first + int(args[1]) * step)
+
+    def scroll_to(self, first):
+        first = max(0, min(first, self.row_count - self.visible))
+        if first != self.first:
+            self.first = first
+            self.refresh()
+
+    def refresh(self):
+        """Refill the visible items from get_row()."""
+        items = self.tree.get_children()
+        wanted = min(self.visible, self.row_count - self.first)
+        if len(items) > wanted:
+            self.tree.delete(*items[wanted:])
+            items = items[:wanted]
+        for i in range(wanted):
+            values = self.get_row(self.first + i)
+            if i < len(items):
+                self.tree.item(items[i], values=values)
+            else:
+                self.tree.insert('', tk.END, values=values)
+        if self.row_count:
+            self.scroll.set(self.first / self.row_count,
+                            (self.first + wanted) / self.row_count)
+        else:
+            self.scroll.set(0, 1)
+
+
+class Viewer:
+    """Main window: one notebook tab per opened image."""
+
+    def __init__(self, root):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='parse')
+        self.results = queue.Queue()
+        self.pending = 0
+
+        toolbar = ttk.Frame(root)
+        toolbar.pack(side=tk.TOP, fill=tk.X)
+        ttk.Button(toolbar, text="Load EEPROM Files", command=self.choose_files).pack(side=tk.LEFT, padx=5, pady=5)
+        self.status = ttk.Label(toolbar, text="")
+        self.status.pack(side=tk.LEFT, padx=5)
+
+        self.notebook = ttk.Notebook(root)
+        self.notebook.pack(expand=True, fill=tk.BOTH)
+        root.protocol('WM_DELETE_WINDOW', self.close)
+        root.after(POLL_MS, self.poll)
+
+    def choose_files(self):
+        paths = filedialog.askopenfilenames(
+            title="Select EEPROM Files",
+            filetypes=(("Binary files", "*.nfw"), ("All files", "*.*"))
+        )
+        for path in paths:
+            self.open(path)
+
+    def open(self, path):
+        """Queue path for parsing on the worker pool."""
+        self.pending += 1
+        self._update_status()
+        future = self.executor.submit(load_image, path)
+        # Runs on the worker thread: only hand the result over, never touch Tk
+        future.add_done_callback(lambda f: self.results.put((path, f)))
+
+    def poll(self):
+        """Take finished loads off the queue on the Tk thread."""
+        try:
+            while True:
+                path, future = self.results.get_nowait()
+                self.pending -= 1
+                try:
+                    _, parsed = future.result()
+                except Exception as e:
+                    messagebox.showerror("Error", f"Failed to parse {os.path.basename(path)}: {e}")
+                else:
+                    self.add_tab(path, parsed)
+                self._update_status()
+        except queue.Empty:
+            pass
+        self.root.after(POLL_MS, self.poll)
+
+    def add_tab(self, path, parsed):
+        pane = ttk.PanedWindow(self.notebook, orient=tk.HORIZONTAL)
+        pane.add(LazyTree(pane, parsed), weight=1)
+        channels = parsed.memoryChannels
+        table = VirtualTable(pane, CHANNEL_CSV_COLUMNS, len(channels),
+                             lambda i: channel_values(i, channels[i]))
+        pane.add(table, weight=2)
+        self.notebook.add(pane, text=os.path.basename(path))
+        self.notebook.select(pane)
+
+    def _update_status(self):
+        self.status.configure(text=f"Loading {self.pending} file(s)..." if self.pending else "")
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+
+
+def main(argv=None):
+    root = tk.Tk()
+    root.title("EEPROM Parser")
+    root.geometry("1100x650")
+    viewer = Viewer(root)
+    for path in (sys.argv[1:] if argv is None else argv):
+        viewer.open(path)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+"""
+Validation of parsed EEPROM images.
+
+Kept free of Flask so the batch tools can validate without the web app.
+"""
+
+from checksum import image_settings_checksum
+from bandplan_index import BandPlanIndex
+from validation_rules import ERROR, bandplan_problems, check_sections, format_issue, SECTIONS
+
+# Rules whose checks validate_eeprom already reports in its own words
+_REPORTED_HERE = ('magics', 'channel_bandplans')
+
+SETTINGS_MAGIC = 0xD82F  # Magic value for valid settings block
+
+# Channel numbers listed per band plan problem before summarising
+MAX_LISTED_CHANNELS = 10
+
+def check_channel_bandplans(channels, bandplans):
+    """Return (channels outside every band plan, channels transmitting where
+    the governing plan does not allow it) as lists of channel indexes."""
+    outside = []
+    no_tx = []
+    freqs = ((channel.rxFreq, channel.txFreq) for channel in channels)
+    for i, kind, _, _ in bandplan_problems(freqs, bandplans):
+        (no_tx if kind == 'no_tx' else outside).append(i)
+    return outside, no_tx
+
+def _channel_list(indexes):
+    listed = ', '.join(str(i + 1) for i in indexes[:MAX_LISTED_CHANNELS])
+    if len(indexes) > MAX_LISTED_CHANNELS:
+        listed += f" and {len(indexes) - MAX_LISTED_CHANNELS} more"
+    return listed
+
+def _summarize_issues(issues):
+    """One message per rule: its first issue plus how many more there are."""
+    by_rule = {}
+    for issue in issues:
+        by_rule.setdefault(issue.rule, []).append(issue)
+    messages = []
+    for rule_issues in by_rule.values():
+        message = format_issue(rule_issues[0])
+        if len(rule_issues) > 1:
+            message += f" (and {len(rule_issues) - 1} more)"
+        messages.append(message)
+    return messages
+
+def validate_eeprom(parsed_data, data=None, bandplans=None, fail_fast=False):
+    """Validate the EEPROM data using magic values and other checks.
+    data is the raw image; it defaults to the stream the image was parsed from.
+    bandplans is the image's BandPlanIndex, built from the parse if not given.
+    fail_fast stops the section rules (validation_rules) at their first error."""
+    validation = {
+        'valid': True,
+        'messages': []
+    }
+    
+    # Checksum over the settings block only, not the whole image
+    if data is None:
+        data = parsed_data.settings._io.getvalue()
+    calculated_checksum = image_settings_checksum(data)
+    
+    # Check settings block magic against calculated checksum
+    if parsed_data.settings.magic != SETTINGS_MAGIC:
+        validation['valid'] = False
+        validation['messages'].append(
+            f"Invalid settings magic value: 0x{parsed_data.settings.magic:04X} "
+            f"(expected 0x{SETTINGS_MAGIC:04X}, calculated 0x{calculated_checksum:04X})"
+        )
+    else:
+        validation['messages'].append(
+            f"Valid settings magic value: 0x{parsed_data.settings.magic:04X} "
+            f"(calculated: 0x{calculated_checksum:04X})"
+        )
+    
+    # Validate power table magic values
+    if parsed_data.powerTableVHF.magic != 0x57:
+        validation['valid'] = False
+        validation['messages'].append(
+            f"Invalid VHF power table magic: 0x{parsed_data.powerTableVHF.magic:02X} (expected 0x57)"
+        )
+    else:
+        validation['messages'].append("Valid VHF power table magic: 0x57")
+        
+    if parsed_data.powerTableUHF.magic != 0xD1:
+        validation['valid'] = False
+        validation['messages'].append(
+            f"Invalid UHF power table magic: 0x{parsed_data.powerTableUHF.magic:02X} (expected 0xD1)"
+        )
+    else:
+        validation['messages'].append("Valid UHF power table magic: 0xD1")
+
+    # Programmed channels against the band plans
+    if bandplans is None:
+        bandplans = BandPlanIndex.from_parsed(parsed_data)
+    if not bandplans:
+        validation['messages'].append("No band plans defined, channel frequencies not checked")
+    else:
+        outside, no_tx = check_channel_bandplans(parsed_data.memoryChannels, bandplans)
+        if outside:
+            validation['valid'] = False
+            validation['messages'].append(
+                f"Channels outside every band plan: {_channel_list(outside)}"
+            )
+        if no_tx:
+            validation['valid'] = False
+            validation['messages'].append(
+                f"Channels transmitting where the band plan does not allow it: {_channel_list(no_tx)}"
+            )
+        if not outside and not no_tx:
+            validation['messages'].append(
+                f"All channels are within the {len(bandplans)} band plans"
+            )
+
+    # Frequency, subtone, group, label, DTMF, scan preset and power table rules
+    issues, _ = check_sections(data, SECTIONS, fail_fast, skip=_REPORTED_HERE)
+    if any(issue.severity == ERROR for issue in issues):
+        validation['valid'] = False
+    validation['messages'].extend(_summarize_issues(issues))
+    
+    return validation
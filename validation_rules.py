@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+
+"""
+Rule-based validation of raw EEPROM images.
+
+Rules are grouped by section and read the image bytes directly through a
+memoryview and the precompiled record structs; nothing is parsed into
+records first. validate_image() runs them in full-report mode (every
+issue) or fail-fast mode (stop at the first error, for ingestion), and
+validate_batch() checks many images with the sections spread over a
+process pool.
+
+    report = validate_image(data)
+    report.valid, report.errors, report.warnings
+"""
+
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+from fast_codec import (
+    EEPROM_SIZE, CodecError, EMPTY_FREQS,
+    VFO_A_OFFSET, VFO_B_OFFSET, CHANNELS_OFFSET, CHANNEL_COUNT, CHANNEL_SIZE,
+    SETTINGS_OFFSET, SETTINGS_MAGIC, BANDPLAN_MAGIC_OFFSET, BANDPLAN_MAGIC,
+    BANDPLANS_OFFSET, BANDPLAN_COUNT, BANDPLAN_SIZE,
+    SCAN_PRESETS_OFFSET, SCAN_PRESET_COUNT, SCAN_PRESET_SIZE,
+    GROUP_LABELS_OFFSET, GROUP_LABEL_COUNT, GROUP_LABEL_SIZE,
+    DTMF_OFFSET, DTMF_COUNT, DTMF_SIZE,
+    POWER_OFFSET, POWER_TABLE_VHF_OFFSET, POWER_TABLE_UHF_OFFSET, POWER_TABLE_SIZE,
+    POWER_TABLE_VHF_MAGIC, POWER_TABLE_UHF_MAGIC, SUBTONE_DCS, SUBTONE_DCS_INVERTED,
+    CHANNEL_STRUCT, BANDPLAN_STRUCT, SCAN_PRESET_STRUCT, DTMF_STRUCT,
+)
+from bandplan_index import BandPlanIndex
+
+ERROR = 'error'
+WARNING = 'warning'
+
+# Receiver coverage, in 10 Hz units (18 MHz - 1300 MHz)
+FREQ_MIN = 1800000
+FREQ_MAX = 130000000
+
+# CTCSS tones are 0.1 Hz units
+CTCSS_MIN = 600
+CTCSS_MAX = 3000
+
+# Standard DCS codes (octal)
+DCS_CODES = frozenset(int(code, 8) for code in (
+    '023 025 026 031 032 036 043 047 051 053 054 065 071 072 073 074 '
+    '114 115 116 122 125 131 132 134 143 145 152 155 156 162 165 172 174 '
+    '205 212 223 225 226 243 244 245 246 251 252 255 261 263 265 266 271 274 '
+    '306 311 315 325 331 332 343 346 351 356 364 365 371 '
+    '411 412 413 423 431 432 445 446 452 454 455 462 464 465 466 '
+    '503 506 516 523 526 532 546 565 '
+    '606 612 624 627 631 632 654 662 664 703 712 723 731 732 734 743 754'
+).split())
+
+# DTMF presets hold up to 9 digits (d0-d8)
+DTMF_MAX_DIGITS = 9
+
+Issue = namedtuple('Issue', 'severity section index rule message')
+Rule = namedtuple('Rule', 'name section check')
+
+
+class ValidationFailed(ValueError):
+    """Raised by validate_image(..., raise_on_error=True); issue is the first error."""
+
+    def __init__(self, issue):
+        self.issue = issue
+        super().__init__(format_issue(issue))
+
+
+def format_issue(issue):
+    where = issue.section if issue.index is None else f"{issue.section}[{issue.index + 1}]"
+    return f"{where}: {issue.message}"
+
+
+class ValidationReport:
+    """Issues found in one image, in section and rule order."""
+
+    __slots__ = ('issues', 'complete')
+
+    def __init__(self, issues=(), complete=True):
+        self.issues = list(issues)
+        self.complete = complete    # False when fail-fast stopped early
+
+    @property
+    def errors(self):
+        return [i for i in self.issues if i.severity == ERROR]
+
+    @property
+    def warnings(self):
+        return [i for i in self.issues if i.severity == WARNING]
+
+    @property
+    def valid(self):
+        return not any(i.severity == ERROR for i in self.issues)
+
+    def messages(self):
+        return [format_issue(issue) for issue in self.issues]
+
+    def as_dict(self):
+        return {'valid': self.valid, 'complete': self.complete, 'messages': self.messages()}
+
+
+RULES = []
+
+
+def rule(section, name=None):
+    """Register check(view) as a rule; it yields (severity, index, message)."""
+    def register(check):
+        RULES.append(Rule(name or check.__name__, section, check))
+        return check
+    return register
+
+
+SECTIONS = ('layout', 'channels', 'bandplans', 'scan_presets',
+            'group_labels', 'dtmf', 'power')
+
+
+def _is_erased(chunk):
+    chunk = bytes(chunk)
+    return not chunk.strip(b'\xFF') or not chunk.strip(b'\x00')
+
+
+def _label_problem(raw):
+    """Why a NUL-padded ASCII label is malformed, or None."""
+    raw = bytes(raw)
+    text = raw.rstrip(b'\x00')
+    if text.isascii() and text.decode('ascii').isprintable():
+        return None
+    text, _, padding = raw.partition(b'\x00')
+    if padding.strip(b'\x00\xFF'):
+        return "has data after its terminating NUL"
+    if any(not 0x20 <= b < 0x7F for b in text):
+        return f"is not printable ASCII ({raw!r})"
+    return None
+
+
+def _channels(view):
+    """(index, record tuple) for the two VFOs (index None) and memory channels."""
+    yield 'vfoA', None, CHANNEL_STRUCT.unpack_from(view, VFO_A_OFFSET)
+    yield 'vfoB', None, CHANNEL_STRUCT.unpack_from(view, VFO_B_OFFSET)
+    region = view[CHANNELS_OFFSET:CHANNELS_OFFSET + CHANNEL_COUNT * CHANNEL_SIZE]
+    for i, record in enumerate(CHANNEL_STRUCT.iter_unpack(region)):
+        yield 'memoryChannels', i, record
+
+
+@lru_cache(maxsize=None)
+def _subtone_problem(value):
+    """(severity, message) for a malformed subtone value, or None."""
+    if value == 0 or value == 0xFFFF:
+        return None
+    if value & SUBTONE_DCS:
+        code = value & ~(SUBTONE_DCS | SUBTONE_DCS_INVERTED)
+        if code > 0o777:
+            return ERROR, f"DCS value 0x{value:04X} is not a 3-digit octal code"
+        if code not in DCS_CODES:
+            return WARNING, f"DCS code {code:03o} is not a standard code"
+        return None
+    if not CTCSS_MIN <= value <= CTCSS_MAX:
+        return ERROR, (f"CTCSS tone {value / 10:.1f} Hz is outside "
+                       f"{CTCSS_MIN / 10:.0f}-{CTCSS_MAX / 10:.0f} Hz")
+    return None
+
+
+#
+# Layout
+#
+@rule('layout')
+def magics(view):
+    settings = int.from_bytes(view[SETTINGS_OFFSET:SETTINGS_OFFSET + 2], 'big')
+    if settings != SETTINGS_MAGIC:
+        yield ERROR, None, f"settings magic is 0x{settings:04X}, expected 0x{SETTINGS_MAGIC:04X}"
+    bandplan = int.from_bytes(view[BANDPLAN_MAGIC_OFFSET:BANDPLAN_MAGIC_OFFSET + 2], 'big')
+    if bandplan != BANDPLAN_MAGIC:
+        yield ERROR, None, f"band plan magic is 0x{bandplan:04X}, expected 0x{BANDPLAN_MAGIC:04X}"
+    for name, offset, expected in (('VHF', POWER_TABLE_VHF_OFFSET, POWER_TABLE_VHF_MAGIC),
+                                   ('UHF', POWER_TABLE_UHF_OFFSET, POWER_TABLE_UHF_MAGIC)):
+        if view[offset] != expected:
+            yield ERROR, None, f"{name} power table magic is 0x{view[offset]:02X}, expected 0x{expected:02X}"
+
+
+#
+# Channels
+#
+@rule('channels')
+def channel_frequencies(view):
+    for section, i, (rx, tx, *_) in _channels(view):
+        if rx in EMPTY_FREQS:
+            continue
+        if not FREQ_MIN <= rx <= FREQ_MAX:
+            yield ERROR, i, f"{section} rxFreq {rx / 100000:.5f} MHz is outside the receiver range"
+        if tx not in EMPTY_FREQS and not FREQ_MIN <= tx <= FREQ_MAX:
+            yield ERROR, i, f"{section} txFreq {tx / 100000:.5f} MHz is outside the receiver range"
+
+
+def bandplan_problems(freqs, bandplans):
+    """
+    (index, kind, freq, plan) for every (rxFreq, txFreq) pair in freqs that
+    is outside every band plan (kind 'rx' or 'tx', plan None) or transmits
+    where the governing plan does not allow it (kind 'no_tx').
+    """
+    for i, (rx, tx) in enumerate(freqs):
+        if rx in EMPTY_FREQS:
+            continue
+        if bandplans.lookup(rx) is None:
+            yield i, 'rx', rx, None
+        elif tx not in EMPTY_FREQS:
+            plan = bandplans.lookup(tx)
+            if plan is None:
+                yield i, 'tx', tx, None
+            elif not plan.txAllowed:
+                yield i, 'no_tx', tx, plan
+
+
+@rule('channels')
+def channel_bandplans(view):
+    bandplans = BandPlanIndex.from_image(view)
+    if not bandplans:
+        return
+    region = view[CHANNELS_OFFSET:CHANNELS_OFFSET + CHANNEL_COUNT * CHANNEL_SIZE]
+    freqs = (record[:2] for record in CHANNEL_STRUCT.iter_unpack(region))
+    for i, kind, freq, plan in bandplan_problems(freqs, bandplans):
+        if kind == 'no_tx':
+            yield ERROR, i, f"band plan {plan.index + 1} does not allow transmit at {freq / 100000:.5f} MHz"
+        else:
+            yield ERROR, i, f"{kind}Freq {freq / 100000:.5f} MHz is outside every band plan"
+
+
+@rule('channels')
+def channel_subtones(view):
+    for section, i, record in _channels(view):
+        if record[0] in EMPTY_FREQS:
+            continue
+        for name, value in (('rxSubTone', record[2]), ('txSubTone', record[3])):
+            problem = _subtone_problem(value)
+            if problem:
+                severity, message = problem
+                yield severity, i, f"{section} {name} {message}"
+
+
+@lru_cache(maxsize=None)
+def _repeats_group(value):
+    groups = [n for n in ((value >> shift) & 0xF for shift in (0, 4, 8, 12)) if n]
+    return len(set(groups)) != len(groups)
+
+
+@rule('channels')
+def channel_groups(view):
+    region = view[CHANNELS_OFFSET:CHANNELS_OFFSET + CHANNEL_COUNT * CHANNEL_SIZE]
+    for i, record in enumerate(CHANNEL_STRUCT.iter_unpack(region)):
+        if record[0] in EMPTY_FREQS:
+            continue
+        if _repeats_group(record[5]):
+            yield WARNING, i, "is assigned to the same group more than once"
+
+
+@rule('channels')
+def channel_names(view):
+    for section, i, record in _channels(view):
+        if record[0] in EMPTY_FREQS:
+            continue
+        problem = _label_problem(record[8])
+        if problem:
+            yield ERROR, i, f"{section} name {problem}"
+
+
+#
+# Band plans
+#
+@rule('bandplans')
+def bandplan_ranges(view):
+    for i in range(BANDPLAN_COUNT):
+        offset = BANDPLANS_OFFSET + i * BANDPLAN_SIZE
+        if _is_erased(view[offset:offset + BANDPLAN_SIZE]):
+            continue
+        start, end, _, _ = BANDPLAN_STRUCT.unpack_from(view, offset)
+        if start in EMPTY_FREQS or end in EMPTY_FREQS:
+            continue
+        if start > end:
+            yield ERROR, i, f"startFreq {start / 100000:.5f} MHz is above endFreq {end / 100000:.5f} MHz"
+        elif not (FREQ_MIN <= start and end <= FREQ_MAX):
+            yield WARNING, i, "range extends outside the receiver range"
+
+
+#
+# Scan presets
+#
+@rule('scan_presets')
+def scan_preset_ranges(view):
+    for i in range(SCAN_PRESET_COUNT):
+        offset = SCAN_PRESETS_OFFSET + i * SCAN_PRESET_SIZE
+        if _is_erased(view[offset:offset + SCAN_PRESET_SIZE]):
+            continue
+        start, span, step, _, _, _, label = SCAN_PRESET_STRUCT.unpack_from(view, offset)
+        if start in EMPTY_FREQS:
+            continue
+        if not FREQ_MIN <= start <= FREQ_MAX:
+            yield ERROR, i, f"startFreq {start / 100000:.5f} MHz is outside the receiver range"
+        if step == 0:
+            yield ERROR, i, "step is zero"
+        if span == 0:
+            yield ERROR, i, "range is zero"
+        elif step and step > span:
+            yield WARNING, i, f"step {step} is larger than the range {span}"
+        problem = _label_problem(label)
+        if problem:
+            yield ERROR, i, f"label {problem}"
+
+
+#
+# Group labels
+#
+@rule('group_labels')
+def group_label_encoding(view):
+    for i in range(GROUP_LABEL_COUNT):
+        offset = GROUP_LABELS_OFFSET + i * GROUP_LABEL_SIZE
+        raw = view[offset:offset + GROUP_LABEL_SIZE]
+        if _is_erased(raw):
+            continue
+        problem = _label_problem(raw)
+        if problem:
+            yield ERROR, i, f"label {problem}"
+
+
+#
+# DTMF presets
+#
+@rule('dtmf')
+def dtmf_presets(view):
+    for i in range(DTMF_COUNT):
+        offset = DTMF_OFFSET + i * DTMF_SIZE
+        if _is_erased(view[offset:offset + DTMF_SIZE]):
+            continue
+        first, _, label = DTMF_STRUCT.unpack_from(view, offset)
+        length = first & 0xF
+        if length > DTMF_MAX_DIGITS:
+            yield ERROR, i, f"sequence length {length} exceeds {DTMF_MAX_DIGITS} digits"
+        problem = _label_problem(label)
+        if problem:
+            yield ERROR, i, f"label {problem}"
+
+
+#
+# Power
+#
+@rule('power')
+def power_tables(view):
+    for name, offset in (('VHF', POWER_TABLE_VHF_OFFSET), ('UHF', POWER_TABLE_UHF_OFFSET)):
+        table = bytes(view[offset + 1:offset + 1 + POWER_TABLE_SIZE])
+        # Unused entries at the end are left erased or zeroed
+        used = len(table.rstrip(b'\xFF').rstrip(b'\x00'))
+        for setting in range(1, used):
+            if table[setting] < table[setting - 1]:
+                yield ERROR, None, (f"{name} power table decreases at setting {setting} "
+                                    f"({table[setting - 1]} -> {table[setting]})")
+                break
+
+
+@rule('power')
+def power_limits(view):
+    watts_uhf, setting_uhf, watts_vhf, setting_vhf = view[POWER_OFFSET:POWER_OFFSET + 4]
+    for name, watts, setting in (('UHF', watts_uhf, setting_uhf), ('VHF', watts_vhf, setting_vhf)):
+        if watts == 0 or setting == 0:
+            yield WARNING, None, f"{name} power limits are not set (maximum {watts} W at setting {setting})"
+
+
+def _as_view(data):
+    view = memoryview(data).cast('B')
+    if len(view) < EEPROM_SIZE:
+        raise CodecError(f"image is {len(view)} bytes, expected at least {EEPROM_SIZE}")
+    return view[:EEPROM_SIZE]
+
+
+def check_sections(data, sections=SECTIONS, fail_fast=False, skip=()):
+    """Run the rules of the given sections; returns (issues, complete)."""
+    view = _as_view(data)
+    issues = []
+    for section in sections:
+        for r in RULES:
+            if r.section != section or r.name in skip:
+                continue
+            for severity, index, message in r.check(view):
+                issues.append(Issue(severity, section, index, r.name, message))
+                if fail_fast and severity == ERROR:
+                    return issues, False
+    return issues, True
+
+
+def validate_image(data, fail_fast=False, raise_on_error=False, skip=()):
+    """
+    Validate one image. Full-report mode collects every issue; fail_fast
+    stops at the first error. With raise_on_error, that error is raised
+    as ValidationFailed instead of being returned. skip names rules to
+    leave out.
+    """
+    issues, complete = check_sections(data, SECTIONS, fail_fast or raise_on_error, skip)
+    report = ValidationReport(issues, complete)
+    if raise_on_error and not report.valid:
+        raise ValidationFailed(report.errors[0])
+    return report
+
+
+def _check_chunk(args):
+    section, images, fail_fast, skip = args
+    return [check_sections(data, (section,), fail_fast, skip) for data in images]
+
+
+def validate_batch(images, fail_fast=False, workers=None, chunksize=16, skip=()):
+    """
+    Validate many images, returning a ValidationReport per image in order.
+
+    Each (section, chunk of images) is an independent task on a process
+    pool, so the sections of a large batch are checked concurrently.
+    With workers=1 everything runs in this process.
+    """
+    images = [bytes(data) for data in images]
+    chunks = [images[i:i + chunksize] for i in range(0, len(images), chunksize)]
+    tasks = [(section, chunk, fail_fast, tuple(skip)) for chunk in chunks for section in SECTIONS]
+
+    if workers == 1 or len(images) <= chunksize:
+        results = [_check_chunk(task) for task in tasks]
+    else:
+        # Imported here: the process pool machinery costs more to import
+        # than a small batch takes to validate
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            results = list(pool.map(_check_chunk, tasks))
+
+    reports = []
+    for c, chunk in enumerate(chunks):
+        per_section = results[c * len(SECTIONS):(c + 1) * len(SECTIONS)]
+        for j in range(len(chunk)):
+            issues = []
+            complete = True
+            for section_results in per_section:
+                section_issues, section_complete = section_results[j]
+                issues.extend(section_issues)
+                complete = complete and section_complete
+                if fail_fast and not section_complete:
+                    # Stop at the first section that failed, like validate_image
+                    break
+            reports.append(ValidationReport(issues, complete))
+    return reports